@@ -5,24 +5,28 @@ import streamlit as st
 import requests
 from pathlib import Path
 import json
-import os
+import time
 
 from dotenv import load_dotenv
-from supabase import create_client
 
-load_dotenv()
+from database.db import Database
 
-supabase_url = os.getenv("SUPABASE_URL")
-supabase_key = os.getenv("SUPABASE_KEY")
-supabase = create_client(supabase_url, supabase_key)
+load_dotenv()
 
 BACKEND_URL = "http://127.0.0.1:8000"
+JOB_POLL_INTERVAL = 1.0
 
 st.set_page_config(
     page_title="Legal Brief Analysis",
     layout="wide",
     initial_sidebar_state="expanded"
 )
+
+@st.cache_resource
+def get_database():
+    """One Supabase client and read cache shared by every session, created on first use"""
+    return Database()
+
 def save_file_to_supabase(file, doc_type, metadata=None):
     """Save uploaded file to Supabase storage"""
     try:
@@ -32,13 +36,14 @@ def save_file_to_supabase(file, doc_type, metadata=None):
         file_extension = Path(file.name).suffix
         storage_path = f"legal_briefs/{doc_type}/{timestamp}_{file_id}{file_extension}"
 
-        response = supabase.storage.from_("documents").upload(
+        storage = get_database().client.storage
+        response = storage.from_("documents").upload(
             path=storage_path,
             file=file.getvalue(),
             file_options={"content-type": file.type}
         )
 
-        file_url = supabase.storage.from_("documents").get_public_url(storage_path)
+        file_url = storage.from_("documents").get_public_url(storage_path)
 
         file_record = {
             "filename": file.name,
@@ -49,7 +54,7 @@ def save_file_to_supabase(file, doc_type, metadata=None):
             "metadata": metadata or {}
         }
 
-        db_response = supabase.table("documents").insert(file_record).execute()
+        get_database().insert_document(file_record)
 
         st.success(f"✅ {doc_type.title()} saved to Supabase")
         return file_url
@@ -57,75 +62,97 @@ def save_file_to_supabase(file, doc_type, metadata=None):
     except Exception as e:
         st.error(f"Error saving file to Supabase: {str(e)}")
         return None
-def process_document(file, doc_type):
-    """Send document to backend for processing and save to Supabase"""
+def submit_analysis_job(moving_brief, response_brief):
+    """Queue both briefs for analysis on the backend and return the job id"""
     try:
-        files = {"file": (file.name, file.getvalue(), file.type)}
-        response = requests.post(f"{BACKEND_URL}/upload", files=files)
+        files = {
+            "moving_brief": (moving_brief.name, moving_brief.getvalue(), moving_brief.type),
+            "response_brief": (response_brief.name, response_brief.getvalue(), response_brief.type),
+        }
+        response = requests.post(f"{BACKEND_URL}/jobs", files=files)
 
-        if response.status_code != 200:
+        if response.status_code != 202:
             error_detail = response.json().get('detail', 'Unknown error')
-            st.error(f"Error processing {doc_type}: {error_detail}")
+            st.error(f"Error submitting documents: {error_detail}")
             return None
 
-        result_data = response.json().get('data')
-
-        save_file_to_supabase(file, doc_type, metadata={
-            "processed_at": datetime.datetime.now().isoformat(),
-            "content_summary": result_data.get("summary", ""),
-            "headings_count": len(result_data.get("headings", [])),
-        })
-
-        return result_data
+        return response.json().get('job_id')
     except requests.exceptions.RequestException as e:
         st.error(f"Error connecting to backend: {str(e)}")
         return None
 
-def link_documents(moving_brief_data, response_brief_data):
-    """Send processed documents to backend for linking"""
+def wait_for_job(job_id):
+    """Poll the backend until the analysis job finishes, showing its progress
+    and rendering each link as soon as the backend has found it"""
+    progress_bar = st.progress(0.0, text="Queued...")
+    links_shown = 0
     try:
-        payload = {
-            "moving_brief": moving_brief_data,
-            "response_brief": response_brief_data
-        }
-
-        response = requests.post(
-            f"{BACKEND_URL}/link",
-            json=payload
-        )
-
-        if response.status_code != 200:
-            error_detail = response.json().get('detail', 'Unknown error')
-            st.error(f"Error linking documents: {error_detail}")
-            return None
-
-        return response.json()
+        while True:
+            response = requests.get(f"{BACKEND_URL}/jobs/{job_id}")
+            if response.status_code != 200:
+                error_detail = response.json().get('detail', 'Unknown error')
+                st.error(f"Error checking analysis status: {error_detail}")
+                return None
+
+            job = response.json()
+            progress = job["progress"]
+            if job["stage"] == "parsing" and progress["pages_total"]:
+                fraction = 0.5 * progress["pages_parsed"] / progress["pages_total"]
+                text = f"Parsed {progress['pages_parsed']} of {progress['pages_total']} pages"
+            elif job["stage"] == "parsing":
+                # Cached briefs aren't sent to the parser, so they have no pages to count
+                fraction = 0.5 * progress["briefs_parsed"] / max(progress["briefs_total"], 1)
+                text = f"Parsed {progress['briefs_parsed']} of {progress['briefs_total']} briefs"
+            elif job["stage"] == "linking":
+                fraction = 0.5 + 0.5 * progress["arguments_linked"] / max(progress["arguments_total"], 1)
+                text = f"Linked {progress['arguments_linked']} of {progress['arguments_total']} arguments"
+            else:
+                fraction, text = (1.0, "Done") if job["status"] != "queued" else (0.0, "Queued...")
+            progress_bar.progress(fraction, text=text)
+
+            links = job["result"]["links"] if job["status"] == "succeeded" else job.get("links") or []
+            for link in links[links_shown:]:
+                display_link(link)
+            links_shown = max(links_shown, len(links))
+
+            if job["status"] == "succeeded":
+                if not links:
+                    st.error("No links found between the documents")
+                return job["result"]
+            if job["status"] == "failed":
+                st.error(f"Error analyzing documents: {job['error']}")
+                return None
+
+            time.sleep(JOB_POLL_INTERVAL)
     except requests.exceptions.RequestException as e:
         st.error(f"Error connecting to backend: {str(e)}")
         return None
 
-def display_linked_arguments(links_data):
-    """Display the linked arguments in two columns"""
-    if not links_data or "links" not in links_data:
-        st.error("No links found between the documents")
-        return
-
-    for link in links_data["links"]:
-        cols = st.columns(2)
-
-        with cols[0]:
-            st.markdown("### Moving Brief")
-            st.markdown(f"**{link['moving_brief_heading']}**")
-
-        with cols[1]:
-            st.markdown("### Response Brief")
-            st.markdown(f"**{link['response_brief_heading']}**")
-
-        st.markdown("#### Link Details")
-        st.markdown(f"Similarity Score: {link['similarity_score']:.2f}")
-        st.markdown("**Explanation:**")
-        st.markdown(link["explanation"])
-        st.divider()
+def brief_metadata(result_data):
+    """Metadata stored alongside a processed brief in Supabase"""
+    return {
+        "processed_at": datetime.datetime.now().isoformat(),
+        "content_summary": result_data.get("summary", ""),
+        "headings_count": len(result_data.get("headings", [])),
+    }
+
+def display_link(link):
+    """Display one linked argument pair in two columns"""
+    cols = st.columns(2)
+
+    with cols[0]:
+        st.markdown("### Moving Brief")
+        st.markdown(f"**{link['moving_brief_heading']}**")
+
+    with cols[1]:
+        st.markdown("### Response Brief")
+        st.markdown(f"**{link['response_brief_heading']}**")
+
+    st.markdown("#### Link Details")
+    st.markdown(f"Similarity Score: {link['similarity_score']:.2f}")
+    st.markdown("**Explanation:**")
+    st.markdown(link["explanation"])
+    st.divider()
 
 def main():
     st.title("Legal Brief Analysis")
@@ -143,46 +170,58 @@ def main():
 
     if moving_brief and response_brief:
         if st.button("Process Documents", type="primary"):
-            with st.spinner("Processing documents..."):
-
-                st.info(f"Processing moving brief: {moving_brief.name}")
-                moving_brief_data = process_document(moving_brief, "moving brief")
-                if not moving_brief_data:
-                    return
-
-                st.info(f"Processing response brief: {response_brief.name}")
-                response_brief_data = process_document(response_brief, "response brief")
-                if not response_brief_data:
-                    return
-
-                with st.spinner("Analyzing arguments and finding links..."):
-                    st.info("Finding semantic links between arguments...")
-                    links_data = link_documents(moving_brief_data, response_brief_data)
-                    if links_data:
-                        st.success("Analysis complete!")
-                        display_linked_arguments(links_data)
+            st.info(f"Submitting {moving_brief.name} and {response_brief.name} for analysis")
+            job_id = submit_analysis_job(moving_brief, response_brief)
+            if not job_id:
+                return
+
+            result = wait_for_job(job_id)
+            if not result:
+                return
+
+            save_file_to_supabase(moving_brief, "moving brief", metadata=brief_metadata(result["moving_brief"]))
+            save_file_to_supabase(response_brief, "response brief", metadata=brief_metadata(result["response_brief"]))
+
+            st.success("Analysis complete!")
     else:
         st.info("Please upload both briefs to begin analysis")
 
     st.divider()
     st.header("Saved Documents")
     if st.button("View Saved Briefs"):
-        with st.spinner("Loading saved documents..."):
-            try:
-                response = supabase.table("documents").select("*").order("upload_date", desc=True).limit(10).execute()
-                documents = response.data
-
-                if documents:
-                    for doc in documents:
-                        st.markdown(f"**{doc['filename']}** ({doc['doc_type']})")
-                        st.markdown(f"Uploaded: {doc['upload_date'][:10]}")
-                        if st.button("Load", key=f"load_{doc['id']}"):
-
-                            st.info(f"Loading {doc['filename']}...")
-                else:
-                    st.info("No saved documents found")
-            except Exception as e:
-                st.error(f"Error retrieving saved documents: {str(e)}")
+        # Cursor of every page opened so far; the last one is shown
+        st.session_state.document_cursors = [None]
+    if "document_cursors" in st.session_state:
+        show_saved_documents()
+
+def show_saved_documents():
+    """List one page of saved documents with buttons to page through them"""
+    cursors = st.session_state.document_cursors
+    with st.spinner("Loading saved documents..."):
+        try:
+            page = get_database().list_documents(after=cursors[-1])
+        except Exception as e:
+            st.error(f"Error retrieving saved documents: {str(e)}")
+            return
+
+    if not page["documents"] and len(cursors) == 1:
+        st.info("No saved documents found")
+        return
+
+    for doc in page["documents"]:
+        st.markdown(f"**{doc['filename']}** ({doc['doc_type']})")
+        st.markdown(f"Uploaded: {doc['upload_date'][:10]}")
+        if st.button("Load", key=f"load_{doc['id']}"):
+
+            st.info(f"Loading {doc['filename']}...")
+
+    newer, older = st.columns(2)
+    if len(cursors) > 1 and newer.button("Newer"):
+        cursors.pop()
+        st.rerun()
+    if page["next_cursor"] and older.button("Older"):
+        cursors.append(page["next_cursor"])
+        st.rerun()
 
 if __name__ == "__main__":
     main()
@@ -1 +1,5 @@
+from dotenv import load_dotenv
 
+# Every backend module reads its settings from the environment at import time,
+# so .env has to be loaded before any of them
+load_dotenv()
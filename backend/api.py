@@ -1,11 +1,58 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from .parser import parse_document
-from .linker import link_arguments
-from typing import Dict, List, Any
-import json
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
+from starlette.routing import Match
+from contextlib import asynccontextmanager
+from .parser import parse_document, save_upload, UploadTooLargeError, MAX_UPLOAD_SIZE
+from .briefs import brief_store
+from .linker import (link_arguments, link_brief_pairs, iter_links, relink_arguments, result_hashes,
+                     LEXICAL_CANDIDATES, ARGUMENT_CHUNKING, CHUNKING_MODES)
+from .models import registry
+from .executor import link_pool, ExecutorSaturatedError, ExecutorTimeoutError
+from .jobs import job_manager, Job, JobQueueFullError
+from .index import argument_index, search_arguments, save_brief, IndexEncoderError, INDEX_NPROBE
+from .metrics import metrics, request_seconds, start_request_timing, server_timing_header
+from .transport import (CompressedRoute, StreamingGZipMiddleware, BodySizeLimitMiddleware, JSON_RESPONSE_CLASS,
+                        GZIP_MINIMUM_SIZE, MULTIPART_OVERHEAD, dumps)
+from typing import AsyncIterator, Dict, List, Any, Tuple
+import os
+import threading
+import time
 
-app = FastAPI()
+# Add a Server-Timing header with per-stage durations to every response
+REQUEST_TIMING_HEADER = os.getenv("REQUEST_TIMING_HEADER", "").lower() in ("1", "true", "yes")
+# "background" serves requests while the embedding model loads, "startup" waits
+# for it before accepting any, and "off" loads it on the first /link
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "background")
+MODEL_WARMUP_MODES = ("background", "startup", "off")
+
+def warm_up() -> None:
+    """
+    Load the embedding model and the argument index ahead of the first request that needs them
+    """
+    registry.warm_up()
+    argument_index.load()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if MODEL_WARMUP not in MODEL_WARMUP_MODES:
+        raise ValueError(f"Unknown MODEL_WARMUP {MODEL_WARMUP!r}, expected one of {', '.join(MODEL_WARMUP_MODES)}")
+    if MODEL_WARMUP == "startup":
+        await run_in_threadpool(warm_up)
+    elif MODEL_WARMUP == "background":
+        # Uploads don't need the model; linking requests that arrive before it
+        # is ready wait on the registry lock instead of loading it again
+        threading.Thread(target=warm_up, name="model-warmup", daemon=True).start()
+    link_pool.start()
+    job_manager.start()
+    yield
+    await job_manager.shutdown()
+    link_pool.shutdown()
+
+app = FastAPI(lifespan=lifespan, default_response_class=JSON_RESPONSE_CLASS)
+# Accept gzip-compressed request bodies on every route defined below
+app.router.route_class = CompressedRoute
 
 # Add CORS middleware
 app.add_middleware(
@@ -15,39 +62,293 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(StreamingGZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+# Refuse oversized uploads before Starlette spools them to disk; /jobs takes two files
+app.add_middleware(BodySizeLimitMiddleware, limits={
+    "/upload": MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD,
+    "/jobs": 2 * MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD
+})
+
+def route_path(request: Request) -> str:
+    """
+    The route template (e.g. /jobs/{job_id}) so metrics labels stay bounded
+    """
+    for route in request.app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    timings = start_request_timing()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - start
+        request_seconds.observe(elapsed, method=request.method, path=route_path(request), status=status)
+    if REQUEST_TIMING_HEADER:
+        response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    return response
+
+@app.get("/metrics")
+async def prometheus_metrics() -> PlainTextResponse:
+    """
+    Prometheus scrape endpoint
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+async def readiness() -> Dict:
+    """
+    Report whether the embedding models are loaded and warmed up
+    """
+    if not registry.is_ready():
+        raise HTTPException(status_code=503, detail="Models are still loading")
+    return {"status": "ready", "models": registry.loaded_models()}
+
+def check_file_type(file: UploadFile) -> None:
+    """
+    Reject anything that is not a PDF or DOCX upload
+    """
+    filename = file.filename.lower()
+    if not (filename.endswith('.pdf') or filename.endswith('.docx')):
+        raise HTTPException(status_code=400, detail="Only PDF and DOCX files are supported")
 
 @app.post("/upload")
-async def upload_document(file: UploadFile = File(...)) -> Dict:
+async def upload_document(background_tasks: BackgroundTasks, file: UploadFile = File(...),
+                          document_type: str = Form("unknown")) -> Dict:
     """
-    Process uploaded document using LlamaParse
+    Process uploaded document using LlamaParse. Newly parsed briefs are saved
+    and added to the argument index after the response is sent.
     """
     try:
         if not file:
             raise HTTPException(status_code=400, detail="No file uploaded")
             
-        # Check file extension
-        filename = file.filename.lower()
-        if not (filename.endswith('.pdf') or filename.endswith('.docx')):
-            raise HTTPException(status_code=400, detail="Only PDF and DOCX files are supported")
+        check_file_type(file)
             
-        parsed_content = await parse_document(file)
+        parsed_content = await parse_document(
+            file, on_parsed=lambda brief: background_tasks.add_task(save_brief, brief, document_type)
+        )
         return {"status": "success", "data": parsed_content}
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+def resolve_briefs(payload: Dict[str, Any]) -> Tuple[Dict, Dict]:
+    """
+    The moving and response briefs of a link request, each given in full or
+    as the brief_id of a brief uploaded earlier
+    """
+    briefs = []
+    for side in ("moving", "response"):
+        if f"{side}_brief" in payload:
+            briefs.append(payload[f"{side}_brief"])
+        elif f"{side}_brief_id" in payload:
+            brief = brief_store.get(payload[f"{side}_brief_id"])
+            if brief is None:
+                raise HTTPException(status_code=404,
+                                    detail=f"Unknown {side}_brief_id {payload[f'{side}_brief_id']}, upload the brief again")
+            briefs.append(brief)
+        else:
+            raise HTTPException(status_code=400, detail="Both moving_brief and response_brief (or their brief ids) are required")
+    return briefs[0], briefs[1]
+
+def int_option(payload: Dict[str, Any], name: str, default: int, minimum: int) -> int:
+    """
+    An integer option of a request, which must be at least minimum
+    """
+    value = payload.get(name, default)
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = None
+    if number is None or isinstance(value, (bool, float)) or number < minimum:
+        raise HTTPException(status_code=400, detail=f"{name} must be an integer of at least {minimum}")
+    return number
+
+def link_options(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The linking options of a /link or /link/batch request, checked up front so
+    a bad value is a 400 rather than an error inside the worker pool
+    """
+    if payload.get("assignment", "greedy") not in ("greedy", "optimal"):
+        raise HTTPException(status_code=400, detail="assignment must be 'greedy' or 'optimal'")
+    if payload.get("chunking", ARGUMENT_CHUNKING) not in CHUNKING_MODES:
+        raise HTTPException(status_code=400, detail=f"chunking must be one of {', '.join(CHUNKING_MODES)}")
+    return {
+        "assignment": payload.get("assignment", "greedy"),
+        "capacity": int_option(payload, "capacity", 1, minimum=1),
+        "candidates": int_option(payload, "candidates", LEXICAL_CANDIDATES, minimum=0),
+        "chunking": payload.get("chunking", ARGUMENT_CHUNKING)
+    }
+
 @app.post("/link")
-async def link_documents(payload: Dict[str, Any]) -> Dict:
+async def link_documents(payload: Dict[str, Any]):
     """
-    Link arguments between moving and response briefs
+    Link arguments between moving and response briefs, given in full or by
+    the brief_id /upload returned ("moving_brief_id", "response_brief_id").
+    With "stream": "ndjson" or "sse", links are sent one by one as they are found.
+    With "previous" set to an earlier response ({"links", "argument_hashes"}),
+    only arguments whose text changed are re-linked and a diff is returned.
     """
     try:
-        if "moving_brief" not in payload or "response_brief" not in payload:
-            raise HTTPException(status_code=400, detail="Both moving_brief and response_brief are required")
-            
-        moving_brief = payload["moving_brief"]
-        response_brief = payload["response_brief"]
+        moving_brief, response_brief = resolve_briefs(payload)
+        options = link_options(payload)
+
+        stream = payload.get("stream")
+        previous = payload.get("previous")
+        if previous is not None:
+            if stream:
+                raise HTTPException(status_code=400, detail="previous can't be combined with stream")
+            if not isinstance(previous, dict):
+                raise HTTPException(status_code=400, detail="previous must be an earlier /link response")
+            result = await link_pool.run(relink_arguments, moving_brief, response_brief, previous, **options)
+            return {"status": "success", **result}
+
+        if stream:
+            if stream not in STREAM_MEDIA_TYPES:
+                raise HTTPException(status_code=400, detail="stream must be 'ndjson' or 'sse'")
+            # Links are found in the worker pool, which keeps a slot until the last one
+            links = link_pool.stream(iter_links, moving_brief, response_brief, stream=True, **options)
+            return StreamingResponse(format_link_stream(links, stream), media_type=STREAM_MEDIA_TYPES[stream])
         
-        links = link_arguments(moving_brief, response_brief)
-        return {"status": "success", "links": links}
+        # Linking is CPU-bound, so run it in the worker pool to keep the event loop free
+        links = await link_pool.run(link_arguments, moving_brief, response_brief, **options)
+        hashes = result_hashes(moving_brief, response_brief, **options)
+        return {"status": "success", "links": links, "argument_hashes": hashes}
+    except HTTPException:
+        raise
+    except ExecutorSaturatedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    except ExecutorTimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+async def format_link_stream(links: AsyncIterator[Dict], stream: str) -> AsyncIterator[str]:
+    """
+    Serialize links as NDJSON lines or server-sent events, ending with an
+    error frame if linking fails or runs past LINK_TIMEOUT
+    """
+    def frame(event: str, data: Dict) -> str:
+        if stream == "sse":
+            return f"event: {event}\ndata: {dumps(data)}\n\n"
+        return dumps(data if event == "link" else {event: data}) + "\n"
+
+    count = 0
+    try:
+        async for link in links:
+            count += 1
+            yield frame("link", link)
+    except Exception as e:
+        yield frame("error", {"detail": str(e)})
+        return
+    yield frame("done", {"links": count})
+
+@app.post("/link/batch")
+async def link_batch(payload: Dict[str, Any]) -> StreamingResponse:
+    """
+    Link many brief pairs at once, streaming one NDJSON line per pair as it finishes.
+    Like /link, each pair may give its briefs by brief_id.
+    """
+    pairs = payload.get("pairs")
+    if not isinstance(pairs, list) or not pairs:
+        raise HTTPException(status_code=400, detail="pairs must be a non-empty list")
+    options = link_options(payload)
+    # A brief id that can't be resolved fails its own pair, not the batch
+    resolved, unresolved = [], {}
+    for index, pair in enumerate(pairs):
+        if isinstance(pair, dict) and ("moving_brief_id" in pair or "response_brief_id" in pair):
+            try:
+                moving_brief, response_brief = resolve_briefs(pair)
+                pair = dict(pair, moving_brief=moving_brief, response_brief=response_brief)
+            except HTTPException as e:
+                unresolved[index] = e.detail
+            except Exception as e:
+                unresolved[index] = f"Invalid brief id: {str(e)}"
+        resolved.append(pair)
+
+    try:
+        # Runs in the worker pool, holding one slot until every pair is done
+        results = link_pool.stream(link_brief_pairs, resolved, pair_errors=unresolved, **options)
+    except ExecutorSaturatedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    return StreamingResponse(format_batch_stream(results), media_type="application/x-ndjson")
+
+async def format_batch_stream(results: AsyncIterator[Dict]) -> AsyncIterator[str]:
+    """
+    One NDJSON line per pair, then an {"error": ...} line if the batch was
+    cut short (e.g. by LINK_TIMEOUT)
+    """
+    try:
+        async for result in results:
+            yield dumps(result) + "\n"
+    except Exception as e:
+        yield dumps({"error": {"detail": str(e)}}) + "\n"
+
+@app.post("/search")
+async def search(payload: Dict[str, Any]) -> Dict:
+    """
+    Find the most similar arguments across all previously stored briefs
+    """
+    text = payload.get("text")
+    if not text:
+        raise HTTPException(status_code=400, detail="text is required")
+    top_k = int_option(payload, "top_k", 10, minimum=1)
+    nprobe = int_option(payload, "nprobe", INDEX_NPROBE, minimum=1)
+
+    try:
+        results = await run_in_threadpool(search_arguments, text, top_k, nprobe)
+    except IndexEncoderError as e:
+        # The index was built with another model; its scores would be meaningless
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "success", "results": results}
+
+@app.post("/jobs", status_code=202)
+async def create_job(moving_brief: UploadFile = File(...), response_brief: UploadFile = File(...)) -> Dict:
+    """
+    Queue a full parse and link analysis of a brief pair and return its job id immediately
+    """
+    check_file_type(moving_brief)
+    check_file_type(response_brief)
+
+    uploads = []
+    try:
+        for file in (moving_brief, response_brief):
+            uploads.append(await save_upload(file))
+        job = job_manager.submit(Job(uploads[0], moving_brief.filename, uploads[1], response_brief.filename))
+    except UploadTooLargeError as e:
+        discard_uploads(uploads)
+        raise HTTPException(status_code=413, detail=str(e))
+    except JobQueueFullError as e:
+        discard_uploads(uploads)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    except BaseException:
+        # e.g. the disk filling up while the second file is saved
+        discard_uploads(uploads)
+        raise
+
+    return {"status": "accepted", "job_id": job.job_id}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str) -> Dict:
+    """
+    Status, progress and (once finished) results of an analysis job
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+def discard_uploads(uploads: List) -> None:
+    for upload in uploads:
+        if os.path.exists(upload.path):
+            os.remove(upload.path)
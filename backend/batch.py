@@ -0,0 +1,47 @@
+from typing import Dict, List
+import argparse
+import json
+import sys
+from .linker import link_brief_pairs, LEXICAL_CANDIDATES, ARGUMENT_CHUNKING, CHUNKING_MODES
+
+def load_pairs(path: str) -> List[Dict]:
+    """
+    Read brief pairs from a JSON list or a JSON-lines file ("-" for stdin)
+    """
+    handle = sys.stdin if path == "-" else open(path)
+    try:
+        text = handle.read()
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        return json.loads(stripped)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Link many moving/response brief pairs, writing NDJSON results")
+    parser.add_argument("pairs", help="JSON list or JSON-lines file of {moving_brief, response_brief} pairs, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="Output NDJSON file (default: stdout)")
+    parser.add_argument("--assignment", choices=["greedy", "optimal"], default="greedy")
+    parser.add_argument("--capacity", type=int, default=1)
+    parser.add_argument("--candidates", type=int, default=LEXICAL_CANDIDATES,
+                        help="Lexical prefilter candidates per moving argument (0 scores every pair)")
+    parser.add_argument("--chunking", choices=CHUNKING_MODES, default=ARGUMENT_CHUNKING,
+                        help="How arguments longer than one window are embedded")
+    args = parser.parse_args()
+
+    pairs = load_pairs(args.pairs)
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        for result in link_brief_pairs(pairs, assignment=args.assignment, capacity=args.capacity,
+                                       candidates=args.candidates, chunking=args.chunking):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import os
+import threading
+import time
+from .metrics import metrics
+
+BRIEF_STORE_SIZE = int(os.getenv("BRIEF_STORE_SIZE", "512"))
+BRIEF_STORE_TTL = float(os.getenv("BRIEF_STORE_TTL", str(24 * 3600)))
+
+class BriefStore:
+    """
+    Parsed briefs by brief_id, so clients can link briefs they uploaded before
+    by reference instead of posting them back. Kept in memory with TTL and LRU
+    eviction; stored briefs are shared, so callers must not modify them.
+    """
+    def __init__(self, max_entries: int = BRIEF_STORE_SIZE, ttl: float = BRIEF_STORE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, brief_id: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(brief_id)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[brief_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(brief_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, brief: Dict) -> None:
+        if self.max_entries <= 0 or not brief.get("brief_id"):
+            return
+        with self._lock:
+            self._entries[brief["brief_id"]] = (time.time(), brief)
+            self._entries.move_to_end(brief["brief_id"])
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+brief_store = BriefStore()
+
+def _brief_store_metrics() -> List[str]:
+    return [
+        "# TYPE legalbrief_brief_store_briefs gauge",
+        f"legalbrief_brief_store_briefs {len(brief_store)}",
+        "# TYPE legalbrief_brief_store_hits_total counter",
+        f"legalbrief_brief_store_hits_total {brief_store.hits}",
+        "# TYPE legalbrief_brief_store_misses_total counter",
+        f"legalbrief_brief_store_misses_total {brief_store.misses}"
+    ]
+
+metrics.add_collector(_brief_store_metrics)
@@ -0,0 +1,242 @@
+from typing import Dict, List
+import fcntl
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "torch" runs SentenceTransformer as is, "onnx" an ONNX export of the same model
+# on ONNX Runtime, and "onnx-int8" that export with dynamically quantized weights
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ENCODER_BACKENDS = ("torch", "onnx", "onnx-int8")
+# Intra-op threads for the encoder; 0 leaves the runtime default (all cores)
+ENCODER_THREADS = int(os.getenv("ENCODER_THREADS", "0"))
+ENCODER_CACHE_DIR = os.getenv("ENCODER_CACHE_DIR", ".cache/encoders")
+# Lowest per-text cosine against the PyTorch model an ONNX backend may have
+ENCODER_PARITY_MIN = float(os.getenv("ENCODER_PARITY_MIN", "0.98"))
+ONNX_OPSET = 14
+
+PARITY_TEXTS = [
+    "The court lacks personal jurisdiction over the defendant because it has no contacts with the forum.",
+    "Plaintiff's claims are barred by the two-year statute of limitations.",
+    "See Smith v. Jones, 410 U.S. 113, 115 (1973).",
+    "Under Fed. R. Civ. P. 12(b)(6), a complaint must state a plausible claim for relief.",
+    "The arbitration clause covers every dispute arising out of the agreement.",
+    "Defendant owed no fiduciary duty to plaintiff as a matter of law.",
+    "Equitable tolling is unavailable where the plaintiff did not pursue her rights diligently.",
+    "Qualified immunity shields officials unless they violated clearly established law.",
+    "The forum selection clause is mandatory and enforceable.",
+    "Damages are speculative because plaintiff cannot show causation.",
+    "Summary judgment is appropriate when there is no genuine dispute of material fact.",
+    "The legislative history confirms that Congress intended a narrow reading of the statute."
+]
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def export_dir(name: str) -> str:
+    return os.path.join(ENCODER_CACHE_DIR, re.sub(r"[^A-Za-z0-9_.-]", "_", name))
+
+def load_encoder(name: str, backend: str = EMBEDDING_BACKEND):
+    """
+    Load the encoder for model name on the given backend. ONNX exports are built
+    on first use and reused from ENCODER_CACHE_DIR; one that failed its parity
+    check falls back to the PyTorch model.
+    """
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    if backend != "torch":
+        directory = export_dir(name)
+        if not os.path.exists(os.path.join(directory, "config.json")):
+            ensure_export(name, directory)
+        encoder = OnnxEncoder(directory, quantized=backend == "onnx-int8", threads=ENCODER_THREADS)
+        parity = encoder.config["parity"].get(backend, {})
+        if parity.get("min_cosine", 0.0) >= ENCODER_PARITY_MIN:
+            return encoder
+        logger.error(f"{backend} export of {name} failed its parity check ({parity}), using PyTorch instead")
+
+    # Imported here because torch alone takes seconds to import
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(name, device="cpu")
+    if ENCODER_THREADS > 0:
+        import torch
+        torch.set_num_threads(ENCODER_THREADS)
+    return model
+
+def ensure_export(name: str, directory: str) -> None:
+    """
+    Export model name to directory unless another process has already. Exports
+    are built in a temporary sibling directory and renamed into place under a
+    file lock, so the API and each process-pool worker starting together export
+    once, and nobody reads an export before its parity results are written.
+    """
+    parent = os.path.dirname(directory) or "."
+    os.makedirs(parent, exist_ok=True)
+    # The lock is released when the file is closed
+    with open(directory + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if os.path.exists(os.path.join(directory, "config.json")):
+            return
+        staging = tempfile.mkdtemp(prefix=f".{os.path.basename(directory)}.", dir=parent)
+        try:
+            export_onnx(name, staging)
+            if os.path.exists(directory):
+                # An incomplete export written in place by an older version
+                shutil.rmtree(directory)
+            os.rename(staging, directory)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+def export_onnx(name: str, directory: str) -> Dict:
+    """
+    Export the transformer of a SentenceTransformer model to ONNX, write a
+    dynamically int8-quantized copy, and record both exports' parity with the
+    PyTorch model next to them
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    logger.info(f"Exporting {name} to ONNX in {directory}")
+    model = SentenceTransformer(name, device="cpu")
+    transformer, pooling = model[0], model[1]
+    tokenizer = transformer.tokenizer
+    os.makedirs(directory, exist_ok=True)
+    tokenizer.save_pretrained(directory)
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [key for key in ("input_ids", "attention_mask", "token_type_ids") if key in sample]
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    axes = {key: {0: "batch", 1: "sequence"} for key in input_names + ["token_embeddings"]}
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(transformer.auto_model.eval()),
+            tuple(sample[key] for key in input_names),
+            os.path.join(directory, "model.onnx"),
+            input_names=input_names,
+            output_names=["token_embeddings"],
+            dynamic_axes=axes,
+            opset_version=ONNX_OPSET
+        )
+    quantize_dynamic(os.path.join(directory, "model.onnx"), os.path.join(directory, "model.int8.onnx"),
+                     weight_type=QuantType.QInt8)
+
+    config = {
+        "model": name,
+        "dim": model.get_sentence_embedding_dimension(),
+        "max_seq_length": model.max_seq_length,
+        "pooling": "cls" if pooling.pooling_mode_cls_token else "max" if pooling.pooling_mode_max_tokens else "mean",
+        "normalize": any(type(module).__name__ == "Normalize" for module in model),
+        "parity": {}
+    }
+    with open(os.path.join(directory, "config.json"), "w") as f:
+        json.dump(config, f, indent=2)
+
+    for backend in ("onnx", "onnx-int8"):
+        config["parity"][backend] = check_parity(model, OnnxEncoder(directory, quantized=backend == "onnx-int8"))
+        logger.info(f"{backend} parity with PyTorch: {config['parity'][backend]}")
+    with open(os.path.join(directory, "config.json"), "w") as f:
+        json.dump(config, f, indent=2)
+    return config
+
+def check_parity(reference, candidate, texts: List[str] = PARITY_TEXTS) -> Dict:
+    """
+    Agreement of candidate's embeddings with reference's: per-text cosine, and how
+    often both pick the same nearest neighbour for each text
+    """
+    expected = _normalize(np.asarray(reference.encode(texts, convert_to_numpy=True), dtype=np.float32))
+    actual = _normalize(np.asarray(candidate.encode(texts, convert_to_numpy=True), dtype=np.float32))
+    cosines = (expected * actual).sum(axis=1)
+
+    expected_similarities, actual_similarities = expected @ expected.T, actual @ actual.T
+    np.fill_diagonal(expected_similarities, -np.inf)
+    np.fill_diagonal(actual_similarities, -np.inf)
+    agreement = expected_similarities.argmax(axis=1) == actual_similarities.argmax(axis=1)
+    return {
+        "texts": len(texts),
+        "mean_cosine": float(cosines.mean()),
+        "min_cosine": float(cosines.min()),
+        "top1_agreement": float(agreement.mean())
+    }
+
+class OnnxEncoder:
+    """
+    SentenceTransformer-compatible encode() over an ONNX export. Texts are
+    tokenized once and sorted by token count, so each batch is padded only to
+    its own longest text, then run on ONNX Runtime and pooled like the original.
+    """
+    def __init__(self, directory: str, quantized: bool = False, threads: int = ENCODER_THREADS):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(directory, "config.json")) as f:
+            self.config = json.load(f)
+        self.max_seq_length = self.config["max_seq_length"]
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Requests are already served concurrently, so one op runs at a time per session
+        options.inter_op_num_threads = 1
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        path = os.path.join(directory, "model.int8.onnx" if quantized else "model.onnx")
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [tensor.name for tensor in self.session.get_inputs()]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.config["dim"]
+
+    def _pool(self, tokens: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        if self.config["pooling"] == "cls":
+            return tokens[:, 0]
+        mask = mask[:, :, None].astype(np.float32)
+        if self.config["pooling"] == "max":
+            return np.where(mask > 0, tokens, -1e9).max(axis=1)
+        return (tokens * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, texts, batch_size: int = 32, convert_to_numpy: bool = True,
+               normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+        encoded = self.tokenizer(list(texts), truncation=True, max_length=self.max_seq_length)
+        lengths = np.array([len(ids) for ids in encoded["input_ids"]])
+        order = np.argsort(-lengths, kind="stable")
+
+        embeddings = np.zeros((len(texts), self.config["dim"]), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch = order[start:start + batch_size]
+            width = int(lengths[batch].max())
+            feeds = {}
+            for name in self.input_names:
+                pad = self.tokenizer.pad_token_id if name == "input_ids" else 0
+                array = np.full((len(batch), width), pad or 0, dtype=np.int64)
+                for row, index in enumerate(batch):
+                    values = encoded[name][index] if name in encoded else [0] * lengths[index]
+                    array[row, :len(values)] = values
+                feeds[name] = array
+            tokens = self.session.run(None, feeds)[0]
+            embeddings[batch] = self._pool(tokens, feeds["attention_mask"])
+
+        if self.config["normalize"] or normalize_embeddings:
+            embeddings = _normalize(embeddings)
+        return embeddings[0] if single else embeddings
@@ -0,0 +1,198 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Optional
+import asyncio
+import contextvars
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LINK_EXECUTOR = os.getenv("LINK_EXECUTOR", "thread")
+LINK_WORKERS = int(os.getenv("LINK_WORKERS", "2"))
+LINK_QUEUE_DEPTH = int(os.getenv("LINK_QUEUE_DEPTH", "8"))
+LINK_TIMEOUT = float(os.getenv("LINK_TIMEOUT", "120"))
+
+class ExecutorSaturatedError(RuntimeError):
+    pass
+
+class ExecutorTimeoutError(TimeoutError):
+    pass
+
+def _preload_model() -> None:
+    """
+    Process pool initializer: load the embedding model once per worker
+    """
+    from .models import registry
+    registry.warm_up()
+
+def _collect(fn: Callable, *args, **kwargs) -> list:
+    """
+    Run a generator to completion in a process worker, which can only hand back a whole result
+    """
+    return list(fn(*args, **kwargs))
+
+class WorkerPool:
+    """
+    Runs CPU-bound work off the event loop in a thread or process pool, with a
+    bounded number of in-flight jobs and a per-call timeout
+    """
+    def __init__(self, kind: str = LINK_EXECUTOR, workers: int = LINK_WORKERS,
+                 queue_depth: int = LINK_QUEUE_DEPTH, timeout: float = LINK_TIMEOUT):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.timeout = timeout
+        self._pool: Optional[Executor] = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_depth
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def start(self) -> None:
+        if self._pool is not None:
+            return
+        logger.info(f"Starting {self.kind} pool with {self.workers} workers")
+        if self.kind == "process":
+            # spawn rather than fork so workers don't inherit torch thread state
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_preload_model
+            )
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="link")
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def _submit(self, call: Callable) -> Any:
+        """
+        Take a slot and submit call, raising ExecutorSaturatedError when every
+        worker and queue slot is taken. The slot is held until the work really
+        finishes, even if the caller stops waiting for it.
+        """
+        if self._pool is None:
+            self.start()
+
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                raise ExecutorSaturatedError("Too many analyses in progress, try again shortly")
+            self._in_flight += 1
+
+        try:
+            future = self._pool.submit(call)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _timeout_error(self) -> ExecutorTimeoutError:
+        return ExecutorTimeoutError(f"Analysis did not finish within {self.timeout:.0f} seconds")
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run fn in the pool, raising ExecutorSaturatedError when every worker and
+        queue slot is taken and ExecutorTimeoutError when the call runs too long
+        """
+        call = functools.partial(fn, *args, **kwargs)
+        if self.kind == "thread":
+            # Carry the request context over so stage timings land on this request
+            call = functools.partial(contextvars.copy_context().run, call)
+        future = self._submit(call)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise self._timeout_error()
+
+    def stream(self, fn: Callable, *args, **kwargs) -> AsyncIterator:
+        """
+        Start iterating the generator fn(*args, **kwargs) in the pool and return
+        an async iterator over its items. The slot is taken right away, so
+        ExecutorSaturatedError is raised before a response starts, and is held
+        until the generator finishes. Past the timeout the generator is stopped
+        and the iterator raises ExecutorTimeoutError. Process workers can't hand
+        items back one by one, so there they all arrive when the generator ends.
+        """
+        loop = asyncio.get_running_loop()
+        items: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        deadline = time.monotonic() + self.timeout
+
+        def publish(kind: str, value: Any = None) -> None:
+            try:
+                loop.call_soon_threadsafe(items.put_nowait, (kind, value))
+            except RuntimeError:
+                # The event loop is gone, so nobody is listening any more
+                stop.set()
+
+        if self.kind == "thread":
+            def produce() -> None:
+                generator = fn(*args, **kwargs)
+                try:
+                    for item in generator:
+                        publish("item", item)
+                        # Checked between items: a consumer that left or timed out stops the work
+                        if stop.is_set() or time.monotonic() > deadline:
+                            return
+                    publish("done")
+                except Exception as e:
+                    publish("error", e)
+                finally:
+                    generator.close()
+
+            future = self._submit(functools.partial(contextvars.copy_context().run, produce))
+        else:
+            def deliver(done) -> None:
+                if done.cancelled():
+                    return
+                if done.exception() is not None:
+                    publish("error", done.exception())
+                    return
+                for item in done.result():
+                    publish("item", item)
+                publish("done")
+
+            future = self._submit(functools.partial(_collect, fn, *args, **kwargs))
+            future.add_done_callback(deliver)
+
+        async def consume() -> AsyncIterator:
+            try:
+                while True:
+                    try:
+                        kind, value = await asyncio.wait_for(items.get(), max(deadline - time.monotonic(), 0))
+                    except asyncio.TimeoutError:
+                        raise self._timeout_error()
+                    if kind == "done":
+                        return
+                    if kind == "error":
+                        raise value
+                    yield value
+            finally:
+                stop.set()
+                future.cancel()
+
+        return consume()
+
+link_pool = WorkerPool()
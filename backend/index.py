@@ -0,0 +1,424 @@
+import numpy as np
+from typing import Dict, List, Optional
+import argparse
+import json
+import logging
+import os
+import threading
+from .linker import ArgumentLinker, argument_text
+from .quantization import VectorStore, SCORE_BLOCK_ROWS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ARGUMENT_INDEX_DIR = os.getenv("ARGUMENT_INDEX_DIR", ".cache/argument_index")
+# Below this many vectors a brute-force scan is faster than probing lists
+INDEX_TRAIN_MIN = int(os.getenv("INDEX_TRAIN_MIN", "2048"))
+INDEX_NPROBE = int(os.getenv("INDEX_NPROBE", "8"))
+# In-memory storage of indexed vectors: float32, float16 (half the RAM) or int8 (a quarter)
+INDEX_VECTOR_FORMAT = os.getenv("INDEX_VECTOR_FORMAT", "float16")
+# Also store every newly parsed brief in the Supabase briefs table (off by default)
+SAVE_UPLOADED_BRIEFS = os.getenv("SAVE_UPLOADED_BRIEFS", "").lower() in ("1", "true", "yes")
+# Embed newly parsed and stored briefs into the index as they arrive (on by default)
+INDEX_UPLOADED_BRIEFS = os.getenv("INDEX_UPLOADED_BRIEFS", "1").lower() in ("1", "true", "yes")
+
+class IndexEncoderError(ValueError):
+    pass
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    Spherical k-means on L2-normalized rows, returning normalized centroids
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = (vectors @ centroids.T).argmax(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=k)
+        # Empty clusters keep their previous centroid
+        filled = counts > 0
+        centroids[filled] = sums[filled]
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = centroids / norms
+    return centroids.astype(np.float32)
+
+class ArgumentIndex:
+    """
+    IVF (inverted file) index over normalized argument embeddings.
+
+    Vectors and metadata are appended to files in `directory` as they arrive;
+    the coarse k-means centroids are retrained whenever the index has grown
+    4x since the last training. Until INDEX_TRAIN_MIN vectors are stored,
+    search is an exact scan. In memory, vectors are held in vector_format
+    (float32, float16 or int8); the on-disk copy stays float32. The files are
+    read on first use, so importing the backend doesn't load the whole index.
+    The index records the cache key of the encoder its vectors came from, and
+    refuses vectors or queries from any other encoder until it is rebuilt.
+    """
+    def __init__(self, directory: Optional[str] = ARGUMENT_INDEX_DIR, dim: Optional[int] = None,
+                 vector_format: str = INDEX_VECTOR_FORMAT):
+        self.directory = directory
+        self.vector_format = vector_format
+        self._store: Optional[VectorStore] = VectorStore(dim, vector_format) if dim else None
+        self._metadata: List[Dict] = []
+        self._brief_ids = set()
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: Optional[np.ndarray] = None
+        self._trained_size = 0
+        self._encoder: Optional[str] = None
+        self._lock = threading.Lock()
+        self._loaded = not directory
+
+    def __len__(self) -> int:
+        self.load()
+        return len(self._store) if self._store is not None else 0
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self._store.dim if self._store is not None else None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def has_brief(self, brief_id: str) -> bool:
+        self.load()
+        return brief_id in self._brief_ids
+
+    def load(self) -> None:
+        """
+        Read the index from disk unless that has been done already
+        """
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+
+    def clear(self) -> None:
+        """
+        Drop every stored vector, in memory and on disk
+        """
+        with self._lock:
+            self._loaded = True
+            self._store = None
+            self._metadata = []
+            self._brief_ids = set()
+            self._centroids = None
+            self._lists = None
+            self._trained_size = 0
+            self._encoder = None
+            if self.directory:
+                for name in ("vectors.f32", "meta.jsonl", "index.json", "centroids.npy"):
+                    if os.path.exists(self._path(name)):
+                        os.remove(self._path(name))
+
+    def _load(self) -> None:
+        if not os.path.exists(self._path("meta.jsonl")):
+            return
+        metadata, torn = [], False
+        with open(self._path("meta.jsonl")) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    metadata.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A write cut short by a crash; everything after it is dropped below
+                    torn = True
+                    break
+        vector_bytes = os.path.getsize(self._path("vectors.f32")) if os.path.exists(self._path("vectors.f32")) else 0
+        header = {}
+        if os.path.exists(self._path("index.json")):
+            with open(self._path("index.json")) as f:
+                header = json.load(f)
+        elif metadata and vector_bytes % (4 * len(metadata)) == 0:
+            # The header is written after each append, so a crash can lose it;
+            # with one vector per metadata row the dimension follows from the sizes
+            header = {"dim": vector_bytes // 4 // len(metadata)}
+        if not header.get("dim"):
+            logger.warning(f"Argument index in {self.directory} has no readable header, starting a new one")
+            for name in ("vectors.f32", "meta.jsonl", "centroids.npy"):
+                if os.path.exists(self._path(name)):
+                    os.remove(self._path(name))
+            return
+        dim = header["dim"]
+
+        # A crash between the two appends can leave one file a row ahead; cut both
+        # back on disk too, or the next append would pair vectors with the wrong rows
+        size = min(len(metadata), vector_bytes // (4 * dim))
+        if vector_bytes != size * dim * 4:
+            os.truncate(self._path("vectors.f32"), size * dim * 4)
+        if torn or len(metadata) != size:
+            with open(self._path("meta.jsonl"), "w") as f:
+                for item in metadata[:size]:
+                    f.write(json.dumps(item) + "\n")
+        vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r", shape=(size, dim)) \
+            if size else np.zeros((0, dim), dtype=np.float32)
+
+        self._metadata = metadata[:size]
+        self._brief_ids = {item["brief_id"] for item in self._metadata}
+        self._store = VectorStore(dim, self.vector_format)
+        self._encoder = header.get("encoder")
+        if os.path.exists(self._path("centroids.npy")):
+            self._centroids = np.load(self._path("centroids.npy"))
+            self._trained_size = header.get("trained_size", size)
+            self._lists = np.zeros(0, dtype=np.int32)
+
+        # Load in slices so the float32 file is never fully resident next to the store
+        for start in range(0, size, SCORE_BLOCK_ROWS):
+            block = np.asarray(vectors[start:min(start + SCORE_BLOCK_ROWS, size)])
+            self._store.append(block)
+            if self._centroids is not None:
+                self._lists = np.concatenate([self._lists, self._assign(block)])
+        if not os.path.exists(self._path("index.json")):
+            self._write_header()
+        logger.info(f"Loaded argument index with {size} vectors ({self.vector_format})")
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return (vectors @ self._centroids.T).argmax(axis=1).astype(np.int32)
+
+    def _write_header(self) -> None:
+        with open(self._path("index.json"), "w") as f:
+            json.dump({"dim": self.dim, "trained_size": self._trained_size, "encoder": self._encoder}, f)
+
+    def _check_encoder(self, encoder: Optional[str]) -> None:
+        """
+        Raise IndexEncoderError unless the stored vectors came from encoder.
+        Must hold the lock.
+        """
+        if encoder is None or self._store is None or len(self._store) == 0 or encoder == self._encoder:
+            return
+        built_with = f"built with {self._encoder}" if self._encoder else "built without recording its encoder"
+        raise IndexEncoderError(f"Argument index in {self.directory} was {built_with}, not {encoder}; "
+                                f"rebuild it with python -m backend.index --rebuild")
+
+    def add(self, vectors: np.ndarray, metadata: List[Dict], encoder: Optional[str] = None) -> None:
+        """
+        Append normalized vectors with one metadata dict per row, embedded by
+        the encoder with the given cache key
+        """
+        self.load()
+        with self._lock:
+            self._append(vectors, metadata, encoder)
+
+    def add_brief(self, brief_id: str, vectors: np.ndarray, metadata: List[Dict],
+                  encoder: Optional[str] = None) -> bool:
+        """
+        Add the vectors of one brief unless it is indexed already, checking and
+        appending under the same lock so concurrent callers can't both add it.
+        Returns whether they were added.
+        """
+        self.load()
+        with self._lock:
+            if brief_id in self._brief_ids:
+                return False
+            self._append(vectors, metadata, encoder)
+            return True
+
+    def _append(self, vectors: np.ndarray, metadata: List[Dict], encoder: Optional[str]) -> None:
+        """
+        Must hold the lock
+        """
+        if len(vectors) == 0:
+            return
+        self._check_encoder(encoder)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self._store is None or len(self._store) == 0:
+            self._store = VectorStore(vectors.shape[1], self.vector_format)
+            self._encoder = encoder
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+
+        self._store.append(vectors)
+        self._metadata.extend(metadata)
+        self._brief_ids.update(item["brief_id"] for item in metadata)
+
+        if self._centroids is not None:
+            self._lists = np.concatenate([self._lists, self._assign(vectors)])
+        if len(self._store) >= INDEX_TRAIN_MIN and len(self._store) >= 4 * self._trained_size:
+            self._train()
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path("vectors.f32"), "ab") as f:
+                vectors.tofile(f)
+            with open(self._path("meta.jsonl"), "a") as f:
+                for item in metadata:
+                    f.write(json.dumps(item) + "\n")
+            self._write_header()
+
+    def _train(self) -> None:
+        size = len(self._store)
+        vectors = self._store.all()
+        n_lists = max(1, int(np.sqrt(size)))
+        logger.info(f"Training argument index with {n_lists} lists over {size} vectors")
+        self._centroids = kmeans(vectors, n_lists)
+        self._lists = self._assign(vectors)
+        self._trained_size = size
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            np.save(self._path("centroids.npy"), self._centroids)
+
+    def search(self, query: np.ndarray, top_k: int = 10, nprobe: int = INDEX_NPROBE,
+               encoder: Optional[str] = None) -> List[Dict]:
+        """
+        Return the top_k stored arguments most similar to a normalized query
+        vector, embedded by the encoder with the given cache key
+        """
+        self.load()
+        with self._lock:
+            if len(self) == 0:
+                return []
+            self._check_encoder(encoder)
+            if self._centroids is None:
+                candidates = np.arange(len(self._store))
+            else:
+                centroid_scores = self._centroids @ query
+                probe = np.argpartition(-centroid_scores, min(nprobe, len(centroid_scores)) - 1)[:nprobe]
+                candidates = np.flatnonzero(np.isin(self._lists, probe))
+
+            scores = self._store.dot(query, candidates)
+            k = min(top_k, len(candidates))
+            if k == 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [
+                dict(self._metadata[candidates[i]], similarity_score=float(scores[i]))
+                for i in top
+            ]
+
+argument_index = ArgumentIndex()
+
+def index_key(brief_id: str, brief_content: Dict) -> str:
+    """
+    The id a brief is indexed under: its own content-hash brief_id, so the same
+    file is recognised whether or not it went through the database, rather
+    than the row id the briefs table generates for each insert
+    """
+    return brief_content.get("brief_id") or brief_id
+
+def index_brief(brief_id: str, brief_content: Dict, document_type: str) -> None:
+    """
+    Embed every argument of a stored brief and add it to the index, unless
+    it is indexed already. Registered as a brief listener on the shared
+    Database so inserts happen as briefs are saved.
+    """
+    brief_id = index_key(brief_id, brief_content)
+    arguments = brief_content.get("arguments", [])
+    if not arguments or argument_index.has_brief(brief_id):
+        return
+    linker = ArgumentLinker()
+    vectors = linker.encode_batch([argument_text(arg) for arg in arguments])
+    metadata = [
+        {
+            "brief_id": brief_id,
+            "document_type": document_type,
+            "heading": arg["heading"],
+            "section_id": arg.get("section_id")
+        }
+        for arg in arguments
+    ]
+    # Another upload or job may have indexed the same brief while this one was embedded
+    if argument_index.add_brief(brief_id, vectors, metadata, linker.model.cache_key):
+        logger.info(f"Indexed {len(arguments)} arguments from brief {brief_id}")
+
+def search_arguments(text: str, top_k: int = 10, nprobe: int = INDEX_NPROBE) -> List[Dict]:
+    """
+    Find the stored arguments most similar to a piece of text
+    """
+    linker = ArgumentLinker()
+    query = linker.encode_batch([text])[0]
+    return argument_index.search(query, top_k=top_k, nprobe=nprobe, encoder=linker.model.cache_key)
+
+_database = None
+_database_lock = threading.Lock()
+
+def shared_database():
+    """
+    The backend's Database, built on first use with index_brief registered
+    as a brief listener unless INDEX_UPLOADED_BRIEFS is off; None when
+    Supabase credentials aren't configured
+    """
+    global _database
+    if not (os.getenv("SUPABASE_URL") and os.getenv("SUPABASE_KEY")):
+        return None
+    with _database_lock:
+        if _database is None:
+            from database.db import Database
+            # Links are written behind, so storing them never holds up a job
+            database = Database(write_behind=True)
+            if INDEX_UPLOADED_BRIEFS:
+                database.add_brief_listener(index_brief)
+            _database = database
+    return _database
+
+def save_brief(brief: Dict, document_type: str) -> Optional[str]:
+    """
+    Keep a freshly parsed brief: stored in the briefs table when SAVE_UPLOADED_BRIEFS
+    is set and a database is configured (its listener indexes it), otherwise only
+    indexed, unless INDEX_UPLOADED_BRIEFS is off. Returns the id of the new
+    briefs row, if one was stored. Failures are logged rather than raised, so
+    they never fail an upload.
+    """
+    try:
+        database = shared_database() if SAVE_UPLOADED_BRIEFS else None
+        if database is None:
+            if INDEX_UPLOADED_BRIEFS:
+                index_brief(brief["brief_id"], brief, document_type)
+        elif argument_index.has_brief(brief["brief_id"]):
+            # The same file was stored by an earlier upload
+            logger.info(f"Brief {brief['brief_id']} is already stored")
+        else:
+            return database.store_brief(brief, document_type)
+    except Exception as e:
+        logger.error(f"Failed to save brief {brief.get('brief_id')}: {str(e)}")
+    return None
+
+def save_links(links: List[Dict], brief_pair_id: str) -> None:
+    """
+    Store the links of a brief pair under brief_pair_id, the briefs row of its
+    moving brief, when SAVE_UPLOADED_BRIEFS is set and a database is configured.
+    The write is queued behind, so this returns at once; failures are logged.
+    """
+    try:
+        database = shared_database() if SAVE_UPLOADED_BRIEFS else None
+        if database is not None and links:
+            database.store_links(links, brief_pair_id)
+    except Exception as e:
+        logger.error(f"Failed to save links for brief pair {brief_pair_id}: {str(e)}")
+
+def backfill(database, rebuild: bool = False) -> int:
+    """
+    Index every brief already in the briefs table, returning how many were
+    added. With rebuild the index is cleared first and every brief re-embedded.
+    """
+    if rebuild:
+        argument_index.clear()
+    count = 0
+    for row in database.iter_briefs():
+        if argument_index.has_brief(index_key(row["brief_id"], row["parsed_content"])):
+            continue
+        index_brief(row["brief_id"], row["parsed_content"], row["document_type"])
+        count += 1
+    return count
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Index every brief stored in the database; run it while the API is stopped"
+    )
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Clear the index and re-embed every brief instead of adding the missing ones")
+    args = parser.parse_args()
+
+    database = shared_database()
+    if database is None:
+        raise SystemExit("Supabase credentials not found")
+    count = backfill(database, rebuild=args.rebuild)
+    logger.info(f"Indexed {count} briefs; the index now holds {len(argument_index)} arguments")
+
+if __name__ == "__main__":
+    main()
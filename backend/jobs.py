@@ -0,0 +1,211 @@
+from typing import Callable, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import time
+import uuid
+from fastapi.concurrency import run_in_threadpool
+from .parser import SavedUpload, parse_saved_upload
+from .linker import iter_links
+from .executor import link_pool, ExecutorSaturatedError
+from .index import save_brief, save_links
+from .metrics import span
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))
+JOB_QUEUE_DEPTH = int(os.getenv("JOB_QUEUE_DEPTH", "32"))
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", "3600"))
+
+class JobQueueFullError(RuntimeError):
+    pass
+
+def link_job(moving_brief: Dict, response_brief: Dict,
+             on_link: Optional[Callable[[Dict], None]] = None, **options) -> List[Dict]:
+    """
+    Every link of a job's brief pair, each passed to on_link as soon as it is
+    found. Unlike link_arguments, which logs failures and returns no links,
+    errors are raised so the job is marked failed.
+    """
+    links = []
+    for link in iter_links(moving_brief, response_brief, **options):
+        links.append(link)
+        if on_link:
+            on_link(link)
+    return links
+
+class Job:
+    """
+    One upload -> parse -> link analysis of a moving/response brief pair
+    """
+    def __init__(self, moving_upload: SavedUpload, moving_filename: str,
+                 response_upload: SavedUpload, response_filename: str):
+        self.job_id = uuid.uuid4().hex
+        self.uploads = [(moving_upload, moving_filename), (response_upload, response_filename)]
+        self.status = "queued"
+        self.stage = "queued"
+        self.briefs_parsed = 0
+        self.briefs_total = len(self.uploads)
+        # (pages parsed, page count) per brief, known once parsing of it has started
+        self.pages: List[Tuple[int, int]] = [(0, 0)] * len(self.uploads)
+        self.arguments_linked = 0
+        self.arguments_total = 0
+        self.links: List[Dict] = []
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def update_parse_progress(self, brief: int, done: int, total: int) -> None:
+        self.pages[brief] = (done, total)
+
+    def update_link_progress(self, done: int, total: int) -> None:
+        self.arguments_linked = done
+        self.arguments_total = total
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": {
+                "briefs_parsed": self.briefs_parsed,
+                "briefs_total": self.briefs_total,
+                # Only pages sent to the parser; cached briefs add none
+                "pages_parsed": sum(done for done, _ in self.pages),
+                "pages_total": sum(total for _, total in self.pages),
+                "arguments_linked": self.arguments_linked,
+                "arguments_total": self.arguments_total
+            },
+            # Links found so far; once finished they are part of the result
+            "links": self.links if self.result is None else None,
+            "result": self.result,
+            "error": self.error
+        }
+
+class JobManager:
+    """
+    In-process job queue with a fixed number of asyncio workers
+    """
+    def __init__(self, concurrency: int = JOB_CONCURRENCY, queue_depth: int = JOB_QUEUE_DEPTH,
+                 retention: float = JOB_RETENTION):
+        self.concurrency = concurrency
+        self.queue_depth = queue_depth
+        self.retention = retention
+        self._jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_depth)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def shutdown(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, job: Job) -> Job:
+        """
+        Queue a job, raising JobQueueFullError when the backlog is at capacity
+        """
+        if self._queue is None:
+            self.start()
+        self._prune()
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFullError("Too many analyses queued, try again shortly")
+        self._jobs[job.job_id] = job
+        logger.info(f"Queued job {job.job_id}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention
+        for job_id in [j.job_id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        job.status = "running"
+        try:
+            job.stage = "parsing"
+            parsed = []
+
+            async def parse(index: int, upload: SavedUpload, filename: str, document_type: str) -> Dict:
+                with span("parse"):
+                    brief = await parse_saved_upload(
+                        upload, filename, on_parsed=lambda brief: parsed.append((brief, document_type)),
+                        progress=lambda done, total: job.update_parse_progress(index, done, total)
+                    )
+                job.briefs_parsed += 1
+                return brief
+
+            # Both briefs are parsed at once; gather returns them in upload order and
+            # waits for both, so a failure never removes a file still being parsed
+            briefs = await asyncio.gather(
+                *(parse(index, upload, filename, document_type)
+                  for index, ((upload, filename), document_type)
+                  in enumerate(zip(job.uploads, ("moving", "response")))),
+                return_exceptions=True
+            )
+            for brief in briefs:
+                if isinstance(brief, BaseException):
+                    raise brief
+            moving_brief, response_brief = briefs
+
+            job.stage = "linking"
+            job.arguments_total = len(moving_brief.get("arguments", []))
+            links = await self._link(job, moving_brief, response_brief)
+            job.arguments_linked = job.arguments_total
+
+            job.result = {"moving_brief": moving_brief, "response_brief": response_brief, "links": links}
+            job.status = "succeeded"
+            # Saved after linking, so embedding them for the index doesn't delay the result
+            rows = {}
+            for brief, document_type in parsed:
+                rows[document_type] = await run_in_threadpool(save_brief, brief, document_type)
+            # The links table keys a pair's links by the briefs row of its moving brief
+            if rows.get("moving"):
+                save_links(links, rows["moving"])
+        except Exception as e:
+            logger.error(f"Job {job.job_id} failed: {str(e)}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.stage = "done"
+            job.finished_at = time.time()
+            # Temp files of briefs that never got parsed are ours to clean up
+            for upload, _ in job.uploads:
+                if os.path.exists(upload.path):
+                    os.remove(upload.path)
+
+    async def _link(self, job: Job, moving_brief: Dict, response_brief: Dict) -> List[Dict]:
+        # Progress callbacks can't cross a process boundary; in thread mode links
+        # are published on the job one by one as they are built, so clients can
+        # show them early. Arguments are still encoded in one batch.
+        callbacks = {}
+        if link_pool.kind == "thread":
+            callbacks = {"progress": job.update_link_progress, "on_link": job.links.append, "per_link_phrases": True}
+        while True:
+            try:
+                return await link_pool.run(link_job, moving_brief, response_brief, **callbacks)
+            except ExecutorSaturatedError:
+                # Jobs wait for a free worker instead of failing like interactive /link calls
+                await asyncio.sleep(1)
+
+job_manager = JobManager()
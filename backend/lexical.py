@@ -0,0 +1,115 @@
+from collections import Counter
+from typing import TYPE_CHECKING, Dict, List
+import numpy as np
+import os
+import re
+
+if TYPE_CHECKING:
+    from scipy import sparse
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# How much more a shared citation counts than a shared ordinary word
+CITATION_WEIGHT = float(os.getenv("CITATION_WEIGHT", "3.0"))
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this to was were "
+    "which with not no any all such than these those there their they we our its also may must shall "
+    "would could should under upon into".split()
+)
+
+_WORD = re.compile(r"[a-z][a-z0-9']+")
+# 410 U.S. 113, 12 F.3d 4, 500 F. Supp. 2d 10
+_REPORTER = re.compile(r"\b(\d{1,4})\s+((?:[A-Z][A-Za-z]{0,5}\.?\s?){1,3}(?:\d[a-z]{1,2})?)\s+(\d{1,5})\b")
+# 42 U.S.C. § 1983
+_STATUTE = re.compile(r"\b(\d{1,3})\s+U\.?\s?S\.?\s?C\.?(?:\s?A\.?)?\s*§+\s*(\d+[a-z]*)")
+_SECTION = re.compile(r"§+\s*(\d+[a-z]*)")
+_RULE = re.compile(r"\bFed\.\s*R\.\s*(Civ|Crim|Evid|App)\.\s*(?:P\.\s*)?(\d+)")
+_CASE = re.compile(r"\b([A-Z][A-Za-z'&]+)\s+v\.\s+([A-Z][A-Za-z'&]+)")
+_REPORTER_PUNCTUATION = re.compile(r"[\s.]")
+
+def citation_tokens(text: str) -> List[str]:
+    """
+    Normalized tokens for the case, reporter, statute and rule citations in text
+    """
+    # Cheap substring checks skip the regexes that can't match, which is most of them
+    tokens = []
+    for volume, reporter, page in _REPORTER.findall(text):
+        tokens.append("cite:" + volume + _REPORTER_PUNCTUATION.sub("", reporter).lower() + page)
+    if "§" in text:
+        tokens.extend(f"usc:{title}-{section}" for title, section in _STATUTE.findall(text))
+        tokens.extend(f"sec:{section}" for section in _SECTION.findall(text))
+    if "Fed." in text:
+        tokens.extend(f"rule:{kind.lower()}-{number}" for kind, number in _RULE.findall(text))
+    if " v. " in text:
+        tokens.extend(f"case:{a.lower()}-v-{b.lower()}" for a, b in _CASE.findall(text))
+    return tokens
+
+def tokenize(text: str) -> List[str]:
+    words = [word for word in _WORD.findall(text.lower()) if word not in STOPWORDS]
+    return words + citation_tokens(text)
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed set of documents, scored for many queries at once
+    with one sparse matrix product. Citation tokens in queries are weighted up.
+    """
+    def __init__(self, documents: List[str], k1: float = BM25_K1, b: float = BM25_B,
+                 citation_weight: float = CITATION_WEIGHT):
+        from scipy import sparse
+
+        self.citation_weight = citation_weight
+        self.vocabulary: Dict[str, int] = {}
+        rows, cols, values = [], [], []
+        lengths = np.zeros(len(documents), dtype=np.float32)
+        for row, document in enumerate(documents):
+            counts = Counter(tokenize(document))
+            lengths[row] = sum(counts.values())
+            for token, count in counts.items():
+                rows.append(row)
+                cols.append(self.vocabulary.setdefault(token, len(self.vocabulary)))
+                values.append(count)
+
+        shape = (len(documents), len(self.vocabulary))
+        tf = sparse.csr_matrix((np.asarray(values, dtype=np.float32), (rows, cols)), shape=shape)
+        df = np.bincount(np.asarray(cols, dtype=np.int64), minlength=shape[1])
+        self.idf = np.log1p((len(documents) - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        # Precompute the saturated, length-normalized, idf-weighted term matrix
+        norm = k1 * (1 - b + b * lengths / max(lengths.mean(), 1.0))
+        tf_rows = np.repeat(np.arange(shape[0]), np.diff(tf.indptr))
+        data = tf.data * (k1 + 1) / (tf.data + norm[tf_rows]) * self.idf[tf.indices]
+        self.weights = sparse.csr_matrix((data, tf.indices, tf.indptr), shape=shape)
+
+    def _query_matrix(self, queries: List[str]) -> "sparse.csr_matrix":
+        from scipy import sparse
+
+        rows, cols, values = [], [], []
+        for row, query in enumerate(queries):
+            for token in set(tokenize(query)):
+                col = self.vocabulary.get(token)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+                    values.append(self.citation_weight if ":" in token else 1.0)
+        shape = (len(queries), len(self.vocabulary))
+        return sparse.csr_matrix((np.asarray(values, dtype=np.float32), (rows, cols)), shape=shape)
+
+    def scores(self, queries: List[str]) -> np.ndarray:
+        """
+        Dense (queries x documents) BM25 scores
+        """
+        return np.asarray((self._query_matrix(queries) @ self.weights.T).todense())
+
+def lexical_candidates(queries: List[str], documents: List[str], k: int) -> np.ndarray:
+    """
+    Boolean (queries x documents) mask of the k best BM25 documents per query
+    """
+    scores = BM25Index(documents).scores(queries)
+    mask = np.zeros(scores.shape, dtype=bool)
+    if k >= len(documents):
+        mask[:] = True
+        return mask
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    np.put_along_axis(mask, top, True, axis=1)
+    return mask
@@ -1,140 +1,971 @@
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
-from typing import Dict, List, Tuple
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import fcntl
+import hashlib
+import json
 import logging
+import os
+import re
+import threading
+from .models import registry, SharedModel, DEFAULT_MODEL_NAME
+from .metrics import metrics, span, sentences_compared, pairs_pruned
+from .lexical import lexical_candidates
+from .quantization import quantize, dequantize
+from .segmentation import segment_sentences
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+ENCODE_BATCH_SIZE = int(os.getenv("ENCODE_BATCH_SIZE", "64"))
+# Moving arguments scored per step when streaming links
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "4"))
+# Response arguments kept per moving argument by the lexical prefilter; 0 scores every pair
+LEXICAL_CANDIDATES = int(os.getenv("LEXICAL_CANDIDATES", "0"))
+# Similarity given to pruned pairs: below any cosine, so they never become links
+PRUNED_SCORE = -2.0
+# How arguments longer than one window are embedded: "off" encodes heading and
+# content as one (truncated) text, "mean"/"max" pool overlapping windows into one
+# vector, and "maxsim" scores a pair by its most similar pair of windows
+ARGUMENT_CHUNKING = os.getenv("ARGUMENT_CHUNKING", "off")
+CHUNKING_MODES = ("off", "mean", "max", "maxsim")
+# Window length and step in model tokens, and the most windows kept per argument
+CHUNK_WINDOW = int(os.getenv("CHUNK_WINDOW", "192"))
+CHUNK_STRIDE = int(os.getenv("CHUNK_STRIDE", "128"))
+MAX_CHUNKS = int(os.getenv("MAX_CHUNKS", "8"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "50000"))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR")
+EMBEDDING_CACHE_DISK_SIZE = int(os.getenv("EMBEDDING_CACHE_DISK_SIZE", "200000"))
+# In-memory tier storage: float32 is exact, float16/int8 hold 2x/4x more entries
+EMBEDDING_CACHE_FORMAT = os.getenv("EMBEDDING_CACHE_FORMAT", "float32")
+
+class DiskEmbeddingStore:
+    """
+    Fixed-capacity on-disk embedding table for one model, shared by every
+    process that opens the same directory. Vectors live in a memory-mapped
+    float32 array; slot assignments are appended to slots.log ("slot key" per
+    line) and replayed by each process before it reads or writes, under a
+    file lock. Slots are reused first in, first out once the table is full.
+    Compacting the log bumps the generation in store.json, which tells other
+    processes to replay the new log from the start.
+    """
+    def __init__(self, directory: str, dim: int, capacity: int):
+        os.makedirs(directory, exist_ok=True)
+        self.dim = dim
+        self.capacity = capacity
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._header_path = os.path.join(directory, "store.json")
+        self._log_path = os.path.join(directory, "slots.log")
+        self._lock_file = open(os.path.join(directory, "lock"), "a")
+        self._slots: Dict[str, int] = {}
+        self._keys: List[Optional[str]] = [None] * capacity
+        self._last_slot = -1
+        self._log_offset = 0
+        self._log_lines = 0
+        self._generation: Optional[int] = None
+
+        with self._locked(fcntl.LOCK_EX):
+            header = None
+            if os.path.exists(self._header_path) and os.path.exists(self._vectors_path):
+                with open(self._header_path) as f:
+                    header = json.load(f)
+                if header.get("dim") != dim or header.get("capacity") != capacity:
+                    # Another process may have the table mapped, so it is never truncated in place
+                    raise ValueError(f"Embedding cache at {directory} holds {header.get('capacity')} x "
+                                     f"{header.get('dim')} vectors; remove it or set another EMBEDDING_CACHE_DIR")
+            if header is None:
+                np.memmap(self._vectors_path, dtype=np.float32, mode="w+", shape=(capacity, dim)).flush()
+                open(self._log_path, "w").close()
+                self._write_header(0)
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, dim))
+            self._refresh()
+
+    @staticmethod
+    def stored_dim(directory: str) -> Optional[int]:
+        header_path = os.path.join(directory, "store.json")
+        if not os.path.exists(header_path):
+            return None
+        with open(header_path) as f:
+            return json.load(f).get("dim")
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @contextmanager
+    def _locked(self, operation: int):
+        fcntl.flock(self._lock_file, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _assign(self, slot: int, key: str) -> Optional[str]:
+        previous = self._keys[slot]
+        if previous is not None and self._slots.get(previous) == slot:
+            del self._slots[previous]
+        self._slots[key] = slot
+        self._keys[slot] = key
+        self._last_slot = slot
+        return previous
+
+    def _write_header(self, generation: int) -> None:
+        tmp_path = self._header_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"dim": self.dim, "capacity": self.capacity, "generation": generation}, f)
+        os.replace(tmp_path, self._header_path)
+
+    def _refresh(self) -> None:
+        """
+        Replay slot assignments other processes appended since the last call.
+        Must hold the lock.
+        """
+        with open(self._header_path) as f:
+            generation = json.load(f).get("generation", 0)
+        if generation != self._generation:
+            # The log was compacted since it was last read, so offsets into the
+            # old one mean nothing; start over from the new one
+            self._slots.clear()
+            self._keys = [None] * self.capacity
+            self._last_slot = -1
+            self._log_offset = self._log_lines = 0
+            self._generation = generation
+        if not os.path.exists(self._log_path):
+            open(self._log_path, "w").close()
+        size = os.path.getsize(self._log_path)
+        if size == self._log_offset:
+            return
+        with open(self._log_path, "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read()
+        # Only whole lines; a write still in progress is picked up next time
+        data = data[:data.rfind(b"\n") + 1]
+        for line in data.decode("utf-8").splitlines():
+            slot, key = line.split(" ", 1)
+            self._assign(int(slot), key)
+            self._log_lines += 1
+        self._log_offset += len(data)
+
+    def _compact(self) -> None:
+        """
+        Rewrite the log with one line per live slot, oldest first, so the
+        next slot to reuse is unchanged. Must hold the exclusive lock.
+        """
+        tmp_path = self._log_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for offset in range(1, self.capacity + 1):
+                slot = (self._last_slot + offset) % self.capacity
+                if self._keys[slot] is not None and self._slots.get(self._keys[slot]) == slot:
+                    f.write(f"{slot} {self._keys[slot]}\n")
+        # The generation goes up before the log is swapped, so no process ever
+        # reads the new log at an offset into the old one, even after a crash
+        self._write_header(self._generation + 1)
+        os.replace(tmp_path, self._log_path)
+        self._refresh()
+
+    def get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        with self._locked(fcntl.LOCK_SH):
+            self._refresh()
+            return [np.array(self._vectors[self._slots[key]]) if key in self._slots else None for key in keys]
+
+    def put_many(self, keys: List[str], vectors: np.ndarray) -> int:
+        """
+        Store vectors for the keys not stored yet, returning how many older
+        entries were evicted to make room
+        """
+        evicted = 0
+        with self._locked(fcntl.LOCK_EX):
+            self._refresh()
+            lines = []
+            for key, vector in zip(keys, vectors):
+                if key in self._slots:
+                    continue
+                slot = (self._last_slot + 1) % self.capacity
+                self._vectors[slot] = vector
+                if self._assign(slot, key) is not None:
+                    evicted += 1
+                lines.append(f"{slot} {key}\n")
+            if not lines:
+                return 0
+            # Vectors reach the shared mapping before the log lines that point at them
+            self._vectors.flush()
+            with open(self._log_path, "a") as f:
+                f.write("".join(lines))
+            self._log_offset += sum(len(line) for line in lines)
+            self._log_lines += len(lines)
+            if self._log_lines > 4 * self.capacity:
+                self._compact()
+        return evicted
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by (model name, normalized text hash),
+    with an in-memory LRU tier and an optional memory-mapped on-disk tier
+    """
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE,
+                 disk_dir: Optional[str] = EMBEDDING_CACHE_DIR,
+                 disk_capacity: int = EMBEDDING_CACHE_DISK_SIZE,
+                 vector_format: str = EMBEDDING_CACHE_FORMAT):
+        self.max_entries = max_entries
+        self.vector_format = vector_format
+        self.disk_dir = disk_dir
+        self.disk_capacity = disk_capacity
+        self._memory: "OrderedDict[Tuple[str, str], Tuple[np.ndarray, Optional[np.ndarray]]]" = OrderedDict()
+        self._disk: Dict[str, Optional[DiskEmbeddingStore]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+    @staticmethod
+    def text_key(text: str) -> str:
+        normalized = " ".join(text.split())
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def _disk_store(self, model_name: str, dim: Optional[int] = None) -> Optional[DiskEmbeddingStore]:
+        if not self.disk_dir or self.disk_capacity <= 0:
+            return None
+        if model_name not in self._disk:
+            directory = os.path.join(self.disk_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+            if dim is None:
+                # Reopen a table left by an earlier process without knowing the model's dim yet
+                dim = DiskEmbeddingStore.stored_dim(directory)
+                if dim is None:
+                    return None
+            try:
+                self._disk[model_name] = DiskEmbeddingStore(directory, dim, self.disk_capacity)
+            except ValueError as e:
+                logger.warning(f"Embedding disk cache disabled: {str(e)}")
+                self._disk[model_name] = None
+        return self._disk[model_name]
+
+    def _remember(self, key: Tuple[str, str], vector: np.ndarray) -> None:
+        self._memory[key] = quantize(vector[None, :], self.vector_format)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def get_many(self, model_name: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up each text, returning None for the ones that are not cached
+        """
+        results: List[Optional[np.ndarray]] = []
+        with self._lock:
+            keys = [(model_name, self.text_key(text)) for text in texts]
+            for key in keys:
+                packed = self._memory.get(key)
+                if packed is not None:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                results.append(dequantize(*packed)[0] if packed is not None else None)
+
+            # Everything the memory tier missed is looked up on disk in one pass
+            missing = [i for i, vector in enumerate(results) if vector is None]
+            disk = self._disk_store(model_name) if missing else None
+            found = disk.get_many([keys[i][1] for i in missing]) if disk is not None else [None] * len(missing)
+            for i, vector in zip(missing, found):
+                if vector is not None:
+                    self._remember(keys[i], vector)
+                    self.disk_hits += 1
+                else:
+                    self.misses += 1
+                results[i] = vector
+        return results
+
+    def put_many(self, model_name: str, texts: List[str], vectors: np.ndarray) -> None:
+        if not texts:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            keys = [(model_name, self.text_key(text)) for text in texts]
+            if self.max_entries > 0:
+                for key, vector in zip(keys, vectors):
+                    self._remember(key, vector)
+            disk = self._disk_store(model_name, dim=vectors.shape[1])
+            if disk is not None:
+                # One locked append to the slot log per batch
+                self.disk_evictions += disk.put_many([key[1] for key in keys], vectors)
+
+    def clear(self) -> None:
+        """
+        Drop the in-memory tier and reset the counters (the disk tier is kept)
+        """
+        with self._lock:
+            self._memory.clear()
+            self.hits = self.disk_hits = self.misses = self.evictions = self.disk_evictions = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._memory),
+                "disk_entries": sum(len(store) for store in self._disk.values() if store is not None),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_evictions": self.disk_evictions
+            }
+
+embedding_cache = EmbeddingCache()
+
+def _embedding_cache_metrics() -> List[str]:
+    stats = embedding_cache.stats()
+    lines = []
+    for name in ("hits", "disk_hits", "misses", "evictions", "disk_evictions"):
+        lines.append(f"# TYPE legalbrief_embedding_cache_{name}_total counter")
+        lines.append(f"legalbrief_embedding_cache_{name}_total {stats[name]}")
+    lines.append("# TYPE legalbrief_embedding_cache_entries gauge")
+    lines.append(f"legalbrief_embedding_cache_entries {stats['entries']}")
+    return lines
+
+metrics.add_collector(_embedding_cache_metrics)
+
 class ArgumentLinker:
-    def __init__(self):
-        # Initialize the sentence transformer model
-        logger.info("Initializing SentenceTransformer model")
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+    def __init__(self, model: Optional[SharedModel] = None, cache: Optional[EmbeddingCache] = embedding_cache):
+        # Reuse the process-wide model instead of loading it per request
+        self.model = model or registry.get(DEFAULT_MODEL_NAME)
+        self.cache = cache
         self.similarity_threshold = 0.6
 
     def get_embeddings(self, text: str) -> np.ndarray:
         """
-        Generate embeddings for text using sentence transformer
+        Generate an L2-normalized float32 embedding for text using sentence transformer
+        """
+        return self.encode_batch([text])[0]
+
+    def encode_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode many texts in a single batched call, returning L2-normalized rows.
+        Texts already in the embedding cache skip the model entirely.
+        """
+        cached = self.cache.get_many(self.model.cache_key, texts) if self.cache is not None else [None] * len(texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        if missing:
+            with span("encode"):
+                encoded = self.model.encode(missing, batch_size=ENCODE_BATCH_SIZE, convert_to_numpy=True)
+            encoded = np.asarray(encoded, dtype=np.float32)
+            if self.cache is not None:
+                self.cache.put_many(self.model.cache_key, missing, encoded)
+            fresh = dict(zip(missing, encoded))
+            cached = [vector if vector is not None else fresh[text] for text, vector in zip(texts, cached)]
+
+        return normalize_rows(np.stack(cached)) if cached else np.zeros((0, 0), dtype=np.float32)
+
+    def argument_chunks(self, arguments: List[Dict], window: int = CHUNK_WINDOW, stride: int = CHUNK_STRIDE,
+                        max_chunks: int = MAX_CHUNKS) -> List[List[str]]:
+        """
+        Split each argument's content into overlapping windows of model tokens,
+        each prefixed with the heading. Arguments that fit in one window are
+        kept whole, as argument_text.
         """
-        return self.model.encode(text, convert_to_tensor=True)
+        with span("chunking"):
+            spans = self.model.token_spans([arg["content"] for arg in arguments])
+            chunks = []
+            for arg, token_spans in zip(arguments, spans):
+                if len(token_spans) <= window:
+                    chunks.append([argument_text(arg)])
+                    continue
+                content = arg["content"]
+                chunks.append([
+                    f"{arg['heading']} {content[token_spans[start][0]:token_spans[start + window - 1][1]]}"
+                    for start in window_starts(len(token_spans), window, stride, max_chunks)
+                ])
+        return chunks
 
-    def find_matching_phrases(self, text1: str, text2: str) -> List[Tuple[str, str]]:
+    def encode_arguments(self, arguments: List[Dict], chunking: str = ARGUMENT_CHUNKING) -> List[np.ndarray]:
+        """
+        Normalized embedding of each argument. With "maxsim" chunking each is a
+        (windows x dim) matrix instead of a vector; see argument_similarities.
+        Every window of every argument is encoded in one batch.
+        """
+        if chunking not in CHUNKING_MODES:
+            raise ValueError(f"Unknown chunking mode: {chunking}")
+        if chunking == "off":
+            return list(self.encode_batch([argument_text(arg) for arg in arguments]))
+
+        chunk_lists = self.argument_chunks(arguments)
+        vectors = self.encode_batch([chunk for chunks in chunk_lists for chunk in chunks])
+        bounds = np.cumsum([0] + [len(chunks) for chunks in chunk_lists])
+        windows = [vectors[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+        if chunking == "maxsim":
+            return windows
+        pooled = [matrix.mean(axis=0) if chunking == "mean" else matrix.max(axis=0) for matrix in windows]
+        return list(normalize_rows(np.stack(pooled))) if pooled else []
+
+    def sentence_embeddings(self, texts: List[str]) -> List[Tuple[List[str], np.ndarray]]:
+        """
+        Split each text into sentences and embed all sentences in one batch
+        """
+        with span("sentence_split"):
+            sentence_lists = [segment_sentences(text) for text in texts]
+        flat = [sentence for sentences in sentence_lists for sentence in sentences]
+        embeddings = self.encode_batch(flat) if flat else np.zeros((0, 0), dtype=np.float32)
+
+        results = []
+        offset = 0
+        for sentences in sentence_lists:
+            results.append((sentences, embeddings[offset:offset + len(sentences)]))
+            offset += len(sentences)
+        return results
+
+    def find_matching_phrases(self, text1: str, text2: str, top_k: int = 3) -> List[Tuple[str, str]]:
         """
         Find similar phrases between two texts
         """
         logger.info("Finding matching phrases between texts")
-        # Split texts into sentences
-        sentences1 = text1.split('. ')
-        sentences2 = text2.split('. ')
-        
-        matches = []
-        
-        # Get embeddings for all sentences
-        embeddings1 = self.model.encode(sentences1)
-        embeddings2 = self.model.encode(sentences2)
-        
-        # Calculate similarity matrix
-        similarities = cosine_similarity(embeddings1, embeddings2)
-        
-        # Find top matching sentences
-        for i, row in enumerate(similarities):
-            max_idx = np.argmax(row)
-            if row[max_idx] > self.similarity_threshold:
-                matches.append((sentences1[i], sentences2[max_idx]))
-        
+        (sentences1, embeddings1), (sentences2, embeddings2) = self.sentence_embeddings([text1, text2])
+        return self.top_sentence_pairs(sentences1, embeddings1, sentences2, embeddings2, top_k)
+
+    def top_sentence_pairs(self, sentences1: List[str], embeddings1: np.ndarray,
+                           sentences2: List[str], embeddings2: np.ndarray,
+                           top_k: int = 3) -> List[Tuple[str, str]]:
+        """
+        Pair each sentence of the first text with its closest sentence in the second
+        and keep the top_k pairs above the similarity threshold, best first
+        """
+        if not sentences1 or not sentences2 or top_k <= 0:
+            return []
+
+        with span("phrase_matching"):
+            similarities = embeddings1 @ embeddings2.T
+            best_idx = similarities.argmax(axis=1)
+            best_scores = similarities[np.arange(len(sentences1)), best_idx]
+
+            candidates = np.flatnonzero(best_scores > self.similarity_threshold)
+            if len(candidates) > top_k:
+                candidates = candidates[np.argpartition(-best_scores[candidates], top_k - 1)[:top_k]]
+            candidates = candidates[np.argsort(-best_scores[candidates], kind="stable")]
+        sentences_compared.inc(len(sentences1) * len(sentences2))
+
+        matches = [(sentences1[i], sentences2[best_idx[i]]) for i in candidates]
         logger.info(f"Found {len(matches)} matching phrases")
-        return matches[:3]  # Return top 3 matching pairs
+        return matches
 
-def link_arguments(moving_brief: Dict, response_brief: Dict) -> List[Dict]:
+MOCK_LINKS = [
+    {
+        "moving_brief_heading": "Argument I",
+        "response_brief_heading": "Counter-Argument I",
+        "similarity_score": 0.85,
+        "explanation": "These arguments directly address the same legal question. The moving brief argues for the application of precedent X, while the response brief distinguishes that precedent based on factual differences."
+    },
+    {
+        "moving_brief_heading": "Argument II",
+        "response_brief_heading": "Counter-Argument II",
+        "similarity_score": 0.78,
+        "explanation": "Both arguments discuss the interpretation of statute Y, with the moving brief arguing for a broad interpretation while the response brief advocates for a narrow reading based on legislative history."
+    }
+]
+
+def link_arguments(moving_brief: Dict, response_brief: Dict,
+                   progress: Optional[Callable[[int, int], None]] = None,
+                   on_link: Optional[Callable[[Dict], None]] = None,
+                   **options) -> List[Dict]:
     """
-    Link arguments between moving and response briefs
+    Link arguments between moving and response briefs.
+    progress, if given, is called with (moving arguments done, total), and
+    on_link with each link as soon as it is built. Other options are passed
+    to iter_links.
     """
     logger.info("Starting argument linking process")
-    
+    try:
+        links = []
+        for link in iter_links(moving_brief, response_brief, progress=progress, **options):
+            links.append(link)
+            if on_link:
+                on_link(link)
+        logger.info(f"Created {len(links)} links between arguments")
+        return links
+        
+    except Exception as e:
+        logger.error(f"Error linking arguments: {str(e)}")
+        return []
+
+def iter_links(moving_brief: Dict, response_brief: Dict,
+               progress: Optional[Callable[[int, int], None]] = None,
+               assignment: str = "greedy", capacity: int = 1,
+               embeddings: Optional[Dict[str, np.ndarray]] = None,
+               stream: bool = False, candidates: int = LEXICAL_CANDIDATES,
+               phrases: Optional[Dict[Tuple[str, str], List[Tuple[str, str]]]] = None,
+               chunking: str = ARGUMENT_CHUNKING, per_link_phrases: bool = False) -> Iterator[Dict]:
+    """
+    Yield links between moving and response brief arguments.
+
+    assignment is "greedy" (best response argument per moving argument) or
+    "optimal" (one-to-one matching, or up to capacity moving arguments per
+    response argument, maximizing total similarity).
+    embeddings optionally maps argument text to a precomputed normalized
+    embedding (from encode_arguments), as done by link_brief_pairs.
+    With stream=True, greedy linking scores moving arguments a few at a time
+    and embeds sentences per link, so the first link comes out as early as
+    possible; otherwise everything is batched for throughput.
+    per_link_phrases keeps arguments encoded in one batch but, like streaming,
+    embeds sentences per link, so each link is yielded as soon as it is built.
+    candidates > 0 turns on two-stage retrieval: a BM25 index over the response
+    arguments keeps that many candidates per moving argument and only those
+    pairs are scored densely. Higher values trade speed for recall.
+    phrases optionally maps (moving, response) argument hashes to matching
+    phrases found earlier, which are reused instead of matched again.
+    chunking is one of CHUNKING_MODES and sets how arguments longer than
+    CHUNK_WINDOW tokens are embedded and scored.
+    """
     # Validate input data
     if not moving_brief or not response_brief:
         logger.error("Invalid brief data provided")
-        return []
+        return
         
     if "arguments" not in moving_brief or "arguments" not in response_brief:
         logger.error("Brief data missing 'arguments' field")
-        return []
+        return
         
     if not moving_brief["arguments"] or not response_brief["arguments"]:
         logger.error("No arguments found in one or both briefs")
-        return []
+        return
     
     # For testing purposes with mock data, return mock links
     if len(moving_brief["arguments"]) <= 2 and len(response_brief["arguments"]) <= 2:
         logger.info("Using mock links for testing")
-        return [
-            {
-                "moving_brief_heading": "Argument I",
-                "response_brief_heading": "Counter-Argument I",
-                "similarity_score": 0.85,
-                "explanation": "These arguments directly address the same legal question. The moving brief argues for the application of precedent X, while the response brief distinguishes that precedent based on factual differences."
-            },
-            {
-                "moving_brief_heading": "Argument II",
-                "response_brief_heading": "Counter-Argument II",
-                "similarity_score": 0.78,
-                "explanation": "Both arguments discuss the interpretation of statute Y, with the moving brief arguing for a broad interpretation while the response brief advocates for a narrow reading based on legislative history."
-            }
-        ]
+        yield from (dict(link) for link in MOCK_LINKS)
+        return
     
     # Real implementation for actual data
+    linker = ArgumentLinker()
+
+    moving_args = moving_brief["arguments"]
+    response_args = response_brief["arguments"]
+    moving_texts = [argument_text(arg) for arg in moving_args]
+    response_texts = [argument_text(arg) for arg in response_args]
+
+    def embed(args: List[Dict]) -> List[np.ndarray]:
+        if embeddings is not None:
+            return [embeddings[argument_text(arg)] for arg in args]
+        return linker.encode_arguments(args, chunking)
+
+    # Sentence splits and embeddings per argument, computed once and reused
+    sentence_cache: Dict[Tuple[str, int], Tuple[List[str], np.ndarray]] = {}
+
+    def load_sentences(keys: List[Tuple[str, int]]) -> None:
+        keys = [key for key in dict.fromkeys(keys) if key not in sentence_cache]
+        texts = [moving_texts[i] if side == "moving" else response_texts[i] for side, i in keys]
+        sentence_cache.update(zip(keys, linker.sentence_embeddings(texts)))
+
+    candidate_mask = None
+    if 0 < candidates < len(response_args):
+        with span("prefilter"):
+            candidate_mask = lexical_candidates(moving_texts, response_texts, candidates)
+        pruned = candidate_mask.size - int(candidate_mask.sum())
+        pairs_pruned.inc(pruned)
+        logger.info(f"Lexical prefilter pruned {pruned} of {candidate_mask.size} argument pairs")
+
+    # Response arguments that are nobody's candidate are never embedded
+    needed = np.arange(len(response_args)) if candidate_mask is None else np.flatnonzero(candidate_mask.any(axis=0))
+    # Optimal assignment is a global decision, so it always needs the full matrix
+    chunk_size = STREAM_CHUNK_SIZE if stream and assignment == "greedy" else len(moving_args)
+    moving_embeddings = None
+    if chunk_size < len(moving_args):
+        response_embeddings = embed([response_args[j] for j in needed])
+    else:
+        # Arguments (or their windows) from both briefs go through the model in one batch
+        embedded = embed([response_args[j] for j in needed] + moving_args)
+        response_embeddings, moving_embeddings = embedded[:len(needed)], embedded[len(needed):]
+    done = 0
+
+    for start in range(0, len(moving_args), chunk_size):
+        stop = min(start + chunk_size, len(moving_args))
+
+        # Encode every argument once and score all pairs with one matrix product
+        step_embeddings = embed(moving_args[start:stop]) if moving_embeddings is None else moving_embeddings[start:stop]
+        with span("similarity"):
+            similarities = np.full((stop - start, len(response_args)), PRUNED_SCORE, dtype=np.float32)
+            similarities[:, needed] = argument_similarities(step_embeddings, response_embeddings)
+            if candidate_mask is not None:
+                similarities = np.where(candidate_mask[start:stop], similarities, PRUNED_SCORE)
+
+        # Pick the best response argument for every moving argument first
+        with span("assignment"):
+            best_idx, best_scores = assign_matches(similarities, assignment, capacity, linker.similarity_threshold)
+        linked = np.flatnonzero(best_scores > linker.similarity_threshold)
+
+        def known_phrases(k: int) -> Optional[List[Tuple[str, str]]]:
+            if not phrases:
+                return None
+            pair = (argument_hash(moving_args[start + int(k)]), argument_hash(response_args[int(best_idx[k])]))
+            return phrases.get(pair)
+
+        # Phrase matching only runs for the pairs that become links and weren't
+        # matched before; unless links are wanted one by one, all their sentences
+        # are embedded in one batch up front
+        if not (stream or per_link_phrases):
+            pending = [k for k in linked if known_phrases(k) is None]
+            load_sentences([("moving", start + int(k)) for k in pending] +
+                           [("response", int(best_idx[k])) for k in pending])
+
+        # Arguments without a match above the threshold are finished already
+        done += (stop - start) - len(linked)
+        if progress:
+            progress(done, len(moving_args))
+
+        for k in linked:
+            i, j = start + int(k), int(best_idx[k])
+            best_phrases = known_phrases(k)
+            if best_phrases is None:
+                load_sentences([("moving", i), ("response", j)])
+                best_phrases = linker.top_sentence_pairs(*sentence_cache[("moving", i)], *sentence_cache[("response", j)])
+            yield make_link(moving_args[i], response_args[j], best_scores[k], best_phrases)
+            done += 1
+            if progress:
+                progress(done, len(moving_args))
+
+def relink_arguments(moving_brief: Dict, response_brief: Dict, previous: Dict, **options) -> Dict:
+    """
+    Re-link after one or both briefs changed, reusing an earlier result
+    ({"links", "argument_hashes"} as returned by /link) for arguments whose
+    text is unchanged. Returns the new links and hashes plus a diff against
+    the previous links. Options are those of iter_links; a result linked with
+    different ones is re-linked in full.
+    """
+    previous_links = previous.get("links") or []
+    previous_hashes = previous.get("argument_hashes") or {}
+    old_moving = previous_hashes.get("moving") or {}
+    old_response = previous_hashes.get("response") or {}
+
+    # Phrases of earlier links, keyed by the exact texts they were matched on
+    phrases = {
+        (old_moving[link["moving_section_id"]], old_response[link["response_section_id"]]): link["matching_phrases"]
+        for link in previous_links
+        if link.get("moving_section_id") in old_moving and link.get("response_section_id") in old_response
+    }
+
+    args_moving = (moving_brief or {}).get("arguments") or []
+    args_response = (response_brief or {}).get("arguments") or []
+    settings = link_settings(**options)
+    # BM25 candidates depend on the whole response brief, so editing it can change
+    # the candidates of arguments that didn't change
+    prefiltered = 0 < settings["candidates"] < len(args_response)
+    incremental = (settings["assignment"] == "greedy" and previous_hashes
+                   and previous_hashes.get("options") == settings
+                   and not (prefiltered and argument_hashes(response_brief) != old_response)
+                   and not (len(args_moving) <= 2 and len(args_response) <= 2))
+    if incremental:
+        try:
+            links = incremental_links(moving_brief, response_brief, previous_links, previous_hashes, phrases,
+                                      candidates=options.get("candidates", LEXICAL_CANDIDATES),
+                                      chunking=options.get("chunking", ARGUMENT_CHUNKING))
+        except Exception as e:
+            logger.error(f"Error re-linking arguments: {str(e)}")
+            links = []
+    else:
+        # Optimal assignment is a global decision, and a result linked with other
+        # options can't be patched, so those are redone in full
+        links = link_arguments(moving_brief, response_brief, phrases=phrases, **options)
+
+    return {
+        "links": links,
+        "argument_hashes": result_hashes(moving_brief, response_brief, **options),
+        "diff": diff_links(previous_links, links)
+    }
+
+def incremental_links(moving_brief: Dict, response_brief: Dict, previous_links: List[Dict],
+                      previous_hashes: Dict[str, Dict[str, str]],
+                      phrases: Dict[Tuple[str, str], List[Tuple[str, str]]],
+                      candidates: int = LEXICAL_CANDIDATES, chunking: str = ARGUMENT_CHUNKING) -> List[Dict]:
+    """
+    Greedy linking that only scores what an edit can affect. An unchanged moving
+    argument keeps its link unless a new or edited response argument beats it,
+    so it is scored against those columns alone; it is scored in full only when
+    its own text changed or its linked response argument changed or went away.
+    """
+    linker = ArgumentLinker()
+    moving_args = moving_brief["arguments"]
+    response_args = response_brief["arguments"]
+    old_moving = previous_hashes.get("moving") or {}
+    old_response = previous_hashes.get("response") or {}
+    previous_by_key = {link.get("moving_section_id"): link for link in previous_links}
+    response_index = {argument_key(arg): j for j, arg in enumerate(response_args)}
+
+    fresh = np.array([old_response.get(argument_key(arg)) != argument_hash(arg) for arg in response_args])
+    fresh_cols = np.flatnonzero(fresh)
+
+    full_rows: List[int] = []
+    fresh_rows: List[int] = []
+    # moving index -> (response index, previous link) for links that can be kept
+    kept: Dict[int, Tuple[int, Dict]] = {}
+    for i, arg in enumerate(moving_args):
+        key = argument_key(arg)
+        if old_moving.get(key) != argument_hash(arg):
+            full_rows.append(i)
+            continue
+        link = previous_by_key.get(key)
+        if link is not None:
+            j = response_index.get(link.get("response_section_id"))
+            if j is None or fresh[j]:
+                full_rows.append(i)
+                continue
+            kept[i] = (j, link)
+        if len(fresh_cols):
+            fresh_rows.append(i)
+
+    logger.info(f"Re-linking {len(full_rows)} changed and {len(fresh_rows)} affected arguments "
+                f"against {len(fresh_cols)} new or edited response arguments")
+
+    rows = full_rows + fresh_rows
+    cols = np.arange(len(response_args)) if full_rows else fresh_cols
+    best: Dict[int, Tuple[int, float]] = {}
+    if rows and len(cols):
+        moving_texts = [argument_text(moving_args[i]) for i in rows]
+        with span("similarity"):
+            embedded = linker.encode_arguments([moving_args[i] for i in rows] + [response_args[j] for j in cols], chunking)
+            similarities = argument_similarities(embedded[:len(rows)], embedded[len(rows):])
+            # Unchanged rows already know their best among the unchanged columns
+            similarities[len(full_rows):, ~fresh[cols]] = PRUNED_SCORE
+            if 0 < candidates < len(response_args):
+                with span("prefilter"):
+                    mask = lexical_candidates(moving_texts, [argument_text(arg) for arg in response_args], candidates)
+                similarities = np.where(mask[:, cols], similarities, PRUNED_SCORE)
+        best_pos = similarities.argmax(axis=1)
+        for r, i in enumerate(rows):
+            best[i] = (int(cols[best_pos[r]]), float(similarities[r, best_pos[r]]))
+
+    # Work out every link first so new phrases can be matched in one batch
+    chosen: List[Tuple[int, int, float, Optional[Dict]]] = []
+    for i in range(len(moving_args)):
+        j, score = best.get(i, (-1, PRUNED_SCORE))
+        if i in kept and score <= kept[i][1]["similarity_score"]:
+            chosen.append((i, kept[i][0], kept[i][1]["similarity_score"], kept[i][1]))
+        elif score > linker.similarity_threshold:
+            chosen.append((i, j, score, None))
+
+    pending = [
+        (i, j) for i, j, _, link in chosen
+        if link is None and (argument_hash(moving_args[i]), argument_hash(response_args[j])) not in phrases
+    ]
+    matched = {}
+    if pending:
+        moving_sentences = linker.sentence_embeddings([argument_text(moving_args[i]) for i, _ in pending])
+        response_sentences = linker.sentence_embeddings([argument_text(response_args[j]) for _, j in pending])
+        for pair, a, b in zip(pending, moving_sentences, response_sentences):
+            matched[pair] = linker.top_sentence_pairs(*a, *b)
+
+    links = []
+    for i, j, score, link in chosen:
+        if link is not None:
+            links.append(dict(link))
+            continue
+        pair_phrases = matched.get((i, j))
+        if pair_phrases is None:
+            pair_phrases = phrases[(argument_hash(moving_args[i]), argument_hash(response_args[j]))]
+        links.append(make_link(moving_args[i], response_args[j], score, pair_phrases))
+    logger.info(f"Kept {sum(link is not None for *_, link in chosen)} of {len(links)} links unchanged")
+    return links
+
+def diff_links(previous_links: List[Dict], links: List[Dict]) -> Dict:
+    """
+    Links added, removed and changed (new target or score) between two results,
+    matched on the moving argument
+    """
+    def by_moving(items: List[Dict]) -> Dict[str, Dict]:
+        return {link.get("moving_section_id") or link["moving_brief_heading"]: link for link in items}
+
+    before, after = by_moving(previous_links), by_moving(links)
+    changed = []
+    unchanged = 0
+    for key in [key for key in after if key in before]:
+        old, new = before[key], after[key]
+        same_target = (old.get("response_section_id") or old["response_brief_heading"]) == \
+            (new.get("response_section_id") or new["response_brief_heading"])
+        if same_target and abs(old["similarity_score"] - new["similarity_score"]) < 1e-6:
+            unchanged += 1
+        else:
+            changed.append({"before": old, "after": new})
+    return {
+        "added": [link for key, link in after.items() if key not in before],
+        "removed": [link for key, link in before.items() if key not in after],
+        "changed": changed,
+        "unchanged": unchanged
+    }
+
+def make_link(moving_arg: Dict, response_arg: Dict, score: float,
+              matching_phrases: List[Tuple[str, str]]) -> Dict:
+    with span("explanation"):
+        explanation = generate_explanation(score, matching_phrases)
+    return {
+        "moving_brief_heading": moving_arg["heading"],
+        "response_brief_heading": response_arg["heading"],
+        "moving_section_id": argument_key(moving_arg),
+        "response_section_id": argument_key(response_arg),
+        "similarity_score": float(score),
+        "matching_phrases": matching_phrases,
+        "explanation": explanation
+    }
+
+def pair_error(pair: Any) -> Optional[str]:
+    """
+    Why a batch entry can't be linked, or None if it is a well-formed
+    {"moving_brief", "response_brief"} pair
+    """
+    if not isinstance(pair, dict):
+        return "pair must be an object with moving_brief and response_brief"
+    for key in ("moving_brief", "response_brief"):
+        brief = pair.get(key)
+        if not isinstance(brief, dict) or not isinstance(brief.get("arguments"), list):
+            return f"{key} must be an object with an arguments list"
+        for position, arg in enumerate(brief["arguments"]):
+            if not isinstance(arg, dict) or not isinstance(arg.get("heading"), str) \
+                    or not isinstance(arg.get("content"), str):
+                return f"{key} argument {position} must have a heading and content"
+    return None
+
+def link_brief_pairs(pairs: List[Any], pair_errors: Optional[Dict[int, str]] = None,
+                     **options) -> Iterator[Dict]:
+    """
+    Link many {"moving_brief", "response_brief"} pairs, yielding one result per
+    pair as soon as it is done. Argument texts are deduplicated across all pairs
+    and encoded up front in large batches. A malformed pair or one that fails
+    to link gets a status "error" result; the other pairs are unaffected.
+    pair_errors maps pair positions to problems found before linking (e.g. a
+    brief_id that couldn't be resolved), which are reported for those pairs.
+    """
+    errors = [(pair_errors or {}).get(index) or pair_error(pair) for index, pair in enumerate(pairs)]
+    arguments = {
+        argument_text(arg): arg
+        for pair, error in zip(pairs, errors) if error is None
+        for key in ("moving_brief", "response_brief")
+        for arg in pair[key]["arguments"]
+    }
+    logger.info(f"Encoding {len(arguments)} unique argument texts for {len(pairs)} brief pairs")
+    chunking = options.get("chunking", ARGUMENT_CHUNKING)
+    embeddings = None
     try:
-        linker = ArgumentLinker()
-        links = []
-        
-        for moving_arg in moving_brief["arguments"]:
-            moving_text = f"{moving_arg['heading']} {moving_arg['content']}"
-            
-            best_match = None
-            best_score = 0
-            best_phrases = []
-            
-            for response_arg in response_brief["arguments"]:
-                response_text = f"{response_arg['heading']} {response_arg['content']}"
-                
-                # Get embeddings and calculate similarity
-                moving_emb = linker.get_embeddings(moving_text)
-                response_emb = linker.get_embeddings(response_text)
-                
-                similarity = cosine_similarity(
-                    moving_emb.reshape(1, -1), 
-                    response_emb.reshape(1, -1)
-                )[0][0]
-                
-                # Find matching phrases
-                matching_phrases = linker.find_matching_phrases(moving_text, response_text)
-                
-                # Update best match if this is better
-                if similarity > best_score:
-                    best_score = similarity
-                    best_match = response_arg
-                    best_phrases = matching_phrases
-            
-            # If we found a good match, create a link
-            if best_match and best_score > linker.similarity_threshold:
-                link = {
-                    "moving_brief_heading": moving_arg["heading"],
-                    "response_brief_heading": best_match["heading"],
-                    "similarity_score": float(best_score),
-                    "matching_phrases": best_phrases,
-                    "explanation": generate_explanation(best_score, best_phrases)
-                }
-                links.append(link)
-        
-        logger.info(f"Created {len(links)} links between arguments")
-        return links
-        
+        embeddings = dict(zip(arguments, ArgumentLinker().encode_arguments(list(arguments.values()), chunking)))
     except Exception as e:
-        logger.error(f"Error linking arguments: {str(e)}")
-        return []
+        # Each pair is embedded on its own instead, so a failure is reported against that pair
+        logger.error(f"Error encoding arguments for brief pairs: {str(e)}")
+
+    for index, (pair, error) in enumerate(zip(pairs, errors)):
+        result = {"pair_index": index, "pair_id": pair.get("pair_id") if isinstance(pair, dict) else None}
+        if error is not None:
+            result.update(status="error", detail=error)
+            yield result
+            continue
+        try:
+            # iter_links rather than link_arguments, which logs failures and returns no links
+            links = list(iter_links(pair["moving_brief"], pair["response_brief"], embeddings=embeddings, **options))
+            result.update(status="success", links=links)
+        except Exception as e:
+            logger.error(f"Error linking brief pair {index}: {str(e)}")
+            result.update(status="error", detail=str(e))
+        yield result
+
+def assign_matches(similarities: np.ndarray, assignment: str = "greedy",
+                   capacity: int = 1, threshold: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Choose a response argument for every moving argument (row). Returns the
+    chosen column per row and its score; rows left unassigned score -inf.
+    With a threshold, optimal assignment only weighs pairs scoring above it,
+    since weaker pairs never become links.
+    """
+    rows = np.arange(similarities.shape[0])
+    if assignment == "greedy":
+        best_idx = similarities.argmax(axis=1)
+        return best_idx, similarities[rows, best_idx]
+    if assignment != "optimal":
+        raise ValueError(f"Unknown assignment mode: {assignment}")
+    if capacity < 1:
+        raise ValueError("capacity must be at least 1")
+
+    from scipy.optimize import linear_sum_assignment
+
+    # Repeating each response column capacity times lets the Hungarian
+    # algorithm give a response argument up to capacity moving arguments
+    n_response = similarities.shape[1]
+    weights = similarities if threshold is None else np.where(similarities > threshold, similarities, 0)
+    expanded = np.tile(weights, (1, capacity))
+    assigned_rows, assigned_cols = linear_sum_assignment(expanded, maximize=True)
+
+    best_idx = np.zeros(len(rows), dtype=np.int64)
+    best_scores = np.full(len(rows), -np.inf, dtype=similarities.dtype)
+    best_idx[assigned_rows] = assigned_cols % n_response
+    best_scores[assigned_rows] = similarities[assigned_rows, best_idx[assigned_rows]]
+    return best_idx, best_scores
+
+def argument_text(argument: Dict) -> str:
+    """
+    Text that represents an argument for embedding
+    """
+    return f"{argument['heading']} {argument['content']}"
+
+def argument_key(argument: Dict) -> str:
+    """
+    Identity of an argument across versions of a brief
+    """
+    return argument.get("section_id") or argument["heading"]
+
+def argument_hash(argument: Dict) -> str:
+    """
+    Hash of everything that goes into an argument's embedding
+    """
+    return hashlib.sha256(argument_text(argument).encode("utf-8")).hexdigest()[:16]
+
+def argument_hashes(brief: Dict) -> Dict[str, str]:
+    return {argument_key(arg): argument_hash(arg) for arg in (brief or {}).get("arguments") or []}
+
+def link_settings(assignment: str = "greedy", capacity: int = 1, candidates: int = LEXICAL_CANDIDATES,
+                  chunking: str = ARGUMENT_CHUNKING, **_) -> Dict:
+    """
+    The iter_links options that decide which links a run produces
+    """
+    return {"assignment": assignment, "capacity": capacity, "candidates": candidates, "chunking": chunking}
+
+def result_hashes(moving_brief: Dict, response_brief: Dict, **options) -> Dict:
+    """
+    The argument_hashes of a link result: a hash per argument of each brief and the
+    options it was linked with, which relink_arguments needs to reuse the result
+    """
+    return {
+        "moving": argument_hashes(moving_brief),
+        "response": argument_hashes(response_brief),
+        "options": link_settings(**options)
+    }
+
+def window_starts(n_tokens: int, window: int, stride: int, max_chunks: int) -> List[int]:
+    """
+    First token of each window over n_tokens tokens. The last window ends at the
+    last token; past max_chunks windows they are spread evenly instead, so the
+    whole argument is still sampled at a bounded cost.
+    """
+    if n_tokens <= window:
+        return [0]
+    starts = list(range(0, n_tokens - window, max(stride, 1))) + [n_tokens - window]
+    if len(starts) > max_chunks:
+        starts = np.linspace(0, n_tokens - window, max(max_chunks, 1)).round().astype(int).tolist()
+    return starts
+
+def argument_similarities(moving: List[np.ndarray], response: List[np.ndarray]) -> np.ndarray:
+    """
+    Cosine similarity of every moving argument against every response argument.
+    Arguments embedded with "maxsim" chunking are (windows x dim) matrices and
+    a pair scores as its most similar pair of windows.
+    """
+    if not moving or not response:
+        return np.zeros((len(moving), len(response)), dtype=np.float32)
+    if moving[0].ndim == 1:
+        return np.stack(moving) @ np.stack(response).T
+    window_scores = np.concatenate(moving) @ np.concatenate(response).T
+    rows = np.cumsum([0] + [len(matrix) for matrix in moving[:-1]])
+    cols = np.cumsum([0] + [len(matrix) for matrix in response[:-1]])
+    return np.maximum.reduceat(np.maximum.reduceat(window_scores, rows, axis=0), cols, axis=1)
+
+def normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize each row so cosine similarity becomes a dot product
+    """
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    # Zero vectors stay zero, matching sklearn's cosine_similarity
+    norms[norms == 0] = 1.0
+    return embeddings / norms
 
 def generate_explanation(similarity_score: float, matching_phrases: List[Tuple[str, str]]) -> str:
     """
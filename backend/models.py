@@ -0,0 +1,108 @@
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+import threading
+import logging
+import os
+import re
+from .encoders import EMBEDDING_BACKEND, OnnxEncoder, load_encoder
+from .metrics import span, texts_encoded
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+_WORD = re.compile(r"\S+")
+
+class SharedModel:
+    """
+    A loaded embedding model shared by every request in the process
+    """
+    def __init__(self, name: str, model: "SentenceTransformer", backend: str = "torch"):
+        self.name = name
+        self.model = model
+        self.backend = backend
+        # Backends produce slightly different vectors, so they must not share cache entries
+        self.cache_key = name if backend == "torch" else f"{name}@{backend}"
+        # The fast tokenizer is not safe to drive from several threads at once,
+        # so concurrent requests take turns on the encoder
+        self._lock = threading.Lock()
+        self.texts_encoded = 0
+
+    def encode(self, texts, **kwargs):
+        with self._lock:
+            count = 1 if isinstance(texts, str) else len(texts)
+            self.texts_encoded += count
+            texts_encoded.inc(count, model=self.name)
+            return self.model.encode(texts, **kwargs)
+
+    def token_spans(self, texts: List[str]) -> List[List[Tuple[int, int]]]:
+        """
+        Character span of every token in each text, from the model's own fast
+        tokenizer when it has one and whitespace-separated words otherwise
+        """
+        tokenizer = getattr(self.model, "tokenizer", None)
+        if tokenizer is None or not getattr(tokenizer, "is_fast", False):
+            return [[match.span() for match in _WORD.finditer(text)] for text in texts]
+        with self._lock:
+            encoded = tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True)
+        return [[tuple(span) for span in spans] for spans in encoded["offset_mapping"]]
+
+class ModelRegistry:
+    """
+    Loads each embedding model once and hands the same instance to every caller
+    """
+    def __init__(self):
+        self._models: Dict[str, SharedModel] = {}
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def get(self, name: str = DEFAULT_MODEL_NAME) -> SharedModel:
+        """
+        Return the shared model, loading it on first use
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                logger.info(f"Loading {EMBEDDING_BACKEND} encoder for model: {name}")
+                with span("model_load"):
+                    encoder = load_encoder(name, EMBEDDING_BACKEND)
+                    # A failed parity check falls back to the PyTorch model
+                    backend = EMBEDDING_BACKEND if isinstance(encoder, OnnxEncoder) else "torch"
+                    model = SharedModel(name, encoder, backend)
+                self._models[name] = model
+                # A model loaded by a request rather than warm_up (e.g. MODEL_WARMUP=off) counts too
+                self._ready = True
+        return model
+
+    def register(self, name: str, model) -> SharedModel:
+        """
+        Install an already-constructed model under name, e.g. a local stub for offline benchmarks
+        """
+        with self._lock:
+            shared = SharedModel(name, model)
+            self._models[name] = shared
+        return shared
+
+    def warm_up(self, names: Optional[List[str]] = None) -> None:
+        """
+        Load the given models and run one encode so the first request is not slow
+        """
+        for name in names or [DEFAULT_MODEL_NAME]:
+            self.get(name).encode(["warm up"])
+            logger.info(f"Model warmed up: {name}")
+        self._ready = True
+
+    def is_ready(self) -> bool:
+        return self._ready
+
+    def loaded_models(self) -> List[str]:
+        return list(self._models)
+
+registry = ModelRegistry()
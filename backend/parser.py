@@ -1,112 +1,276 @@
 from fastapi import UploadFile
-from llama_cloud_services import LlamaParse
-from llama_index.core import SimpleDirectoryReader
+from fastapi.concurrency import run_in_threadpool
 import os
-from dotenv import load_dotenv
-from typing import Dict, List
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+import asyncio
+import hashlib
 import json
-import nest_asyncio
 import logging
+import tempfile
+import threading
+import time
+import weakref
+from .briefs import brief_store
+from .metrics import metrics, span
+from .segmentation import SEGMENTER_VERSION, outline_number, outline_sections
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-nest_asyncio.apply()
-load_dotenv()
 LLAMA_CLOUD_API_KEY = os.getenv("LLAMAPARSE_API_KEY")
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(100 * 1024 * 1024)))
+PARSE_RESULT_TYPE = "markdown"
+PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", "256"))
+PARSE_CACHE_TTL = float(os.getenv("PARSE_CACHE_TTL", str(7 * 24 * 3600)))
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR")
+# "sample" returns fixed arguments for development, "llamaparse" calls LlamaParse
+# and "mock" reads the upload as local markdown, for testing without the service
+PARSE_BACKEND = os.getenv("PARSE_BACKEND", "sample")
+PARSE_CONCURRENCY = int(os.getenv("PARSE_CONCURRENCY", "4"))
+PARSE_RETRIES = int(os.getenv("PARSE_RETRIES", "3"))
+PARSE_RETRY_BACKOFF = float(os.getenv("PARSE_RETRY_BACKOFF", "1.0"))
+PARSE_PAGES_PER_CHUNK = int(os.getenv("PARSE_PAGES_PER_CHUNK", "25"))
+PARSE_MOCK_LATENCY = float(os.getenv("PARSE_MOCK_LATENCY", "0"))
+MOCK_PAGE_BREAK = "\f"
 
-async def parse_document(file: UploadFile) -> Dict:
+ARGUMENT_INDICATORS = [
+    "argument",
+    "point",
+    "reason",
+    "contention",
+    "discussion"
+]
+
+# Parts of a brief whose numbered headings are not arguments
+NON_ARGUMENT_PARTS = [
+    "table of",
+    "introduction",
+    "preliminary statement",
+    "statement of",
+    "background",
+    "procedural history",
+    "conclusion"
+]
+
+class UploadTooLargeError(ValueError):
+    pass
+
+class EmptyParseError(RuntimeError):
+    pass
+
+class SavedUpload(NamedTuple):
+    path: str
+    sha256: str
+    size: int
+
+async def save_upload(file: UploadFile, max_size: int = MAX_UPLOAD_SIZE) -> SavedUpload:
+    """
+    Stream an upload to a uniquely named temp file in fixed-size chunks,
+    hashing the bytes on the way so the content is never held in memory at once
+    """
+    suffix = os.path.splitext(file.filename or "")[1]
+    temp_file = await run_in_threadpool(tempfile.NamedTemporaryFile, prefix="brief_", suffix=suffix, delete=False)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLargeError(f"File exceeds the maximum upload size of {max_size} bytes")
+            digest.update(chunk)
+            await run_in_threadpool(temp_file.write, chunk)
+    except Exception:
+        await run_in_threadpool(temp_file.close)
+        os.remove(temp_file.name)
+        raise
+    await run_in_threadpool(temp_file.close)
+    return SavedUpload(temp_file.name, digest.hexdigest(), size)
+
+class ParseCache:
+    """
+    Parsed brief results keyed by file content hash plus parser settings, kept in
+    memory with TTL and LRU eviction and optionally mirrored to JSON files on disk.
+    Files left by earlier processes are pruned on first use rather than at import.
+    """
+    def __init__(self, max_entries: int = PARSE_CACHE_SIZE, ttl: float = PARSE_CACHE_TTL,
+                 directory: Optional[str] = PARSE_CACHE_DIR):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._pruned = not directory
+
+    def _prune_directory(self) -> None:
+        """
+        Remove result files that have expired, and the oldest ones past
+        max_entries, left behind by earlier processes. Must hold the lock.
+        """
+        if self._pruned:
+            return
+        self._pruned = True
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".json") and os.path.isfile(path):
+                files.append((os.path.getmtime(path), path))
+        files.sort(reverse=True)
+        cutoff = time.time() - self.ttl
+        stale = [path for i, (mtime, path) in enumerate(files) if mtime < cutoff or i >= max(self.max_entries, 0)]
+        for path in stale:
+            os.remove(path)
+        if stale:
+            logger.info(f"Pruned {len(stale)} expired or surplus parse results from {self.directory}")
+
+    @staticmethod
+    def settings_fingerprint() -> str:
+        settings = {
+            "backend": PARSE_BACKEND,
+            "result_type": PARSE_RESULT_TYPE,
+            "argument_indicators": ARGUMENT_INDICATORS,
+            "non_argument_parts": NON_ARGUMENT_PARTS,
+            "segmenter_version": SEGMENTER_VERSION
+        }
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    def key(self, content_hash: str) -> str:
+        return f"{content_hash}-{self.settings_fingerprint()}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _evict(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if self.directory and os.path.exists(self._path(key)):
+            os.remove(self._path(key))
+
+    def _trim(self) -> None:
+        # The most recently used entry is kept even when max_entries is 0
+        while len(self._entries) > max(self.max_entries, 1):
+            self._evict(next(iter(self._entries)))
+
+    def get(self, content_hash: str) -> Optional[Dict]:
+        key = self.key(content_hash)
+        with self._lock:
+            self._prune_directory()
+            entry = self._entries.get(key)
+            if entry is None and self.directory and os.path.exists(self._path(key)):
+                with open(self._path(key)) as f:
+                    entry = (os.path.getmtime(self._path(key)), f.read())
+                self._entries[key] = entry
+            if entry is None or time.time() - entry[0] > self.ttl:
+                if entry is not None:
+                    self._evict(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            # Results read back from disk count against max_entries like new ones
+            self._trim()
+        # Hand out a fresh copy so callers can't mutate the cached result
+        return json.loads(entry[1])
+
+    def put(self, content_hash: str, result: Dict) -> None:
+        if self.max_entries <= 0:
+            return
+        key = self.key(content_hash)
+        payload = json.dumps(result)
+        with self._lock:
+            self._prune_directory()
+            self._entries[key] = (time.time(), payload)
+            self._entries.move_to_end(key)
+            if self.directory:
+                with open(self._path(key), "w") as f:
+                    f.write(payload)
+            self._trim()
+
+parse_cache = ParseCache()
+
+def _parse_cache_metrics() -> List[str]:
+    return [
+        "# TYPE legalbrief_parse_cache_hits_total counter",
+        f"legalbrief_parse_cache_hits_total {parse_cache.hits}",
+        "# TYPE legalbrief_parse_cache_misses_total counter",
+        f"legalbrief_parse_cache_misses_total {parse_cache.misses}"
+    ]
+
+metrics.add_collector(_parse_cache_metrics)
+
+async def parse_document(file: UploadFile, on_parsed: Optional[Callable[[Dict], None]] = None) -> Dict:
     """
     Parse legal brief using LlamaParse via LlamaIndex
     """
     logger.info(f"Starting to parse document: {file.filename}")
-    
-    if not LLAMA_CLOUD_API_KEY:
-        logger.error("LlamaParse API key not found")
-        raise ValueError("LlamaParse API key not found")
+    with span("upload_stream"):
+        upload = await save_upload(file)
+    with span("parse"):
+        return await parse_saved_upload(upload, file.filename, on_parsed)
 
-    temp_path = f"/tmp/{file.filename}"
+async def parse_saved_upload(upload: SavedUpload, filename: str,
+                             on_parsed: Optional[Callable[[Dict], None]] = None,
+                             progress: Optional[Callable[[int, int], None]] = None) -> Dict:
+    """
+    Parse a brief that has already been streamed to disk, removing the temp file afterwards.
+    on_parsed(brief) is called after a fresh parse, but not for a cached result
+    or the fixed brief of the sample backend, which must never be kept.
+    progress(pages_parsed, page_count) is called as page ranges come back from
+    the parser; cached results and the sample backend parse no pages.
+    """
+    temp_path = upload.path
     try:
-        with open(temp_path, "wb") as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-        
-        logger.info(f"File saved temporarily at: {temp_path}")
-        
-        # For testing purposes, return a mock structure if LlamaParse is not working
-        # This helps bypass LlamaParse issues during development -> can remove later on tbh
-        logger.info("Using mock data for testing")
-        structured_content = {
-            "brief_id": str(hash(file.filename))[:8],
-            "arguments": [
-                {
-                    "heading": "Argument I",
-                    "content": "This is a sample argument from the moving brief.",
-                    "section_id": "12345678"
-                },
-                {
-                    "heading": "Argument II",
-                    "content": "This is another sample argument discussing legal precedent.",
-                    "section_id": "87654321"
-                }
-            ]
-        }
-        
-        logger.info("Document parsing completed successfully")
-        return structured_content
-        
-        # Uncomment when LlamaParse is configured
-        """
-        # Initialize LlamaParse with markdown output
-        parser = LlamaParse(
-            api_key=LLAMA_CLOUD_API_KEY,
-            result_type="markdown"
-        )
-        
-        # Use SimpleDirectoryReader with our parser
-        file_extractor = {".pdf": parser, ".docx": parser}
-        documents = SimpleDirectoryReader(
-            input_files=[temp_path], 
-            file_extractor=file_extractor
-        ).load_data()
-        
-        if not documents:
-            logger.error(f"Failed to parse document: {file.filename}")
-            raise ValueError(f"Failed to parse document: {file.filename}")
-        
-        # Extract arguments and structure from the parsed document
-        # We'll assume the first document contains our content
-        doc = documents[0]
-        
-        # Convert markdown content to structured format
-        structured_content = {
-            "brief_id": str(hash(doc.text))[:8],  # Generate a simple ID
-            "arguments": []
-        }
+        if PARSE_BACKEND != "mock" and not LLAMA_CLOUD_API_KEY:
+            logger.error("LlamaParse API key not found")
+            raise ValueError("LlamaParse API key not found")
+
+        logger.info(f"File saved temporarily at: {temp_path} ({upload.size} bytes, sha256 {upload.sha256[:12]})")
+
+        # Cache entries can be multi-MB JSON files, so they are read and decoded off the event loop
+        cached = await run_in_threadpool(parse_cache.get, upload.sha256)
+        if cached is not None:
+            logger.info(f"Returning cached parse result for {filename}")
+            brief_store.put(cached)
+            return cached
         
-        # Split content into sections based on markdown headers
-        sections = doc.text.split('\n#')
-        for section in sections:
-            if not section.strip():
-                continue
-                
-            # Extract heading and content
-            lines = section.strip().split('\n', 1)
-            if len(lines) == 2:
-                heading = lines[0].strip('# ')
-                content = lines[1].strip()
-                
-                if is_argument_section(heading):
-                    argument = {
-                        "heading": heading,
-                        "content": content,
-                        "section_id": str(hash(heading))[:8]
+        if PARSE_BACKEND == "sample":
+            # For testing purposes, return a mock structure if LlamaParse is not working
+            # This helps bypass LlamaParse issues during development -> can remove later on tbh
+            logger.info("Using mock data for testing")
+            structured_content = {
+                "brief_id": brief_id_for(upload.sha256),
+                "arguments": [
+                    {
+                        "heading": "Argument I",
+                        "content": "This is a sample argument from the moving brief.",
+                        "section_id": "12345678"
+                    },
+                    {
+                        "heading": "Argument II",
+                        "content": "This is another sample argument discussing legal precedent.",
+                        "section_id": "87654321"
                     }
-                    structured_content["arguments"].append(argument)
+                ]
+            }
+        else:
+            text = await parse_markdown(temp_path, parse_backend_for(PARSE_BACKEND), progress)
+            if not text.strip():
+                logger.error(f"Failed to parse document: {filename}")
+                raise ValueError(f"Failed to parse document: {filename}")
+            structured_content = structure_markdown(text, upload.sha256)
 
+        await run_in_threadpool(parse_cache.put, upload.sha256, structured_content)
+        brief_store.put(structured_content)
+        if on_parsed is not None and PARSE_BACKEND != "sample":
+            on_parsed(structured_content)
         logger.info("Document parsing completed successfully")
         return structured_content
-        """
     
     except Exception as e:
         logger.error(f"Error parsing document: {str(e)}")
@@ -117,16 +281,193 @@ async def parse_document(file: UploadFile) -> Dict:
             os.remove(temp_path)
             logger.info(f"Temporary file removed: {temp_path}")
 
-def is_argument_section(heading: str) -> bool:
+class LlamaParseBackend:
     """
-    Determine if a section is an argument section based on its heading
+    Markdown from LlamaParse's async API, one request per page range
     """
-    argument_indicators = [
-        "argument",
-        "point",
-        "reason",
-        "contention",
-        "discussion"
-    ]
-    
-    return any(indicator in heading.lower() for indicator in argument_indicators)
+    def page_count(self, path: str) -> int:
+        if not path.lower().endswith(".pdf"):
+            return 1
+        try:
+            from pypdf import PdfReader
+            return len(PdfReader(path).pages)
+        except Exception:
+            # Without a page count the document is sent whole and LlamaParse reports any problem
+            return 1
+
+    async def parse_pages(self, path: str, pages: Optional[range]) -> str:
+        options = {}
+        if pages is not None:
+            # LlamaParse page numbers are zero-based
+            options["target_pages"] = ",".join(str(page) for page in pages)
+        # Imported on first use; the llama packages are slow to import and most
+        # processes (mock parsing, link-only workers) never need them
+        from llama_cloud_services import LlamaParse
+        # By default LlamaParse logs a failed job and returns no documents, which
+        # would leave a hole in the stitched markdown; have it raise instead
+        parser = LlamaParse(api_key=LLAMA_CLOUD_API_KEY, result_type=PARSE_RESULT_TYPE,
+                            ignore_errors=False, **options)
+        documents = await parser.aload_data(path)
+        if not documents:
+            where = f"pages {pages.start + 1}-{pages.stop}" if pages is not None else "any page"
+            raise EmptyParseError(f"LlamaParse returned no documents for {where} of {path}")
+        return "\n".join(doc.text for doc in documents)
+
+class MockParseBackend:
+    """
+    Offline stand-in for LlamaParse: reads the upload as UTF-8 markdown with form
+    feeds between pages, optionally sleeping per page to mimic service latency
+    """
+    def __init__(self, latency: float = PARSE_MOCK_LATENCY):
+        self.latency = latency
+
+    def _pages(self, path: str) -> List[str]:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return f.read().split(MOCK_PAGE_BREAK)
+
+    def page_count(self, path: str) -> int:
+        return len(self._pages(path))
+
+    async def parse_pages(self, path: str, pages: Optional[range]) -> str:
+        texts = await run_in_threadpool(self._pages, path)
+        if pages is not None:
+            texts = texts[pages.start:pages.stop]
+        if self.latency:
+            await asyncio.sleep(self.latency * len(texts))
+        return "\n".join(texts)
+
+PARSE_BACKENDS = {"llamaparse": LlamaParseBackend, "mock": MockParseBackend}
+
+def parse_backend_for(name: str):
+    if name not in PARSE_BACKENDS:
+        raise ValueError(f"Unknown parse backend: {name}")
+    return PARSE_BACKENDS[name]()
+
+# One semaphore per event loop; asyncio primitives can't be shared across loops
+_parse_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+def parse_slots() -> asyncio.Semaphore:
+    """
+    Bounds the parser calls in flight across every upload being parsed
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _parse_slots:
+        _parse_slots[loop] = asyncio.Semaphore(PARSE_CONCURRENCY)
+    return _parse_slots[loop]
+
+def is_transient_parse_error(error: Exception) -> bool:
+    """
+    Network failures, timeouts, rate limits, server-side errors and empty
+    results for a page range are worth retrying
+    """
+    import httpx
+    if isinstance(error, (httpx.TransportError, asyncio.TimeoutError, ConnectionError, EmptyParseError)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return False
+
+async def with_parse_retry(operation: Callable[[], Awaitable[str]], retries: int = PARSE_RETRIES,
+                           backoff: float = PARSE_RETRY_BACKOFF) -> str:
+    """
+    Await operation, retrying transient failures with exponential backoff
+    """
+    for attempt in range(retries + 1):
+        try:
+            return await operation()
+        except Exception as e:
+            if attempt == retries or not is_transient_parse_error(e):
+                raise
+            delay = backoff * (2 ** attempt)
+            logger.warning(f"Transient parser error, retrying in {delay:.1f}s: {str(e)}")
+            await asyncio.sleep(delay)
+
+def page_ranges(page_count: int, pages_per_chunk: int = PARSE_PAGES_PER_CHUNK) -> List[Optional[range]]:
+    """
+    Split a document into page ranges; [None] means parse it whole
+    """
+    if pages_per_chunk <= 0 or page_count <= pages_per_chunk:
+        return [None]
+    return [range(start, min(start + pages_per_chunk, page_count))
+            for start in range(0, page_count, pages_per_chunk)]
+
+async def parse_markdown(path: str, backend,
+                         progress: Optional[Callable[[int, int], None]] = None) -> str:
+    """
+    Parse every page range of a document concurrently and stitch the markdown
+    back in page order, calling progress(pages_parsed, page_count) as ranges finish
+    """
+    page_count = await run_in_threadpool(backend.page_count, path)
+    ranges = page_ranges(page_count)
+    if len(ranges) > 1:
+        logger.info(f"Parsing {page_count} pages in {len(ranges)} ranges")
+    pages_parsed = 0
+    if progress:
+        progress(pages_parsed, page_count)
+
+    async def parse_range(pages: Optional[range]) -> str:
+        nonlocal pages_parsed
+        async def attempt() -> str:
+            async with parse_slots():
+                return await backend.parse_pages(path, pages)
+        text = await with_parse_retry(attempt)
+        pages_parsed += len(pages) if pages is not None else page_count
+        if progress:
+            progress(pages_parsed, page_count)
+        return text
+
+    # gather keeps results in the order of the ranges, whatever order they finish in
+    return "\n".join(await asyncio.gather(*(parse_range(pages) for pages in ranges)))
+
+def structure_markdown(text: str, content_hash: str) -> Dict:
+    """
+    Convert parsed markdown into the brief structure, one argument per
+    section whose heading looks like an argument
+    """
+    structured_content = {
+        "brief_id": brief_id_for(content_hash),
+        "arguments": []
+    }
+
+    for section in outline_sections(text):
+        if section.content and is_argument_section(section.heading, section.parents):
+            path = " / ".join(section.parents + (section.heading,))
+            structured_content["arguments"].append({
+                "heading": section.heading,
+                "content": section.content,
+                # hash() is salted per process, so derive a stable id from the heading path
+                "section_id": hashlib.sha256(path.encode("utf-8")).hexdigest()[:8]
+            })
+    return structured_content
+
+def brief_id_for(content_hash: str) -> str:
+    """
+    Stable brief id derived from the SHA-256 of the uploaded file
+    """
+    return content_hash[:16]
+
+def is_argument_section(heading: str, parents: Tuple[str, ...] = ()) -> bool:
+    """
+    Determine if a section is an argument section based on its heading: either it
+    names an argument, or it is outline-numbered (I., A., 1.) and its nearest
+    named ancestor is an argument rather than the facts, conclusion, etc.
+    """
+    def is_non_argument(text: str) -> bool:
+        return any(part in text.lower() for part in NON_ARGUMENT_PARTS)
+
+    def names_argument(text: str) -> bool:
+        return any(indicator in text.lower() for indicator in ARGUMENT_INDICATORS)
+
+    if is_non_argument(heading):
+        return False
+    if names_argument(heading):
+        return True
+    if outline_number(heading)[1] == 0:
+        return False
+    for parent in reversed(parents):
+        if is_non_argument(parent):
+            return False
+        if names_argument(parent):
+            return True
+    return True
@@ -0,0 +1,103 @@
+import numpy as np
+from typing import Optional, Tuple
+
+VECTOR_FORMATS = ("float32", "float16", "int8")
+# Rows scored per block, which bounds the float32 scratch space used by dot()
+SCORE_BLOCK_ROWS = 65536
+
+def quantize(vectors: np.ndarray, fmt: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Convert L2-normalized float32 rows to a storage format. int8 uses a
+    symmetric per-row scale, returned alongside the codes.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if fmt == "float32":
+        return vectors.copy(), None
+    if fmt == "float16":
+        return vectors.astype(np.float16), None
+    if fmt == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Unknown vector format: {fmt}")
+
+def dequantize(data: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    vectors = data.astype(np.float32)
+    if scales is not None:
+        vectors *= scales[:, None]
+    return vectors
+
+class VectorStore:
+    """
+    Growable matrix of normalized embeddings kept in float32, float16 or int8.
+    Cosine similarity against a normalized query is a plain dot product,
+    computed block by block so only a slice is ever upcast to float32.
+    """
+    def __init__(self, dim: int, fmt: str = "float32"):
+        if fmt not in VECTOR_FORMATS:
+            raise ValueError(f"Unknown vector format: {fmt}")
+        self.dim = dim
+        self.fmt = fmt
+        self._size = 0
+        self._data = np.zeros((0, dim), dtype=np.int8 if fmt == "int8" else np.dtype(fmt))
+        self._scales = np.zeros(0, dtype=np.float32) if fmt == "int8" else None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        total = self._size * self._data.itemsize * self.dim
+        if self._scales is not None:
+            total += self._size * self._scales.itemsize
+        return total
+
+    def append(self, vectors: np.ndarray) -> None:
+        if len(vectors) == 0:
+            return
+        data, scales = quantize(vectors, self.fmt)
+        needed = self._size + len(data)
+        # Grow geometrically so appends stay amortized O(1)
+        if needed > len(self._data):
+            capacity = max(needed, 2 * len(self._data), 1024)
+            grown = np.zeros((capacity, self.dim), dtype=self._data.dtype)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+            if self._scales is not None:
+                grown_scales = np.zeros(capacity, dtype=np.float32)
+                grown_scales[:self._size] = self._scales[:self._size]
+                self._scales = grown_scales
+        self._data[self._size:needed] = data
+        if self._scales is not None:
+            self._scales[self._size:needed] = scales
+        self._size = needed
+
+    def take(self, indices: np.ndarray) -> np.ndarray:
+        """
+        Decode the given rows back to float32
+        """
+        scales = self._scales[indices] if self._scales is not None else None
+        return dequantize(self._data[indices], scales)
+
+    def all(self) -> np.ndarray:
+        return self.take(np.arange(self._size))
+
+    def dot(self, query: np.ndarray, indices: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Scores of a float32 query against all rows, or only the given rows
+        """
+        query = np.asarray(query, dtype=np.float32)
+        if indices is None:
+            indices = np.arange(self._size)
+        scores = np.empty(len(indices), dtype=np.float32)
+        for start in range(0, len(indices), SCORE_BLOCK_ROWS):
+            block = indices[start:start + SCORE_BLOCK_ROWS]
+            if self.fmt == "float32":
+                scores[start:start + len(block)] = self._data[block] @ query
+            else:
+                block_scores = self._data[block].astype(np.float32) @ query
+                if self._scales is not None:
+                    block_scores *= self._scales[block]
+                scores[start:start + len(block)] = block_scores
+        return scores
@@ -0,0 +1,195 @@
+from typing import List, NamedTuple, Optional, Tuple
+import os
+import re
+
+# Bump when splitting or sectioning output changes, so cached parses are redone
+SEGMENTER_VERSION = 2
+SEGMENT_MIN_WORDS = int(os.getenv("SEGMENT_MIN_WORDS", "4"))
+SEGMENT_MAX_SENTENCES = int(os.getenv("SEGMENT_MAX_SENTENCES", "48"))
+HEADING_MAX_CHARS = 200
+
+# Words that end in a period without ending the sentence, compared lowercased
+ABBREVIATIONS = frozenset({
+    "v", "vs", "ibid", "cf", "e.g", "i.e", "etc", "al", "nos", "inc", "corp", "co",
+    "ltd", "llc", "l.l.c", "assn", "ass'n", "dept", "dep't", "gov't", "int'l", "nat'l", "cir", "ct",
+    "dist", "app", "supp", "fed", "civ", "crim", "evid", "proc", "stat", "ann", "rev", "reg", "regs",
+    "art", "sec", "secs", "ch", "cl", "para", "pp", "pg", "vol", "ed", "eds", "cong", "sess", "amend",
+    "const", "mr", "mrs", "ms", "dr", "jr", "sr", "st", "hon", "j", "jj", "c.j", "approx", "fig",
+    "cal", "tex", "fla", "mich", "minn", "pa", "va", "wis", "n.y", "n.j", "gen",
+    "jan", "feb", "mar", "apr", "aug", "sept", "oct", "nov", "dec"
+})
+# Abbreviations that are also everyday words ("The answer is no."), which only
+# count as abbreviations when a number or reporter follows, as in "No. 12-345"
+# or "Ill. App. 3d". "Id." only continues into "at" or a pin cite.
+WORD_ABBREVIATIONS = frozenset({"no", "ill", "mass", "wash"})
+_PIN_CITE = re.compile(r"^[\d¶§*]")
+
+_WHITESPACE = re.compile(r"\s+")
+# Sentence-final punctuation, optional closing quotes or brackets, then a capitalized word
+_SENTENCE_END = re.compile(r"[.!?]+[\"'”’)\]]*\s+(?=[\"'“‘(\[]?[A-Z])")
+# Dotted initialisms such as U.S. or N.L.R.B.
+_INITIALISM = re.compile(r"^(?:[A-Za-z]\.)+[A-Za-z]$")
+_LEADING_PUNCTUATION = "(\"'[“‘"
+
+_MARKDOWN_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_BOLD_LINE = re.compile(r"^(\*\*|__)(.+)\1$")
+_OUTLINE_NUMBER = re.compile(r"^(?:([IVXL]+)|([A-Z])|(\d{1,3})|([a-z]))\.\s+\S")
+_ROMAN_VALUES = {"I": 1, "V": 5, "X": 10, "L": 50}
+
+class Section(NamedTuple):
+    heading: str
+    level: int
+    number: Optional[str]
+    parents: Tuple[str, ...]
+    content: str
+
+def _is_abbreviation(text: str, start: int, end: int) -> bool:
+    """
+    Whether the word ending at text[end] (a period) is an abbreviation
+    """
+    token = text[text.rfind(" ", start, end) + 1:end].lstrip(_LEADING_PUNCTUATION)
+    if len(token) == 1 and token.isalpha():
+        # Initials and rule letters, e.g. "J. Smith" or "Fed. R. Civ. P."
+        return True
+    word = token.lower()
+    if word == "id" or word in WORD_ABBREVIATIONS:
+        following = text[end + 1:].lstrip(" " + _LEADING_PUNCTUATION).split(" ", 1)[0]
+        if _PIN_CITE.match(following) or following.lower() == "at":
+            return True
+        # A reporter or code name, itself abbreviated
+        return word != "id" and following.endswith(".") and _is_abbreviation(following, 0, len(following) - 1)
+    return word in ABBREVIATIONS or bool(_INITIALISM.match(token))
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Split text into sentences without breaking citations such as
+    "Smith v. Jones, 410 U.S. 113 (1973)" or "Fed. R. Civ. P. 12(b)(6)"
+    """
+    text = _WHITESPACE.sub(" ", text).strip()
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        end = match.start()
+        if text[end] == "." and _is_abbreviation(text, start, end):
+            continue
+        sentences.append(text[start:match.end()].strip())
+        start = match.end()
+    if start < len(text):
+        sentences.append(text[start:])
+    return sentences
+
+def merge_fragments(sentences: List[str], min_words: int = SEGMENT_MIN_WORDS,
+                    max_sentences: int = SEGMENT_MAX_SENTENCES) -> List[str]:
+    """
+    Fold fragments shorter than min_words into a neighbouring sentence, then
+    join adjacent sentences until there are at most max_sentences of them
+    """
+    merged: List[str] = []
+    for sentence in sentences:
+        if merged and len(sentence.split()) < min_words:
+            merged[-1] = f"{merged[-1]} {sentence}"
+        else:
+            merged.append(sentence)
+    if len(merged) > 1 and len(merged[0].split()) < min_words:
+        merged[1] = f"{merged[0]} {merged[1]}"
+        merged.pop(0)
+
+    if max_sentences > 0 and len(merged) > max_sentences:
+        group = -(-len(merged) // max_sentences)
+        merged = [" ".join(merged[i:i + group]) for i in range(0, len(merged), group)]
+    return merged
+
+def segment_sentences(text: str) -> List[str]:
+    """
+    Sentences of an argument as embedded for phrase matching
+    """
+    return merge_fragments(split_sentences(text))
+
+def outline_number(heading: str, previous_letter: Optional[str] = None) -> Tuple[Optional[str], int]:
+    """
+    Outline number and depth of a heading: "I." is 1, "A." is 2, "1." is 3 and
+    "a." is 4. Unnumbered headings return (None, 0). I, V and X count as
+    letters when they follow H, U and W at the letter level.
+    """
+    match = _OUTLINE_NUMBER.match(heading)
+    if not match:
+        return None, 0
+    roman, letter, digits, lower = match.groups()
+    if roman:
+        follows_letter = previous_letter and len(roman) == 1 and ord(roman) == ord(previous_letter) + 1
+        if not follows_letter and all(c in _ROMAN_VALUES for c in roman):
+            return roman, 1
+        letter = roman if len(roman) == 1 else None
+        if letter is None:
+            return None, 0
+    if letter:
+        return letter, 2
+    if digits:
+        return digits, 3
+    return lower, 4
+
+def _heading_text(line: str, markdown_only: bool) -> Tuple[Optional[str], int]:
+    """
+    The heading in a line, if it is one, and its markdown depth (0 if it isn't a
+    markdown heading). Besides markdown headings, outline-numbered lines that are
+    bold or mostly upper case count as headings.
+    """
+    match = _MARKDOWN_HEADING.match(line)
+    if match:
+        return match.group(2).strip("*_ ") or None, len(match.group(1))
+    if markdown_only or len(line) > HEADING_MAX_CHARS:
+        return None, 0
+    bold = _BOLD_LINE.match(line)
+    text = bold.group(2).strip() if bold else line
+    if not _OUTLINE_NUMBER.match(text):
+        return None, 0
+    letters = [c for c in text if c.isalpha()]
+    if bold or (letters and sum(c.isupper() for c in letters) >= 0.8 * len(letters)):
+        return text, 0
+    return None, 0
+
+def outline_sections(markdown: str, markdown_only: bool = False) -> List[Section]:
+    """
+    Split parsed markdown into sections at markdown headings and at outline-numbered
+    heading lines (I., A., 1., a.), tracking each section's parent headings.
+    Numbered headings nest by their outline depth, unnumbered ones by markdown depth.
+    """
+    sections: List[Section] = []
+    # (outline level, markdown depth, heading) of the open ancestors
+    stack: List[Tuple[int, int, str]] = []
+    previous_letter: Optional[str] = None
+    heading: Optional[str] = None
+    level, number, parents = 0, None, ()
+    body: List[str] = []
+
+    def close() -> None:
+        if heading is not None:
+            sections.append(Section(heading, level, number, parents, "\n".join(body).strip()))
+
+    for raw_line in markdown.splitlines():
+        line = raw_line.strip()
+        text, depth = _heading_text(line, markdown_only) if line else (None, 0)
+        if text is None:
+            body.append(raw_line)
+            continue
+
+        close()
+        number, level = outline_number(text, previous_letter)
+        if level:
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+        else:
+            while stack and stack[-1][1] >= depth:
+                stack.pop()
+            # Unnumbered headings at the top are parts of the brief (facts, argument, ...)
+            level = stack[-1][0] + 1 if stack else 0
+        if level == 2:
+            previous_letter = number
+        elif level <= 1:
+            previous_letter = None
+        parents = tuple(h for _, _, h in stack)
+        # Headings that aren't markdown nest one markdown level below their parent
+        stack.append((level, depth or (stack[-1][1] + 1 if stack else 1), text))
+        heading, body = text, []
+    close()
+    return sections
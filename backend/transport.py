@@ -0,0 +1,142 @@
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.types import Message, Receive, Scope, Send
+from typing import Any, Callable, Dict
+import json
+import os
+import zlib
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+except ImportError:
+    # orjson is optional; without it the standard library json module is used
+    orjson = None
+
+# Responses smaller than this are sent uncompressed
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", "1024"))
+# Largest request body accepted after gzip decompression
+MAX_REQUEST_BODY = int(os.getenv("MAX_REQUEST_BODY", str(100 * 1024 * 1024)))
+# Allowance for multipart boundaries and part headers on top of the file sizes
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Streamed one record at a time; GZipFile only emits output as its buffer fills,
+# so compressing these would hold links back until the stream ends
+UNCOMPRESSED_MEDIA_TYPES = ("application/x-ndjson", "text/event-stream")
+
+JSON_RESPONSE_CLASS = ORJSONResponse if orjson else JSONResponse
+
+def dumps(data: Any) -> str:
+    if orjson:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY).decode("utf-8")
+    return json.dumps(data)
+
+def loads(data: bytes) -> Any:
+    return orjson.loads(data) if orjson else json.loads(data)
+
+def gunzip(body: bytes, max_size: int = MAX_REQUEST_BODY) -> bytes:
+    """
+    Decompress a gzip request body, refusing anything that inflates past max_size
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(body, max_size)
+    except zlib.error:
+        raise HTTPException(status_code=400, detail="Request body is not valid gzip")
+    if decompressor.unconsumed_tail:
+        raise HTTPException(status_code=413, detail=f"Decompressed request body exceeds {max_size} bytes")
+    return data
+
+class CompressedRequest(Request):
+    """
+    A request whose body may be sent with Content-Encoding: gzip and whose JSON
+    is parsed with orjson when it is installed
+    """
+    async def body(self) -> bytes:
+        if not hasattr(self, "_body"):
+            body = await super().body()
+            if "gzip" in self.headers.get("content-encoding", "").lower():
+                body = gunzip(body)
+            self._body = body
+        return self._body
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = loads(await self.body())
+        return self._json
+
+class CompressedRoute(APIRoute):
+    """
+    Route class that hands endpoints a CompressedRequest
+    """
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def compressed_handler(request: Request):
+            return await handler(CompressedRequest(request.scope, request.receive))
+
+        return compressed_handler
+
+class StreamingGZipResponder(GZipResponder):
+    async def send_with_gzip(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            await super().send_with_gzip(message)
+            media_type = Headers(raw=message["headers"]).get("content-type", "").split(";")[0].strip()
+            if media_type in UNCOMPRESSED_MEDIA_TYPES:
+                # Passed through untouched, as for responses that set their own encoding
+                self.content_encoding_set = True
+            return
+        await super().send_with_gzip(message)
+
+class StreamingGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware that leaves NDJSON and server-sent event streams
+    uncompressed, so each line reaches the client as soon as it is sent
+    """
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = StreamingGZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+class BodySizeLimitMiddleware:
+    """
+    Rejects request bodies over a per-path limit with 413 before they are read.
+    Starlette spools every multipart file to a temp file before the endpoint
+    runs, so a limit checked there only fires once the whole body is in.
+    A Content-Length over the limit is refused outright; bodies without one
+    are counted as they arrive and cut off once they pass it.
+    """
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body exceeds the maximum of {limit} bytes"
+        length = Headers(scope=scope).get("content-length", "")
+        if length.isdigit() and int(length) > limit:
+            response = JSONResponse({"detail": detail}, status_code=413, headers={"Connection": "close"})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,78 @@
+"""
+Sliding-window chunking of long arguments.
+
+    python -m benchmarks.chunking --arguments 20 --lead 20 --tail 4 --window 192 --stride 128
+
+Builds a response brief whose sections open with generic prose and only get
+to their topic after --lead sentences, past the encoder's max sequence
+length, and links it against a moving brief on the same topics. For every
+ARGUMENT_CHUNKING mode it reports the share of moving arguments linked to the
+response section on their own topic, the texts encoded (windows plus the
+sentences used for phrase matching), and cold and warm linking time.
+"""
+import argparse
+import json
+import os
+import random
+
+from .run import install_model, timed
+from .synthetic import TOPICS, generate_brief, sentence
+
+def buried_topic_brief(n_arguments: int, lead: int, tail: int, seed: int = 2) -> dict:
+    rng = random.Random(seed)
+    arguments = []
+    for i in range(n_arguments):
+        opening = [sentence(rng, "the governing standard", 25) for _ in range(lead)]
+        closing = [sentence(rng, TOPICS[i % len(TOPICS)], 25) for _ in range(tail)]
+        arguments.append({
+            "heading": f"Response to Argument {i + 1}",
+            "content": " ".join(opening + closing),
+            "section_id": f"response-{i}"
+        })
+    return {"brief_id": "response", "arguments": arguments}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark sliding-window chunked argument embeddings")
+    parser.add_argument("--arguments", type=int, default=20, help="Arguments per brief (at most one per topic)")
+    parser.add_argument("--lead", type=int, default=20, help="Generic sentences before each response section's topic")
+    parser.add_argument("--tail", type=int, default=4, help="Sentences on the topic at the end of each response section")
+    parser.add_argument("--window", type=int, default=192)
+    parser.add_argument("--stride", type=int, default=128)
+    parser.add_argument("--max-chunks", type=int, default=8)
+    parser.add_argument("--modes", nargs="+", default=["off", "mean", "max", "maxsim"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--model", default="stub", help="'stub' or a locally cached SentenceTransformer name")
+    args = parser.parse_args()
+
+    # Read by backend.linker at import
+    os.environ.update(CHUNK_WINDOW=str(args.window), CHUNK_STRIDE=str(args.stride), MAX_CHUNKS=str(args.max_chunks))
+    install_model(args.model)
+    from backend import linker
+    from backend.models import registry
+
+    n_arguments = min(args.arguments, len(TOPICS))
+    moving = generate_brief(n_arguments, seed=1, brief_id="moving")
+    response = buried_topic_brief(n_arguments, args.lead, args.tail)
+    model = registry.get(args.model)
+    cold = linker.embedding_cache.clear
+
+    report = {"config": vars(args), "modes": {}}
+    for mode in args.modes:
+        cold()
+        before = model.texts_encoded
+        links = linker.link_arguments(moving, response, chunking=mode)
+        encoded = model.texts_encoded - before
+        correct = sum(link["response_section_id"] == f"response-{link['moving_section_id'].split('-')[1]}"
+                      for link in links)
+        run = lambda: linker.link_arguments(moving, response, chunking=mode)
+        report["modes"][mode] = {
+            "accuracy": correct / n_arguments,
+            "links": len(links),
+            "texts_encoded": encoded,
+            "cold": timed(run, args.repeat, setup=cold),
+            "warm": timed(run, args.repeat)
+        }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Database read paths against a local Supabase stand-in.
+
+    python -m benchmarks.db_reads --documents 2000 --latency 0.02 --views 20 --pages 5
+
+Fills benchmarks.local_supabase with saved documents and a demo brief pair,
+then replays a browsing session: loading the demo briefs and paging through
+saved documents --views times (one per Streamlit rerun). It compares the
+previous queries (select("*"), one query per rerun, json.loads every brief)
+with Database's cached, column-selected, keyset-paginated reads, reporting
+requests made, bytes returned and seconds taken. It also checks that both
+page through the same documents and that a new upload shows up at once.
+"""
+from typing import Dict, List
+import argparse
+import datetime
+import json
+import time
+
+from .local_supabase import LocalSupabase
+from .synthetic import generate_pair
+
+def fill(client: LocalSupabase, documents: int, arguments: int) -> None:
+    start = datetime.datetime(2024, 1, 1)
+    for i in range(documents):
+        client.table("documents").insert({
+            "filename": f"brief_{i}.pdf",
+            "doc_type": "moving brief" if i % 2 == 0 else "response brief",
+            "storage_path": f"legal_briefs/brief_{i}.pdf",
+            "file_url": f"https://storage.example/legal_briefs/brief_{i}.pdf",
+            # Every tenth pair of uploads shares a timestamp, to exercise the id tie-break
+            "upload_date": (start + datetime.timedelta(minutes=i - 1 if i % 10 == 1 else i)).isoformat(),
+            "metadata": {"processed_at": start.isoformat(), "content_summary": "x" * 400, "headings_count": 12}
+        }).execute()
+    pair = generate_pair(arguments)
+    for kind in ("moving", "response"):
+        client.table("briefs").insert({
+            "document_type": kind,
+            "parsed_content": json.dumps(pair[f"{kind}_brief"]),
+            "is_demo": True
+        }).execute()
+
+def previous_session(client: LocalSupabase, views: int, pages: int, page_size: int) -> List[str]:
+    seen = []
+    for view in range(views):
+        for row in client.table("briefs").select("*").eq("is_demo", True).execute().data:
+            json.loads(row["parsed_content"])
+        page = view % pages
+        documents = client.table("documents").select("*").order("upload_date", desc=True).order("id", desc=True) \
+            .range(page * page_size, (page + 1) * page_size - 1).execute().data
+        if view < pages:
+            seen.extend(doc["filename"] for doc in documents)
+    return seen
+
+def cached_session(db, views: int, pages: int, page_size: int) -> List[str]:
+    seen, cursors = [], [None]
+    for view in range(views):
+        db.get_demo_briefs()
+        page = view % pages
+        if page == 0:
+            cursors = [None]
+        result = db.list_documents(after=cursors[-1], page_size=page_size)
+        cursors.append(result["next_cursor"])
+        if view < pages:
+            seen.extend(doc["filename"] for doc in result["documents"])
+    return seen
+
+def measure(client: LocalSupabase, session) -> Dict:
+    requests, returned = client.requests, client.bytes_returned
+    start = time.perf_counter()
+    seen = session()
+    return {
+        "seconds": time.perf_counter() - start,
+        "requests": client.requests - requests,
+        "bytes_returned": client.bytes_returned - returned,
+        "documents_seen": seen
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark cached and paginated database reads")
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--arguments", type=int, default=20, help="Arguments per demo brief")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds per stand-in request")
+    parser.add_argument("--views", type=int, default=20, help="Reruns of the saved-documents view")
+    parser.add_argument("--pages", type=int, default=5, help="Pages browsed before going back to the first")
+    parser.add_argument("--page-size", type=int, default=10)
+    args = parser.parse_args()
+
+    from database.db import Database
+
+    client = LocalSupabase()
+    fill(client, args.documents, args.arguments)
+    client.latency = args.latency
+    db = Database(client=client)
+
+    previous = measure(client, lambda: previous_session(client, args.views, args.pages, args.page_size))
+    cached = measure(client, lambda: cached_session(db, args.views, args.pages, args.page_size))
+    same_documents = previous.pop("documents_seen") == cached.pop("documents_seen")
+
+    db.insert_document({"filename": "new_upload.pdf", "doc_type": "moving brief", "storage_path": "new",
+                        "file_url": "new", "upload_date": "2099-01-01T00:00:00", "metadata": {}})
+    newest = db.list_documents(page_size=args.page_size)["documents"][0]["filename"]
+
+    report = {
+        "config": vars(args),
+        "previous": previous,
+        "cached": cached,
+        "same_documents_listed": same_documents,
+        "upload_visible_after_insert": newest == "new_upload.pdf",
+        "read_cache": {"hits": db.read_cache.hits, "misses": db.read_cache.misses}
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
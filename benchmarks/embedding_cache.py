@@ -0,0 +1,138 @@
+"""
+Cross-process behaviour and speed of the on-disk embedding cache tier.
+
+    python -m benchmarks.embedding_cache --capacity 64 --keys 130
+
+Opens a DiskEmbeddingStore in this process and has spawned processes write to
+the same directory in turns, enough that the slot log is compacted in both.
+After every turn each process must see exactly the last `capacity` keys
+written, with the vector written for each, which checks slot log replay, FIFO
+slot reuse and recovery from another process's compaction. The run fails on
+any difference. Also times put_many and get_many on a table of the default
+EMBEDDING_CACHE_DISK_SIZE.
+"""
+from typing import Dict, List
+import argparse
+import hashlib
+import json
+import multiprocessing
+import tempfile
+import time
+
+import numpy as np
+
+def vector_for(key: str, dim: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+
+def keys_between(start: int, stop: int) -> List[str]:
+    return [f"key-{i}" for i in range(start, stop)]
+
+def write_keys(directory: str, dim: int, capacity: int, start: int, stop: int, batch: int) -> None:
+    """
+    Runs in a spawned process: store keys start..stop in batches
+    """
+    from backend.linker import DiskEmbeddingStore
+    store = DiskEmbeddingStore(directory, dim, capacity)
+    keys = keys_between(start, stop)
+    for offset in range(0, len(keys), batch):
+        chunk = keys[offset:offset + batch]
+        store.put_many(chunk, np.stack([vector_for(key, dim) for key in chunk]))
+
+def problems_in(store, written: int, dim: int, capacity: int) -> List[str]:
+    """
+    Where store's view differs from holding exactly the last capacity of the
+    written keys, each with its own vector
+    """
+    keys = keys_between(0, written)
+    live = set(keys[-capacity:])
+    problems = []
+    for key, vector in zip(keys, store.get_many(keys)):
+        if key in live and vector is None:
+            problems.append(f"{key} is missing")
+        elif key not in live and vector is not None:
+            problems.append(f"{key} should have been evicted")
+        elif vector is not None and not np.array_equal(vector, vector_for(key, dim)):
+            problems.append(f"{key} has another key's vector")
+    if len(store) != min(written, capacity):
+        problems.append(f"holds {len(store)} keys, expected {min(written, capacity)}")
+    return problems
+
+def read_problems(directory: str, dim: int, capacity: int, written: int) -> List[str]:
+    """
+    Runs in a spawned process: check a store opened from scratch
+    """
+    from backend.linker import DiskEmbeddingStore
+    return problems_in(DiskEmbeddingStore(directory, dim, capacity), written, dim, capacity)
+
+def check_processes(dim: int, capacity: int, keys: int, batch: int) -> Dict:
+    from backend.linker import DiskEmbeddingStore
+
+    results, failures = {}, {}
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory, context.Pool(1) as pool:
+        local = DiskEmbeddingStore(directory, dim, capacity)
+        written = 0
+        # Turns alternate between a spawned writer and this process, which keeps
+        # its store open throughout and so has to follow the other's compactions
+        for turn in range(6):
+            if turn % 2 == 0:
+                pool.apply(write_keys, (directory, dim, capacity, written, written + keys, batch))
+                writer = "spawned process"
+            else:
+                for offset in range(written, written + keys, batch):
+                    chunk = keys_between(offset, min(offset + batch, written + keys))
+                    local.put_many(chunk, np.stack([vector_for(key, dim) for key in chunk]))
+                writer = "this process"
+            written += keys
+            for reader, problems in (("open store", problems_in(local, written, dim, capacity)),
+                                     ("new process", pool.apply(read_problems, (directory, dim, capacity, written)))):
+                name = f"turn {turn + 1} ({writer} wrote, {reader} read)"
+                results[name] = "ok" if not problems else f"{len(problems)} problems"
+                if problems:
+                    failures[name] = problems
+    return {"results": results, "failures": failures}
+
+def time_store(dim: int, capacity: int, batch: int, repeat: int) -> Dict:
+    from backend.linker import DiskEmbeddingStore
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = DiskEmbeddingStore(directory, dim, capacity)
+        vectors = np.random.default_rng(0).standard_normal((batch, dim)).astype(np.float32)
+        samples = {"put_many_s": [], "get_many_s": []}
+        for run in range(repeat):
+            keys = keys_between(run * batch, (run + 1) * batch)
+            start = time.perf_counter()
+            store.put_many(keys, vectors)
+            samples["put_many_s"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            store.get_many(keys)
+            samples["get_many_s"].append(time.perf_counter() - start)
+        return {name: float(np.median(values)) for name, values in samples.items()}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check and time the shared on-disk embedding cache")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--capacity", type=int, default=64, help="Slots in the checked table")
+    parser.add_argument("--keys", type=int, default=130, help="Keys written per turn")
+    parser.add_argument("--batch", type=int, default=7, help="Keys per put_many call")
+    parser.add_argument("--timing-capacity", type=int, default=200000, help="Slots in the timed table")
+    parser.add_argument("--timing-batch", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    check = check_processes(args.dim, args.capacity, args.keys, args.batch)
+    report = {
+        "config": vars(args),
+        "checks": check["results"],
+        "timing": time_store(args.dim, args.timing_capacity, args.timing_batch, args.repeat)
+    }
+    print(json.dumps(report, indent=2))
+
+    if check["failures"]:
+        raise SystemExit("Processes sharing the embedding cache disagree:\n" + "\n".join(
+            f"  {name}: {problem}" for name, problems in check["failures"].items() for problem in problems
+        ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Encoder backend throughput and parity with the PyTorch model.
+
+    python -m benchmarks.encoders --model all-MiniLM-L6-v2 --threads 1 4
+
+Encodes the argument texts and sentences of a synthetic brief pair with every
+backend (PyTorch, ONNX Runtime, ONNX Runtime with int8 weights) at each thread
+count and reports texts per second, plus the cosine and nearest-neighbour
+agreement of each ONNX backend with PyTorch on the same texts. The ONNX export
+is built on the first run and needs a locally cached model.
+"""
+import argparse
+import json
+
+from .run import timed
+from .synthetic import generate_pair
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="A locally cached SentenceTransformer name")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--arguments", type=int, default=20, help="Top-level arguments per brief")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    from backend import encoders
+    from backend.linker import argument_text
+    from backend.segmentation import segment_sentences
+
+    pair = generate_pair(args.arguments)
+    arguments = pair["moving_brief"]["arguments"] + pair["response_brief"]["arguments"]
+    texts = {
+        "arguments": [argument_text(arg) for arg in arguments],
+        "sentences": [sentence for arg in arguments for sentence in segment_sentences(argument_text(arg))]
+    }
+
+    report = {"config": vars(args), "texts": {kind: len(values) for kind, values in texts.items()}, "backends": {}}
+    reference = encoders.load_encoder(args.model, "torch")
+    for backend in args.backends:
+        results = {}
+        for threads in args.threads:
+            encoders.ENCODER_THREADS = threads
+            encoder = encoders.load_encoder(args.model, backend)
+            results[threads] = {}
+            for kind, values in texts.items():
+                run = timed(lambda: encoder.encode(values, batch_size=args.batch_size, convert_to_numpy=True), args.repeat)
+                run["texts_per_s"] = len(values) / run["median_s"]
+                results[threads][kind] = run
+        report["backends"][backend] = {"threads": results}
+        if backend != "torch":
+            report["backends"][backend]["parity"] = {
+                "builtin": encoders.check_parity(reference, encoder),
+                "arguments": encoders.check_parity(reference, encoder, texts["arguments"])
+            }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
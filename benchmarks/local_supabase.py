@@ -0,0 +1,152 @@
+"""
+In-memory stand-in for the parts of the supabase-py table() interface that
+database.db uses, with a fixed latency per request and counters for the
+requests made and the JSON bytes they returned.
+"""
+from typing import Any, Callable, Dict, List, Optional
+import json
+import threading
+import time
+
+_FILTER_OPS: Dict[str, Callable[[Any, Any], bool]] = {
+    "eq": lambda a, b: a == b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+}
+
+def _split_terms(text: str) -> List[str]:
+    """
+    Split a PostgREST logic filter on top-level commas
+    """
+    terms, depth, quoted, current = [], 0, False, ""
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char in "()":
+            depth += 1 if char == "(" else -1
+        elif not quoted and char == "," and depth == 0:
+            terms.append(current)
+            current = ""
+            continue
+        current += char
+    return terms + [current]
+
+def _coerce(value: str, like: Any) -> Any:
+    value = value.strip('"')
+    if isinstance(like, bool):
+        return value == "true"
+    if isinstance(like, int):
+        return int(value)
+    return value
+
+def _matches(row: Dict, term: str) -> bool:
+    for logic in ("and", "or"):
+        if term.startswith(logic + "("):
+            results = [_matches(row, inner) for inner in _split_terms(term[len(logic) + 1:-1])]
+            return all(results) if logic == "and" else any(results)
+    column, op, value = term.split(".", 2)
+    return _FILTER_OPS[op](row[column], _coerce(value, row[column]))
+
+class Result:
+    def __init__(self, data: List[Dict]):
+        self.data = data
+
+class Query:
+    def __init__(self, table: "Table"):
+        self.table = table
+        self.columns: Optional[List[str]] = None
+        self.filters: List[Callable[[Dict], bool]] = []
+        self.ordering: List[tuple] = []
+        self.start, self.stop = 0, None
+        self.rows_to_insert: Optional[List[Dict]] = None
+
+    def select(self, columns: str = "*") -> "Query":
+        self.columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        return self
+
+    def _filter(self, column: str, op: str, value: Any) -> "Query":
+        self.filters.append(lambda row: _FILTER_OPS[op](row[column], value))
+        return self
+
+    def eq(self, column: str, value: Any) -> "Query":
+        return self._filter(column, "eq", value)
+
+    def lt(self, column: str, value: Any) -> "Query":
+        return self._filter(column, "lt", value)
+
+    def gt(self, column: str, value: Any) -> "Query":
+        return self._filter(column, "gt", value)
+
+    def or_(self, filters: str) -> "Query":
+        self.filters.append(lambda row: any(_matches(row, term) for term in _split_terms(filters)))
+        return self
+
+    def order(self, column: str, desc: bool = False) -> "Query":
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, count: int) -> "Query":
+        self.stop = self.start + count
+        return self
+
+    def range(self, start: int, end: int) -> "Query":
+        self.start, self.stop = start, end + 1
+        return self
+
+    def insert(self, rows) -> "Query":
+        self.rows_to_insert = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def execute(self) -> Result:
+        return self.table.database.execute(self)
+
+class Table:
+    def __init__(self, database: "LocalSupabase", name: str):
+        self.database = database
+        self.name = name
+
+    def select(self, columns: str = "*") -> Query:
+        return Query(self).select(columns)
+
+    def insert(self, rows) -> Query:
+        return Query(self).insert(rows)
+
+class LocalSupabase:
+    """
+    Tables are lists of row dicts; inserted rows get an increasing integer
+    value for the table's key column
+    """
+    def __init__(self, latency: float = 0.0, keys: Optional[Dict[str, str]] = None):
+        self.latency = latency
+        self.keys = {"documents": "id", "briefs": "brief_id", "links": "link_id", **(keys or {})}
+        self.tables: Dict[str, List[Dict]] = {}
+        self.requests = 0
+        self.bytes_returned = 0
+        self._lock = threading.Lock()
+
+    def table(self, name: str) -> Table:
+        return Table(self, name)
+
+    def execute(self, query: Query) -> Result:
+        time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            rows = self.tables.setdefault(query.table.name, [])
+            if query.rows_to_insert is not None:
+                key = self.keys.get(query.table.name, "id")
+                inserted = [dict(row, **{key: len(rows) + i + 1}) for i, row in enumerate(query.rows_to_insert)]
+                rows.extend(inserted)
+                return Result(inserted)
+
+            data = [row for row in rows if all(f(row) for f in query.filters)]
+            for column, desc in reversed(query.ordering):
+                data.sort(key=lambda row: row[column], reverse=desc)
+            data = data[query.start:query.stop]
+            if query.columns is not None:
+                data = [{column: row[column] for column in query.columns} for row in data]
+            # A round trip through JSON, like the real client, so callers can't share rows
+            payload = json.dumps(data)
+            self.bytes_returned += len(payload)
+            return Result(json.loads(payload))
@@ -0,0 +1,69 @@
+"""
+Recall versus speed of the lexical prefilter.
+
+    python -m benchmarks.prefilter --arguments 100 --subsections 3 --candidates 5 10 25
+
+Links a synthetic pair with every candidate count and reports the time taken,
+the pairs pruned before dense scoring, and recall: the share of links found
+by exhaustive scoring that the two-stage run reproduces exactly.
+"""
+import argparse
+import json
+
+from .run import install_model, timed
+from .synthetic import generate_pair
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the BM25 prefilter against exhaustive scoring")
+    parser.add_argument("--arguments", type=int, default=100, help="Top-level arguments per brief")
+    parser.add_argument("--subsections", type=int, default=3)
+    parser.add_argument("--sentences", type=int, default=8)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[3, 5, 10, 25, 50])
+    parser.add_argument("--assignment", choices=["greedy", "optimal"], default="greedy")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--model", default="stub", help="'stub' or a locally cached SentenceTransformer name")
+    args = parser.parse_args()
+
+    install_model(args.model)
+    from backend import linker
+    from backend.metrics import pairs_pruned
+
+    pair = generate_pair(args.arguments, subsections=args.subsections, sentences_per_argument=args.sentences)
+    moving, response = pair["moving_brief"], pair["response_brief"]
+    n_pairs = len(moving["arguments"]) * len(response["arguments"])
+
+    def run(candidates: int):
+        return linker.link_arguments(moving, response, assignment=args.assignment, candidates=candidates)
+
+    # Cold runs include embedding the arguments that survive the prefilter; warm
+    # runs hit the embedding cache, leaving prefiltering, scoring and phrase matching
+    cold = linker.embedding_cache.clear
+    exhaustive = run(0)
+    expected = {(l["moving_brief_heading"], l["response_brief_heading"]) for l in exhaustive}
+    report = {
+        "config": vars(args),
+        "argument_pairs": n_pairs,
+        "exhaustive": {
+            "cold": timed(lambda: run(0), args.repeat, setup=cold),
+            "warm": timed(lambda: run(0), args.repeat),
+            "links": len(exhaustive)
+        },
+        "prefilter": {}
+    }
+    for candidates in args.candidates:
+        before = pairs_pruned._values.get((), 0.0)
+        links = run(candidates)
+        pruned = pairs_pruned._values.get((), 0.0) - before
+        found = {(l["moving_brief_heading"], l["response_brief_heading"]) for l in links}
+        report["prefilter"][candidates] = dict(
+            cold=timed(lambda: run(candidates), args.repeat, setup=cold),
+            warm=timed(lambda: run(candidates), args.repeat),
+            links=len(links),
+            pairs_pruned=int(pruned),
+            pruned_fraction=pruned / n_pairs,
+            recall=len(found & expected) / max(len(expected), 1)
+        )
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Accuracy and throughput of compact embedding formats.
+
+    python -m benchmarks.quantization --briefs 50 --top-k 10
+
+Embeds the arguments of a synthetic corpus, stores them as float32, float16
+and int8, and scores a sample of those arguments against the whole corpus in
+each format. Reports bytes per vector, scoring throughput, worst-case score error
+and top-k recall against the exact float32 ranking.
+"""
+from typing import Dict
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+import numpy as np
+from .synthetic import generate_brief
+from .stub_model import HashingEncoder
+
+def embed_corpus(args) -> np.ndarray:
+    from backend.linker import argument_text, normalize_rows
+
+    texts = []
+    for seed in range(args.briefs):
+        brief = generate_brief(args.arguments, subsections=args.subsections, seed=seed)
+        texts.extend(argument_text(arg) for arg in brief["arguments"])
+    if args.model == "stub":
+        model = HashingEncoder()
+    else:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(args.model)
+    return normalize_rows(np.asarray(model.encode(texts, convert_to_numpy=True), dtype=np.float32))
+
+def compare_formats(vectors: np.ndarray, queries: np.ndarray, top_k: int, repeat: int) -> Dict:
+    from backend.quantization import VectorStore, VECTOR_FORMATS
+
+    exact = queries @ vectors.T
+    exact_top = np.argsort(-exact, axis=1)[:, :top_k]
+    results = {}
+    for fmt in VECTOR_FORMATS:
+        store = VectorStore(vectors.shape[1], fmt)
+        store.append(vectors)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            scores = np.stack([store.dot(query) for query in queries])
+        elapsed = (time.perf_counter() - start) / repeat
+
+        top = np.argsort(-scores, axis=1)[:, :top_k]
+        recall = np.mean([len(set(a) & set(b)) / top_k for a, b in zip(top, exact_top)])
+        results[fmt] = {
+            "bytes_per_vector": store.nbytes / len(store),
+            "compression_vs_float32": (4 * vectors.shape[1]) / (store.nbytes / len(store)),
+            "vectors_scored_per_s": len(queries) * len(store) / elapsed,
+            "max_abs_score_error": float(np.abs(scores - exact).max()),
+            f"recall_at_{top_k}": float(recall),
+            "top1_agreement": float(np.mean(top[:, 0] == exact_top[:, 0]))
+        }
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare float32, float16 and int8 embedding storage")
+    parser.add_argument("--briefs", type=int, default=20, help="Synthetic briefs in the corpus")
+    parser.add_argument("--arguments", type=int, default=20, help="Arguments per brief")
+    parser.add_argument("--subsections", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--model", default="stub", help="'stub' or a locally cached SentenceTransformer name")
+    parser.add_argument("--output", default=None, help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    vectors = embed_corpus(args)
+    rng = np.random.default_rng(0)
+    queries = vectors[rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)]
+    report = {
+        "config": vars(args),
+        "corpus_vectors": len(vectors),
+        "dim": vectors.shape[1],
+        "formats": compare_formats(vectors, queries, args.top_k, args.repeat)
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
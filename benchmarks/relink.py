@@ -0,0 +1,133 @@
+"""
+Incremental re-linking after editing a few sections of the response brief.
+
+    python -m benchmarks.relink --arguments 20 --subsections 2 --edits 1 3 6
+
+Links a synthetic pair (60 sections per brief by default), then replaces the
+text of some response sections and times a full re-link against
+relink_arguments with the first result. "cold" clears the embedding cache
+first, as for a request landing on a fresh worker; "warm" keeps it.
+
+Every incremental result is also checked against a full re-link, for each
+edit count and for edits to both briefs under several link options, including
+a previous result linked with different options. The run fails on any difference.
+"""
+from typing import Dict, List
+import argparse
+import copy
+import json
+
+from .run import install_model, timed
+from .synthetic import generate_brief, generate_pair
+
+# Link options the incremental path is checked under
+CHECKED_OPTIONS = [
+    {},
+    {"candidates": 5},
+    {"chunking": "maxsim"},
+    {"assignment": "optimal"}
+]
+
+def edit_arguments(brief: Dict, replacement: List[Dict], edits: int) -> Dict:
+    """
+    A copy of brief with the content of edits evenly spread arguments replaced
+    """
+    edited = copy.deepcopy(brief)
+    step = max(1, len(edited["arguments"]) // edits)
+    for k in range(0, step * edits, step):
+        edited["arguments"][k]["content"] = replacement[k]["content"]
+    return edited
+
+def link_differences(links: List[Dict], expected: List[Dict]) -> List[str]:
+    """
+    How links differ from expected, matched on the moving argument
+    """
+    actual = {link["moving_section_id"]: link for link in links}
+    wanted = {link["moving_section_id"]: link for link in expected}
+    differences = []
+    for key in sorted(set(actual) | set(wanted)):
+        got, want = actual.get(key), wanted.get(key)
+        if got is None or want is None:
+            differences.append(f"{key}: {'missing' if got is None else 'unexpected'} link")
+        elif got["response_section_id"] != want["response_section_id"] \
+                or abs(got["similarity_score"] - want["similarity_score"]) > 1e-5 \
+                or [list(pair) for pair in got["matching_phrases"]] != [list(pair) for pair in want["matching_phrases"]]:
+            differences.append(f"{key}: linked to {got['response_section_id']} ({got['similarity_score']:.4f}), "
+                               f"expected {want['response_section_id']} ({want['similarity_score']:.4f})")
+    return differences
+
+def check_relink(linker, moving: Dict, response: Dict, edited_moving: Dict, edited_response: Dict,
+                 previous_options: Dict, options: Dict) -> List[str]:
+    """
+    Link the original pair with previous_options, re-link the edited pair from
+    that result with options, and compare with linking the edited pair from scratch
+    """
+    previous = linker.relink_arguments(moving, response, {}, **previous_options)
+    result = linker.relink_arguments(edited_moving, edited_response, previous, **options)
+    # iter_links raises instead of returning no links, so a failure can't pass as a match
+    expected = list(linker.iter_links(edited_moving, edited_response, **options))
+    if not expected:
+        return ["the full re-link found no links to compare against"]
+    return link_differences(result["links"], expected)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark incremental re-linking against a full re-link")
+    parser.add_argument("--arguments", type=int, default=20, help="Top-level arguments per brief")
+    parser.add_argument("--subsections", type=int, default=2)
+    parser.add_argument("--sentences", type=int, default=8)
+    parser.add_argument("--edits", type=int, nargs="+", default=[1, 3, 6], help="Response sections to rewrite")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--model", default="stub", help="'stub' or a locally cached SentenceTransformer name")
+    args = parser.parse_args()
+
+    install_model(args.model)
+    from backend import linker
+
+    options = {"subsections": args.subsections, "sentences_per_argument": args.sentences}
+    pair = generate_pair(args.arguments, **options)
+    moving, response = pair["moving_brief"], pair["response_brief"]
+    previous = linker.relink_arguments(moving, response, {})
+    replacement = generate_brief(args.arguments, seed=99, brief_id="edited", **options)["arguments"]
+    cold = linker.embedding_cache.clear
+
+    report = {"config": vars(args), "sections_per_brief": len(response["arguments"]), "edits": {}, "checks": {}}
+    failures = {}
+    for edits in args.edits:
+        edited = edit_arguments(response, replacement, edits)
+
+        full = lambda: linker.link_arguments(moving, edited)
+        incremental = lambda: linker.relink_arguments(moving, edited, previous)
+        result = incremental()
+        differences = link_differences(result["links"], list(linker.iter_links(moving, edited)))
+        if differences:
+            failures[f"{edits} response edits"] = differences
+        report["edits"][edits] = {
+            "full_cold": timed(full, args.repeat, setup=cold),
+            "incremental_cold": timed(incremental, args.repeat, setup=cold),
+            "full_warm": timed(full, args.repeat),
+            "incremental_warm": timed(incremental, args.repeat),
+            "diff": {key: len(value) if isinstance(value, list) else value for key, value in result["diff"].items()},
+            "matches_full_relink": not differences
+        }
+
+    # Edits to both briefs, relinked with the options of the previous result and with others
+    edited_moving = edit_arguments(moving, generate_brief(args.arguments, seed=98, **options)["arguments"], 2)
+    edited_response = edit_arguments(response, replacement, 2)
+    cases = {json.dumps(link_options): (link_options, link_options) for link_options in CHECKED_OPTIONS}
+    cases["optimal result relinked greedy"] = ({"assignment": "optimal"}, {})
+    cases["maxsim result relinked unchunked"] = ({"chunking": "maxsim"}, {"chunking": "off"})
+    for name, (previous_options, link_options) in cases.items():
+        differences = check_relink(linker, moving, response, edited_moving, edited_response,
+                                   previous_options, link_options)
+        if differences:
+            failures[name] = differences
+        report["checks"][name] = "ok" if not differences else f"{len(differences)} links differ"
+    print(json.dumps(report, indent=2))
+
+    if failures:
+        raise SystemExit("Incremental re-linking differs from a full re-link:\n" + "\n".join(
+            f"  {name}: {difference}" for name, differences in failures.items() for difference in differences
+        ))
+
+if __name__ == "__main__":
+    main()
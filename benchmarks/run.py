@@ -0,0 +1,226 @@
+"""
+Throughput and latency benchmarks for the parser, linker and API.
+
+    python -m benchmarks.run --arguments 40 --output bench.json
+
+By default embeddings come from an offline hashing stub, so the suite runs
+without network access. Pass --model all-MiniLM-L6-v2 to use a model that is
+already in the local Hugging Face cache instead (downloads are disabled).
+"""
+from typing import Callable, Dict, List
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import time
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+# Keep results independent of whatever on-disk caches the developer has
+os.environ["EMBEDDING_CACHE_DIR"] = ""
+os.environ["PARSE_CACHE_DIR"] = ""
+# Uploads index their arguments; keep the synthetic ones out of the on-disk search index
+os.environ["ARGUMENT_INDEX_DIR"] = ""
+# Parse uploads as local markdown, so parsing is measured without contacting a parser service
+os.environ["PARSE_BACKEND"] = "mock"
+
+import numpy as np
+from .synthetic import generate_pair, to_markdown
+from .stub_model import HashingEncoder
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if platform.system() == "Darwin" else rss / 1024
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+def percentiles(samples: List[float]) -> Dict:
+    values = np.asarray(samples) * 1000
+    return {
+        "count": len(samples),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean())
+    }
+
+def timed(fn: Callable, repeat: int, setup: Callable = None) -> Dict:
+    """
+    Median wall time of fn over repeat runs, calling setup before each run
+    """
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {"median_s": statistics.median(samples), "min_s": min(samples), "runs": repeat}
+
+def install_model(model_name: str) -> str:
+    # Must be set before backend is imported, which reads it as the default model
+    os.environ["EMBEDDING_MODEL"] = model_name
+    from backend.models import registry
+    if model_name == "stub":
+        registry.register("stub", HashingEncoder())
+    registry.warm_up([model_name])
+    return model_name
+
+def bench_linker(pair: Dict, model_name: str, repeat: int) -> Dict:
+    from backend import linker as linker_module
+    from backend.models import registry
+
+    model = registry.get(model_name)
+    cache = linker_module.embedding_cache
+    linker = linker_module.ArgumentLinker(model=model)
+    moving_texts = [linker_module.argument_text(arg) for arg in pair["moving_brief"]["arguments"]]
+    response_texts = [linker_module.argument_text(arg) for arg in pair["response_brief"]["arguments"]]
+    texts = moving_texts + response_texts
+
+    results = {}
+    before = model.texts_encoded
+    results["encode_arguments"] = timed(lambda: linker.encode_batch(texts), repeat, setup=cache.clear)
+    results["encode_arguments"]["texts_per_run"] = len(texts)
+    results["encode_arguments"]["encodes_per_s"] = len(texts) / results["encode_arguments"]["median_s"]
+
+    embeddings = linker.encode_batch(texts)
+    moving, response = embeddings[:len(moving_texts)], embeddings[len(moving_texts):]
+    results["similarity_matrix"] = timed(lambda: moving @ response.T, repeat)
+
+    best = (moving @ response.T).argmax(axis=1)
+    pairs = [(moving_texts[i], response_texts[j]) for i, j in enumerate(best)]
+    results["find_matching_phrases"] = timed(
+        lambda: [linker.find_matching_phrases(a, b) for a, b in pairs], repeat, setup=cache.clear
+    )
+    results["find_matching_phrases"]["pairs_per_run"] = len(pairs)
+
+    link = lambda: linker_module.link_arguments(pair["moving_brief"], pair["response_brief"])
+    results["link_arguments_cold"] = timed(link, repeat, setup=cache.clear)
+    results["link_arguments_warm"] = timed(link, repeat)
+    results["texts_encoded"] = model.texts_encoded - before
+    return results
+
+def bench_parser(pair: Dict, repeat: int) -> Dict:
+    from starlette.datastructures import UploadFile
+    from backend import parser
+
+    parser.parse_cache = parser.ParseCache(directory=None)
+    body = to_markdown(pair["moving_brief"]).encode("utf-8")
+    counter = iter(range(10 ** 9))
+
+    def parse(unique: bool) -> None:
+        content = body + (f"\n{next(counter)}".encode() if unique else b"")
+        asyncio.run(parser.parse_document(UploadFile(io.BytesIO(content), filename="brief.pdf")))
+
+    return {
+        "document_bytes": len(body),
+        "parse_document_cold": timed(lambda: parse(True), repeat),
+        "parse_document_cached": timed(lambda: parse(False), repeat)
+    }
+
+def bench_parse_pipeline(pair: Dict, repeat: int, latency: float, pages_per_brief: int = 8) -> Dict:
+    """
+    Sequential versus concurrent parsing of both briefs through the mock parser,
+    which sleeps per page like a remote service and treats form feeds as page breaks
+    """
+    import tempfile
+    from backend import parser
+
+    backend = parser.MockParseBackend(latency=latency)
+    paths = []
+    for side in ("moving_brief", "response_brief"):
+        sections = to_markdown(pair[side]).split("\n## ")
+        per_page = max(1, -(-len(sections) // pages_per_brief))
+        pages = ["\n## ".join(sections[i:i + per_page]) for i in range(0, len(sections), per_page)]
+        with tempfile.NamedTemporaryFile("w", suffix=".md", delete=False) as f:
+            f.write("\f\n## ".join(pages))
+        paths.append(f.name)
+
+    async def sequential() -> None:
+        for path in paths:
+            for pages in parser.page_ranges(backend.page_count(path), pages_per_chunk=0):
+                await backend.parse_pages(path, pages)
+
+    async def concurrent() -> None:
+        await asyncio.gather(*(parser.parse_markdown(path, backend) for path in paths))
+
+    try:
+        return {
+            "mock_latency_per_page_s": latency,
+            "pages_per_chunk": parser.PARSE_PAGES_PER_CHUNK,
+            "parse_concurrency": parser.PARSE_CONCURRENCY,
+            "sequential_whole_documents": timed(lambda: asyncio.run(sequential()), repeat),
+            "concurrent_page_ranges": timed(lambda: asyncio.run(concurrent()), repeat)
+        }
+    finally:
+        for path in paths:
+            os.remove(path)
+
+async def bench_endpoints(pair: Dict, requests: int) -> Dict:
+    import httpx
+    from backend.api import app
+
+    body = to_markdown(pair["moving_brief"]).encode("utf-8")
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name, call in [
+            ("/link", lambda: client.post("/link", json=pair)),
+            ("/link (stream=ndjson)", lambda: client.post("/link", json=dict(pair, stream="ndjson"))),
+            ("/upload", lambda: client.post("/upload", files={"file": ("brief.pdf", body, "application/pdf")})),
+        ]:
+            samples = []
+            for _ in range(requests):
+                start = time.perf_counter()
+                response = await call()
+                response.raise_for_status()
+                samples.append(time.perf_counter() - start)
+            results[name] = percentiles(samples)
+    return results
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Benchmark the parser, linker and API")
+    arg_parser.add_argument("--arguments", type=int, default=40, help="Top-level arguments per brief")
+    arg_parser.add_argument("--subsections", type=int, default=0, help="Lettered subsections per argument")
+    arg_parser.add_argument("--sentences", type=int, default=8, help="Sentences per section")
+    arg_parser.add_argument("--words", type=int, default=25, help="Words per sentence")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="Runs per stage")
+    arg_parser.add_argument("--requests", type=int, default=50, help="Requests per endpoint")
+    arg_parser.add_argument("--parse-latency", type=float, default=0.05,
+                            help="Seconds per page the mock parser sleeps in the parse pipeline benchmark")
+    arg_parser.add_argument("--model", default="stub", help="'stub' or a locally cached SentenceTransformer name")
+    arg_parser.add_argument("--output", default="bench_output.json")
+    args = arg_parser.parse_args()
+
+    model_name = install_model(args.model)
+    pair = generate_pair(args.arguments, subsections=args.subsections,
+                         sentences_per_argument=args.sentences, words_per_sentence=args.words)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": git_commit(),
+        "config": vars(args),
+        "sections_per_brief": len(pair["moving_brief"]["arguments"]),
+        "linker": bench_linker(pair, model_name, args.repeat),
+        "parser": bench_parser(pair, args.repeat),
+        "parse_pipeline": bench_parse_pipeline(pair, args.repeat, args.parse_latency),
+        "endpoints": asyncio.run(bench_endpoints(pair, args.requests)),
+    }
+    report["peak_rss_mb"] = peak_rss_mb()
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
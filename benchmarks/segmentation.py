@@ -0,0 +1,111 @@
+"""
+Sentence segmentation and sectioning on long, citation-heavy briefs.
+
+    python -m benchmarks.segmentation --arguments 40 --sentences 30
+
+Compares the previous naive rules (split on ". " and on "\\n#") with
+backend.segmentation: fragments produced, fragments that are too short to
+mean anything or that end inside a citation, time to split, and the time
+to embed every fragment, which is where fewer fragments pay off.
+"""
+from typing import Callable, Dict, List
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+from .synthetic import generate_brief, to_markdown
+from .stub_model import HashingEncoder
+
+def naive_sentences(text: str) -> List[str]:
+    return text.split('. ')
+
+def naive_sections(markdown: str) -> int:
+    from backend.parser import ARGUMENT_INDICATORS
+
+    count = 0
+    for section in markdown.split('\n#'):
+        lines = section.strip().split('\n', 1)
+        if len(lines) == 2 and any(i in lines[0].strip('# ').lower() for i in ARGUMENT_INDICATORS):
+            count += 1
+    return count
+
+def fragment_stats(texts: List[str], splitter: Callable[[str], List[str]], model, repeat: int) -> Dict:
+    from backend.segmentation import ABBREVIATIONS, SEGMENT_MIN_WORDS
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fragments = [f for text in texts for f in splitter(text)]
+    split_s = (time.perf_counter() - start) / repeat
+
+    def broken(fragment: str) -> bool:
+        last = fragment.rstrip(".").rsplit(" ", 1)[-1].lower()
+        return last in ABBREVIATIONS or (len(last) == 1 and last.isalpha())
+
+    start = time.perf_counter()
+    model.encode(fragments, convert_to_numpy=True)
+    encode_s = time.perf_counter() - start
+    return {
+        "fragments": len(fragments),
+        "short_fragments": sum(len(f.split()) < SEGMENT_MIN_WORDS for f in fragments),
+        "fragments_ending_in_abbreviation": sum(broken(f) for f in fragments),
+        "split_ms": split_s * 1000,
+        "encode_ms": encode_s * 1000
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare naive and citation-aware segmentation")
+    parser.add_argument("--arguments", type=int, default=40, help="Top-level arguments per brief")
+    parser.add_argument("--subsections", type=int, default=2)
+    parser.add_argument("--sentences", type=int, default=30, help="Sentences per section")
+    parser.add_argument("--words", type=int, default=25)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--model", default="stub", help="'stub' or a locally cached SentenceTransformer name")
+    args = parser.parse_args()
+
+    from backend.segmentation import outline_sections, segment_sentences
+    from backend.parser import structure_markdown
+
+    brief = generate_brief(args.arguments, sentences_per_argument=args.sentences,
+                           words_per_sentence=args.words, subsections=args.subsections)
+    texts = [argument["content"] for argument in brief["arguments"]]
+    markdown = to_markdown(brief)
+    if args.model == "stub":
+        model = HashingEncoder()
+    else:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(args.model)
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        naive_count = naive_sections(markdown)
+    naive_section_s = (time.perf_counter() - start) / args.repeat
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        sections = outline_sections(markdown)
+        structured = structure_markdown(markdown, "0" * 64)
+    outline_s = (time.perf_counter() - start) / args.repeat
+
+    report = {
+        "config": vars(args),
+        "document_chars": len(markdown),
+        "sentences": {
+            "naive": fragment_stats(texts, naive_sentences, model, args.repeat),
+            "segmentation": fragment_stats(texts, segment_sentences, model, args.repeat)
+        },
+        "sections": {
+            "generated": len(brief["arguments"]),
+            "naive_arguments": naive_count,
+            "naive_ms": naive_section_s * 1000,
+            "outline_sections": len(sections),
+            "outline_arguments": len(structured["arguments"]),
+            "outline_ms": outline_s * 1000
+        }
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Backend cold-start time and import-time profile.
+
+    python -m benchmarks.startup --runs 5 --model all-MiniLM-L6-v2
+
+Each run starts a fresh interpreter that imports backend.api, runs the app's
+startup hooks and sends one /upload and one /link at once through an
+in-process ASGI client. It reports the seconds from process spawn to the
+import finishing, to startup completing and to each first response, for every
+MODEL_WARMUP mode. The import profile comes from python -X importtime.
+"""
+from typing import Dict, List
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+def child_env(model: str, warmup: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "HF_HUB_OFFLINE": "1",
+        "TRANSFORMERS_OFFLINE": "1",
+        "EMBEDDING_CACHE_DIR": "",
+        "PARSE_CACHE_DIR": "",
+        # Synthetic briefs stay out of the developer's on-disk search index, and
+        # aren't embedded for it at all: ASGITransport runs background tasks
+        # before the response returns, which would count indexing as upload time
+        "ARGUMENT_INDEX_DIR": "",
+        "INDEX_UPLOADED_BRIEFS": "0",
+        # Parse uploads locally so no parser service is contacted
+        "PARSE_BACKEND": "mock",
+        "EMBEDDING_MODEL": model,
+        "MODEL_WARMUP": warmup
+    })
+    return env
+
+def import_profile(top: int) -> Dict:
+    """
+    Cumulative import time of backend.api, of each backend module, and of the
+    slowest packages it pulls in (nested packages are included in their parents)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend.api"],
+        env=child_env("stub", "off"), capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(cumulative) / 1e6))
+    modules.sort(key=lambda item: -item[1])
+
+    packages, seen = [], set()
+    for name, seconds in modules:
+        root = name.split(".")[0]
+        if root in seen or root in ("backend", "site", "encodings"):
+            continue
+        seen.add(root)
+        packages.append({"package": root, "cumulative_s": seconds})
+    return {
+        "backend_api_s": dict(modules).get("backend.api"),
+        "backend_modules": {name: seconds for name, seconds in modules if name.startswith("backend")},
+        "slowest_packages": packages[:top]
+    }
+
+def run_child(model: str) -> None:
+    """
+    Runs in the spawned interpreter and prints event timestamps as JSON
+    """
+    events = {}
+    from .synthetic import generate_pair, to_markdown
+    if model == "stub":
+        from backend.models import registry
+        from .stub_model import HashingEncoder
+        registry.register("stub", HashingEncoder())
+    import backend.api
+    events["import"] = time.time()
+
+    import httpx
+    app = backend.api.app
+    pair = generate_pair(6)
+    body = to_markdown(pair["moving_brief"]).encode("utf-8")
+
+    async def serve() -> None:
+        async with app.router.lifespan_context(app):
+            events["startup"] = time.time()
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://startup", timeout=None) as client:
+                async def first(name: str, call) -> None:
+                    response = await call()
+                    response.raise_for_status()
+                    events[name] = time.time()
+
+                await asyncio.gather(
+                    first("upload", lambda: client.post("/upload", files={"file": ("brief.pdf", body, "application/pdf")})),
+                    first("link", lambda: client.post("/link", json=pair))
+                )
+
+    asyncio.run(serve())
+    print(json.dumps(events))
+
+def startup_runs(model: str, warmup: str, runs: int) -> Dict:
+    samples: Dict[str, List[float]] = {}
+    for _ in range(runs):
+        spawned = time.time()
+        result = subprocess.run(
+            [sys.executable, "-m", "benchmarks.startup", "--child", "--model", model],
+            env=child_env(model, warmup), capture_output=True, text=True, check=True
+        )
+        events = json.loads(result.stdout.strip().splitlines()[-1])
+        for name, timestamp in events.items():
+            samples.setdefault(name, []).append(timestamp - spawned)
+    labels = {"import": "import_s", "startup": "startup_done_s", "upload": "first_upload_s", "link": "first_link_s"}
+    return {labels[name]: statistics.median(values) for name, values in samples.items()}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure backend cold start")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--model", default="stub", help="'stub' or a locally cached SentenceTransformer name")
+    parser.add_argument("--warmup", nargs="+", default=["background", "startup"], help="MODEL_WARMUP modes to compare")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.model)
+        return
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "child"},
+        "import_profile": import_profile(args.top),
+        "startup": {warmup: startup_runs(args.model, warmup, args.runs) for warmup in args.warmup}
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import hashlib
+import re
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+class HashingEncoder:
+    """
+    Offline stand-in for SentenceTransformer: a bag of hashed word unigrams
+    and bigrams. Deterministic and dependency-free, so benchmarks can run
+    without network access or a downloaded model. It also tokenizes and
+    truncates like MiniLM so cost scales with text length.
+    """
+    def __init__(self, dim: int = 384, max_seq_length: int = 256):
+        self.dim = dim
+        self.max_seq_length = max_seq_length
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def _bucket(self, token: str) -> int:
+        return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little") % self.dim
+
+    def encode(self, texts, convert_to_numpy: bool = True, convert_to_tensor: bool = False, **kwargs):
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = TOKEN_PATTERN.findall(text.lower())[:self.max_seq_length]
+            for token in tokens:
+                embeddings[row, self._bucket(token)] += 1.0
+            for first, second in zip(tokens, tokens[1:]):
+                embeddings[row, self._bucket(f"{first} {second}")] += 0.5
+        return embeddings[0] if single else embeddings
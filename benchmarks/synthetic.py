@@ -0,0 +1,85 @@
+import random
+from typing import Dict, List
+
+ROMAN = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X",
+         "XI", "XII", "XIII", "XIV", "XV", "XVI", "XVII", "XVIII", "XIX", "XX"]
+
+TOPICS = [
+    "personal jurisdiction", "subject matter jurisdiction", "standing", "statute of limitations",
+    "breach of contract", "fiduciary duty", "qualified immunity", "preemption", "class certification",
+    "summary judgment", "failure to state a claim", "equitable tolling", "unjust enrichment",
+    "due process", "arbitration clause", "forum selection", "spoliation", "damages", "causation",
+    "irreparable harm"
+]
+
+VERBS = ["holds", "establishes", "forecloses", "requires", "permits", "confirms", "undermines", "supports"]
+CONNECTIVES = ["Moreover", "However", "Accordingly", "Indeed", "Nevertheless", "Further", "In addition"]
+FILLER = [
+    "the court", "the plaintiff", "the defendant", "the record", "the complaint", "the agreement",
+    "the statute", "controlling precedent", "the district court", "the moving party", "the evidence",
+    "this Circuit", "the legislative history", "the undisputed facts"
+]
+
+def citation(rng: random.Random) -> str:
+    """
+    A plausible-looking case or statute citation full of abbreviations
+    """
+    forms = [
+        lambda: f"Smith v. Jones, {rng.randint(100, 599)} U.S. {rng.randint(1, 999)}, {rng.randint(1, 999)} ({rng.randint(1950, 2024)})",
+        lambda: f"Doe v. Roe Corp., {rng.randint(1, 999)} F.3d {rng.randint(1, 1500)} ({rng.randint(1, 11)}th Cir. {rng.randint(1995, 2024)})",
+        lambda: f"{rng.randint(1, 50)} U.S.C. § {rng.randint(100, 2000)}({rng.choice('abcde')})",
+        lambda: "Fed. R. Civ. P. 12(b)(6)",
+        lambda: "Id. at " + str(rng.randint(1, 999)),
+    ]
+    return rng.choice(forms)()
+
+def sentence(rng: random.Random, topic: str, words: int) -> str:
+    parts = [rng.choice(CONNECTIVES) + ",", rng.choice(FILLER), rng.choice(VERBS), "that", topic]
+    while len(" ".join(parts).split()) < words:
+        parts.append(rng.choice(FILLER + VERBS + [topic]))
+    if rng.random() < 0.4:
+        parts.append("See " + citation(rng))
+    return " ".join(parts) + "."
+
+def generate_brief(n_arguments: int = 20, sentences_per_argument: int = 8,
+                   words_per_sentence: int = 25, subsections: int = 0,
+                   seed: int = 0, brief_id: str = "synthetic") -> Dict:
+    """
+    A parsed-brief dict ({"brief_id", "arguments"}) with numbered argument
+    headings, optional lettered subsections and citation-heavy prose
+    """
+    rng = random.Random(seed)
+    arguments = []
+    for i in range(n_arguments):
+        topic = TOPICS[i % len(TOPICS)]
+        number = ROMAN[i] if i < len(ROMAN) else str(i + 1)
+        sections = [(f"Argument {number}. The {topic} requirement is not satisfied", topic)]
+        for s in range(subsections):
+            sections.append((f"{chr(ord('A') + s)}. {rng.choice(TOPICS).capitalize()} as applied to {topic}", topic))
+        for heading, section_topic in sections:
+            content = " ".join(sentence(rng, section_topic, words_per_sentence) for _ in range(sentences_per_argument))
+            arguments.append({
+                "heading": heading,
+                "content": content,
+                "section_id": f"{brief_id}-{len(arguments)}"
+            })
+    return {"brief_id": brief_id, "arguments": arguments}
+
+def generate_pair(n_arguments: int = 20, **options) -> Dict:
+    """
+    A moving brief and a response brief on the same topics
+    """
+    return {
+        "moving_brief": generate_brief(n_arguments, seed=1, brief_id="moving", **options),
+        "response_brief": generate_brief(n_arguments, seed=2, brief_id="response", **options)
+    }
+
+def to_markdown(brief: Dict) -> str:
+    """
+    Render a generated brief the way LlamaParse returns markdown
+    """
+    lines: List[str] = ["# Introduction", "This brief is submitted in support of the motion."]
+    for argument in brief["arguments"]:
+        lines.append(f"## {argument['heading']}")
+        lines.append(argument["content"])
+    return "\n".join(lines)
@@ -0,0 +1,107 @@
+"""
+Request and response size and latency of /link by reference versus full JSON.
+
+    python -m benchmarks.transport --arguments 20 --subsections 4 --sentences 20 --requests 20
+
+Uploads a synthetic pair (100+ pages per brief by default) through the mock
+parser, then calls /link with both briefs posted as JSON, as gzip-compressed
+JSON and as brief ids. It reports the bytes sent and received per call,
+p50/p95 latency including the client's encoding, and the time to encode and
+decode the pair with the standard json module and with orjson if installed.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import time
+
+os.environ.setdefault("PARSE_BACKEND", "mock")
+# Uploaded briefs are indexed for search; keep the synthetic ones in memory
+# instead of adding them to the developer's on-disk index
+os.environ["ARGUMENT_INDEX_DIR"] = ""
+
+from .run import install_model, percentiles, timed
+from .synthetic import generate_pair, to_markdown
+
+def codec_times(pair: dict, repeat: int) -> dict:
+    encoded = json.dumps(pair)
+    report = {
+        "json": {
+            "dumps": timed(lambda: json.dumps(pair), repeat),
+            "loads": timed(lambda: json.loads(encoded), repeat)
+        }
+    }
+    try:
+        import orjson
+    except ImportError:
+        return report
+    report["orjson"] = {
+        "dumps": timed(lambda: orjson.dumps(pair), repeat),
+        "loads": timed(lambda: orjson.loads(encoded), repeat)
+    }
+    return report
+
+async def link_transports(pair: dict, requests: int) -> dict:
+    import httpx
+    from backend.api import app
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        ids = {}
+        for key in ("moving_brief", "response_brief"):
+            body = to_markdown(pair[key]).encode("utf-8")
+            response = await client.post("/upload", files={"file": (f"{key}.pdf", body, "application/pdf")})
+            response.raise_for_status()
+            ids[f"{key}_id"] = response.json()["data"]["brief_id"]
+
+        json_headers = {"Content-Type": "application/json"}
+        calls = {
+            "full_json": lambda: client.post("/link", content=json.dumps(pair), headers=json_headers),
+            "gzip_json": lambda: client.post("/link", content=gzip.compress(json.dumps(pair).encode("utf-8")),
+                                             headers=dict(json_headers, **{"Content-Encoding": "gzip"})),
+            "brief_ids": lambda: client.post("/link", content=json.dumps(ids), headers=json_headers)
+        }
+        for name, call in calls.items():
+            samples = []
+            for _ in range(requests):
+                start = time.perf_counter()
+                response = await call()
+                response.raise_for_status()
+                samples.append(time.perf_counter() - start)
+            results[name] = dict(
+                percentiles(samples),
+                request_bytes=len(response.request.content),
+                response_bytes=response.num_bytes_downloaded
+            )
+
+        identity = await client.post("/link", content=json.dumps(ids), headers=dict(json_headers, **{"Accept-Encoding": "identity"}))
+        results["response_bytes_uncompressed"] = identity.num_bytes_downloaded
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark linking by brief id against posting parsed briefs")
+    parser.add_argument("--arguments", type=int, default=20, help="Top-level arguments per brief")
+    parser.add_argument("--subsections", type=int, default=4)
+    parser.add_argument("--sentences", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=20, help="Requests per transport")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--model", default="stub", help="'stub' or a locally cached SentenceTransformer name")
+    args = parser.parse_args()
+
+    install_model(args.model)
+    pair = generate_pair(args.arguments, subsections=args.subsections, sentences_per_argument=args.sentences)
+    words = sum(len(arg["content"].split()) for arg in pair["moving_brief"]["arguments"])
+    report = {
+        "config": vars(args),
+        # Roughly 500 words to a double-spaced page
+        "pages_per_brief": words // 500,
+        "pair_json_bytes": len(json.dumps(pair)),
+        "codec": codec_times(pair, args.repeat),
+        "link": asyncio.run(link_transports(pair, args.requests))
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
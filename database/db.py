@@ -1,21 +1,202 @@
 from supabase import create_client
+import httpx
 import os
 from dotenv import load_dotenv
-from typing import Dict, List
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import atexit
 import json
+import logging
+import queue
+import threading
+import time
 from datetime import datetime
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+LINK_INSERT_CHUNK_SIZE = int(os.getenv("LINK_INSERT_CHUNK_SIZE", "500"))
+WRITE_RETRIES = int(os.getenv("DB_WRITE_RETRIES", "3"))
+WRITE_RETRY_BACKOFF = float(os.getenv("DB_WRITE_RETRY_BACKOFF", "0.5"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("DB_WRITE_BEHIND_MAX_PENDING", "1000"))
+WRITE_BEHIND_SHUTDOWN_TIMEOUT = float(os.getenv("DB_WRITE_BEHIND_SHUTDOWN_TIMEOUT", "30"))
+READ_CACHE_SIZE = int(os.getenv("DB_READ_CACHE_SIZE", "256"))
+READ_CACHE_TTL = float(os.getenv("DB_READ_CACHE_TTL", "300"))
+DOCUMENTS_PAGE_SIZE = int(os.getenv("DOCUMENTS_PAGE_SIZE", "10"))
+BRIEF_PAGE_SIZE = 100
+
+# Only what each read path uses, so listings don't pull metadata or parsed briefs
+DOCUMENT_LIST_COLUMNS = "id, filename, doc_type, upload_date"
+BRIEF_COLUMNS = "brief_id, document_type, parsed_content"
+
+# SQLSTATE codes of failures that can succeed on retry and that guarantee nothing
+# was written: the connection was never established (08001, 08004, 53300 too many
+# connections, 57P03 server starting up), or the statement was aborted and its
+# transaction rolled back (serialization failure, deadlock, lock and statement
+# timeouts). PGRST000-003 are PostgREST failing to reach or get a connection to
+# the database. Failures mid-commit, like a dropped connection, are left out.
+TRANSIENT_SQLSTATES = ("08001", "08004", "53300", "57P03", "40001", "40P01", "55P03", "57014")
+TRANSIENT_POSTGREST_CODES = ("PGRST000", "PGRST001", "PGRST002", "PGRST003")
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Failures that are worth retrying because the write provably didn't happen:
+    connection errors before the request was sent, rate limits, and transient
+    database conditions that roll the statement back. Links have no natural key,
+    so a read timeout or 5xx, after which the rows may already be committed, is
+    not retried. postgrest's APIError.code is a SQLSTATE or PGRST code rather
+    than an HTTP status, so HTTP statuses are read from the response.
+    """
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    code = str(getattr(error, "code", "") or "")
+    if code in TRANSIENT_SQLSTATES or code in TRANSIENT_POSTGREST_CODES:
+        return True
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) or getattr(error, "status_code", None)
+    return status == 429
+
+def with_retry(operation: Callable, retries: int = WRITE_RETRIES, backoff: float = WRITE_RETRY_BACKOFF):
+    """
+    Run operation, retrying transient failures with exponential backoff
+    """
+    for attempt in range(retries + 1):
+        try:
+            return operation()
+        except Exception as e:
+            if attempt == retries or not is_transient_error(e):
+                raise
+            delay = backoff * (2 ** attempt)
+            logger.warning(f"Transient database error, retrying in {delay:.1f}s: {str(e)}")
+            time.sleep(delay)
+
+class WriteBehindQueue:
+    """
+    Runs database writes on a background thread so callers never wait on them.
+    When max_pending writes are already queued, new ones are dropped and logged
+    rather than blocking the caller. Writes still queued at interpreter exit
+    get up to shutdown_timeout seconds to finish.
+    """
+    def __init__(self, max_pending: int = WRITE_BEHIND_MAX_PENDING,
+                 shutdown_timeout: float = WRITE_BEHIND_SHUTDOWN_TIMEOUT):
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self.shutdown_timeout = shutdown_timeout
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._drain, name="db-write-behind", daemon=True)
+        self._thread.start()
+        # The thread is a daemon, so without this queued writes would be lost at exit
+        atexit.register(self.close)
+
+    def submit(self, fn: Callable, *args) -> bool:
+        """
+        Queue a write, returning False if it was dropped because the queue is full
+        """
+        try:
+            self._queue.put_nowait((fn, args))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.error(f"Write-behind queue is full, dropped a {getattr(fn, '__name__', 'database')} write "
+                         f"({self.dropped} dropped so far)")
+            return False
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until every queued write has been attempted, or timeout seconds
+        have passed; returns whether the queue was drained
+        """
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def close(self) -> None:
+        if not self.flush(self.shutdown_timeout):
+            logger.error(f"{self._queue.unfinished_tasks} database writes still queued after "
+                         f"{self.shutdown_timeout:.0f}s at shutdown were lost")
+
+    def _drain(self) -> None:
+        while True:
+            fn, args = self._queue.get()
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.error(f"Background database write failed: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+class ReadCache:
+    """
+    Results of database reads by key, kept for a TTL with LRU eviction and
+    dropped early when a write through Database makes them stale
+    """
+    def __init__(self, max_entries: int = READ_CACHE_SIZE, ttl: float = READ_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation so a read that started before it isn't stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]) -> Any:
+        """
+        The cached value for key, or loader()'s result, which is cached unless
+        it is None so that a row written later is not hidden by a cached miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+        with self._lock:
+            if value is not None and generation == self._generation and self.max_entries > 0:
+                self._entries[key] = (time.time(), value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, prefix: str = "") -> None:
+        """
+        Drop every entry whose key starts with prefix (all of them by default)
+        """
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+def parsed_content(value: Any) -> Dict:
+    """
+    A brief's parsed_content, which store_brief writes as a JSON string
+    """
+    return json.loads(value) if isinstance(value, str) else value
+
 class Database:
-    def __init__(self):
-        supabase_url = os.getenv("SUPABASE_URL")
-        supabase_key = os.getenv("SUPABASE_KEY")
-        
-        if not supabase_url or not supabase_key:
-            raise ValueError("Supabase credentials not found")
-        
-        self.client = create_client(supabase_url, supabase_key)
+    def __init__(self, client=None, write_behind: bool = False, read_cache: Optional[ReadCache] = None):
+        """
+        client may be any object with the supabase-py table() interface,
+        e.g. a local stand-in; by default one is created from the environment.
+        Reads go through read_cache, so share one Database between callers.
+        """
+        if client is None:
+            supabase_url = os.getenv("SUPABASE_URL")
+            supabase_key = os.getenv("SUPABASE_KEY")
+            
+            if not supabase_url or not supabase_key:
+                raise ValueError("Supabase credentials not found")
+            
+            client = create_client(supabase_url, supabase_key)
+
+        self.client = client
+        self.brief_listeners: List[Callable[[str, Dict, str], None]] = []
+        self.write_queue: Optional[WriteBehindQueue] = WriteBehindQueue() if write_behind else None
+        self.read_cache = read_cache or ReadCache()
 
     def store_brief(self, brief_content: Dict, document_type: str) -> str:
         """
@@ -28,28 +209,61 @@ class Database:
         }
         
         result = self.client.table("briefs").insert(data).execute()
-        return result.data[0]["brief_id"]
+        brief_id = result.data[0]["brief_id"]
+        self.read_cache.invalidate("briefs:demo")
 
-    def store_links(self, links: List[Dict], brief_pair_id: str) -> None:
+        for listener in self.brief_listeners:
+            try:
+                listener(brief_id, brief_content, document_type)
+            except Exception as e:
+                logger.error(f"Brief listener failed for {brief_id}: {str(e)}")
+        return brief_id
+
+    def add_brief_listener(self, listener: Callable[[str, Dict, str], None]) -> None:
+        """
+        Call listener(brief_id, brief_content, document_type) after each stored brief,
+        e.g. backend.index.index_brief to keep the argument index up to date
         """
-        Store argument links in the database
+        self.brief_listeners.append(listener)
+
+    def store_links(self, links: List[Dict], brief_pair_id: str,
+                    chunk_size: int = LINK_INSERT_CHUNK_SIZE) -> None:
         """
-        for link in links:
-            data = {
+        Store argument links in the database, one batched insert per chunk of rows.
+        With write-behind enabled this only queues the write and returns immediately.
+        """
+        if self.write_queue is not None:
+            self.write_queue.submit(self._insert_links, links, brief_pair_id, chunk_size)
+        else:
+            self._insert_links(links, brief_pair_id, chunk_size)
+
+    def _insert_links(self, links: List[Dict], brief_pair_id: str, chunk_size: int) -> None:
+        rows = [
+            {
                 "brief_pair_id": brief_pair_id,
                 "moving_brief_heading": link["moving_brief_heading"],
                 "response_brief_heading": link["response_brief_heading"],
                 "similarity_score": link["similarity_score"],
                 "explanation": link["explanation"]
             }
-            self.client.table("links").insert(data).execute()
+            for link in links
+        ]
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            with_retry(lambda: self.client.table("links").insert(chunk).execute())
 
     def get_demo_briefs(self) -> Dict:
         """
-        Retrieve demo brief pair from the database
+        Retrieve demo brief pair from the database. Results are cached, so
+        the returned briefs must not be modified.
         """
-        result = self.client.table("briefs").select("*").eq("is_demo", True).execute()
-        if not result.data:
+        def load() -> List[Dict]:
+            rows = self.client.table("briefs").select(BRIEF_COLUMNS).eq("is_demo", True).execute().data
+            # Decoded once per cache fill instead of on every call
+            return [dict(row, parsed_content=parsed_content(row["parsed_content"])) for row in rows]
+
+        rows = self.read_cache.get_or_load("briefs:demo", load)
+        if not rows:
             raise ValueError("No demo briefs found")
         
         demo_briefs = {
@@ -57,10 +271,68 @@ class Database:
             "response_brief": None
         }
         
-        for brief in result.data:
+        for brief in rows:
             if brief["document_type"] == "moving":
-                demo_briefs["moving_brief"] = json.loads(brief["parsed_content"])
+                demo_briefs["moving_brief"] = brief["parsed_content"]
             elif brief["document_type"] == "response":
-                demo_briefs["response_brief"] = json.loads(brief["parsed_content"])
+                demo_briefs["response_brief"] = brief["parsed_content"]
         
         return demo_briefs
+
+    def get_brief(self, brief_id: str) -> Optional[Dict]:
+        """
+        Parsed content of a stored brief, or None if there is none. Found
+        briefs are cached like get_demo_briefs; misses are not.
+        """
+        def load() -> Optional[Dict]:
+            rows = self.client.table("briefs").select(BRIEF_COLUMNS).eq("brief_id", brief_id).limit(1).execute().data
+            return parsed_content(rows[0]["parsed_content"]) if rows else None
+
+        return self.read_cache.get_or_load(f"briefs:{brief_id}", load)
+
+    def iter_briefs(self, page_size: int = BRIEF_PAGE_SIZE) -> Iterator[Dict]:
+        """
+        Every stored brief with its parsed content, read page by page in
+        brief_id order. Not cached: this is for one-off passes like re-indexing.
+        """
+        after = None
+        while True:
+            query = self.client.table("briefs").select(BRIEF_COLUMNS)
+            if after is not None:
+                query = query.gt("brief_id", after)
+            rows = query.order("brief_id").limit(page_size).execute().data
+            for row in rows:
+                yield dict(row, parsed_content=parsed_content(row["parsed_content"]))
+            if len(rows) < page_size:
+                return
+            after = rows[-1]["brief_id"]
+
+    def insert_document(self, record: Dict) -> Dict:
+        """
+        Record an uploaded file in the documents table
+        """
+        result = self.client.table("documents").insert(record).execute()
+        self.read_cache.invalidate("documents:")
+        return result.data[0] if result.data else record
+
+    def list_documents(self, after: Optional[Dict] = None, page_size: int = DOCUMENTS_PAGE_SIZE) -> Dict:
+        """
+        One page of saved documents, newest first. Pages are keyset-paginated
+        on (upload_date, id): pass a page's "next_cursor" as after to get the
+        one that follows, which costs the same however deep it is.
+        """
+        def load() -> Dict:
+            query = self.client.table("documents").select(DOCUMENT_LIST_COLUMNS)
+            if after is not None:
+                date, doc_id = after["upload_date"], after["id"]
+                query = query.or_(f'upload_date.lt."{date}",and(upload_date.eq."{date}",id.lt.{doc_id})')
+            # One extra row tells whether there is a next page
+            rows = query.order("upload_date", desc=True).order("id", desc=True).limit(page_size + 1).execute().data
+            last = rows[page_size - 1] if len(rows) > page_size else None
+            return {
+                "documents": rows[:page_size],
+                "next_cursor": {"upload_date": last["upload_date"], "id": last["id"]} if last else None
+            }
+
+        cursor = f"{after['upload_date']}/{after['id']}" if after else ""
+        return self.read_cache.get_or_load(f"documents:{page_size}:{cursor}", load)
@@ -0,0 +1,20 @@
+import os
+
+# Set before backend is imported, which reads its configuration at import time:
+# no on-disk caches or index, offline embeddings and local markdown parsing
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+os.environ["EMBEDDING_CACHE_DIR"] = ""
+os.environ["PARSE_CACHE_DIR"] = ""
+os.environ["ARGUMENT_INDEX_DIR"] = ""
+os.environ["PARSE_BACKEND"] = "mock"
+os.environ["EMBEDDING_MODEL"] = "stub"
+
+import pytest
+
+from benchmarks.stub_model import HashingEncoder
+
+@pytest.fixture(autouse=True, scope="session")
+def stub_model():
+    from backend.models import registry
+    return registry.register("stub", HashingEncoder())
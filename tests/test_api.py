@@ -0,0 +1,42 @@
+import asyncio
+
+import httpx
+import pytest
+
+from backend.api import app
+from benchmarks.synthetic import generate_pair
+
+def post(path: str, payload: dict) -> httpx.Response:
+    async def send() -> httpx.Response:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(path, json=payload)
+    return asyncio.run(send())
+
+@pytest.mark.parametrize("options", [
+    {"candidates": "abc"},
+    {"candidates": -1},
+    {"capacity": 0},
+    {"capacity": 1.5},
+    {"assignment": "best"},
+    {"chunking": "words"}
+])
+def test_link_batch_rejects_invalid_options(options):
+    response = post("/link/batch", {"pairs": [generate_pair(3)], **options})
+    assert response.status_code == 400
+
+@pytest.mark.parametrize("options", [
+    {"top_k": "ten"},
+    {"top_k": -3},
+    {"top_k": 0},
+    {"nprobe": "all"},
+    {"nprobe": 0}
+])
+def test_search_rejects_invalid_options(options):
+    response = post("/search", {"text": "The court lacks personal jurisdiction", **options})
+    assert response.status_code == 400
+
+def test_search_returns_results():
+    response = post("/search", {"text": "The court lacks personal jurisdiction", "top_k": 3})
+    assert response.status_code == 200
+    assert response.json()["status"] == "success"
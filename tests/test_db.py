@@ -0,0 +1,85 @@
+import pytest
+
+from benchmarks.local_supabase import LocalSupabase
+from database import db
+from database.db import Database
+
+class TransientError(Exception):
+    # PostgREST couldn't reach the database, so nothing was written
+    code = "PGRST001"
+
+class FlakySupabase(LocalSupabase):
+    """
+    Fails the given link inserts (counted from 1) once each before they reach the table
+    """
+    def __init__(self, failing_inserts=(), error=TransientError):
+        super().__init__()
+        self.failing_inserts = set(failing_inserts)
+        self.error = error
+        self.link_inserts = []
+
+    def execute(self, query):
+        if query.table.name == "links" and query.rows_to_insert is not None:
+            self.link_inserts.append(len(query.rows_to_insert))
+            if len(self.link_inserts) in self.failing_inserts:
+                self.failing_inserts.discard(len(self.link_inserts))
+                raise self.error("could not connect to the database")
+        return super().execute(query)
+
+def make_links(count: int):
+    return [
+        {
+            "moving_brief_heading": f"Argument {i}",
+            "response_brief_heading": f"Response {i}",
+            "similarity_score": 0.5,
+            "explanation": "Both arguments address the same question."
+        }
+        for i in range(count)
+    ]
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(db.time, "sleep", lambda seconds: None)
+
+def stored_headings(client: LocalSupabase):
+    return [row["moving_brief_heading"] for row in client.tables.get("links", [])]
+
+def test_links_are_inserted_in_chunks():
+    client = FlakySupabase()
+    Database(client=client).store_links(make_links(5), "pair-1", chunk_size=2)
+    assert client.link_inserts == [2, 2, 1]
+    assert stored_headings(client) == [f"Argument {i}" for i in range(5)]
+    assert {row["brief_pair_id"] for row in client.tables["links"]} == {"pair-1"}
+
+def test_failed_chunk_is_retried_once():
+    client = FlakySupabase(failing_inserts={2})
+    Database(client=client).store_links(make_links(5), "pair-1", chunk_size=2)
+    # The second chunk failed before reaching the table and was sent again
+    assert client.link_inserts == [2, 2, 2, 1]
+    assert stored_headings(client) == [f"Argument {i}" for i in range(5)]
+
+def test_failure_that_may_have_written_is_not_retried():
+    client = FlakySupabase(failing_inserts={1}, error=RuntimeError)
+    with pytest.raises(RuntimeError):
+        Database(client=client).store_links(make_links(3), "pair-1", chunk_size=2)
+    assert client.link_inserts == [2]
+
+def test_write_behind_stores_links_in_the_background():
+    client = FlakySupabase(failing_inserts={1})
+    database = Database(client=client, write_behind=True)
+    database.store_links(make_links(3), "pair-1", chunk_size=2)
+    assert database.write_queue.flush(timeout=5)
+    assert stored_headings(client) == [f"Argument {i}" for i in range(3)]
+
+def test_get_brief_does_not_cache_misses():
+    client = LocalSupabase()
+    database = Database(client=client)
+    assert database.get_brief(1) is None
+
+    brief = {"brief_id": "abc", "arguments": []}
+    brief_id = database.store_brief(brief, "moving")
+    assert database.get_brief(brief_id) == brief
+    # Found briefs are served from the cache
+    requests = client.requests
+    assert database.get_brief(brief_id) == brief
+    assert client.requests == requests
@@ -0,0 +1,55 @@
+import os
+import shutil
+
+import numpy as np
+
+from backend import linker
+from backend.linker import DiskEmbeddingStore
+from benchmarks.embedding_cache import keys_between, problems_in, vector_for
+
+DIM = 8
+CAPACITY = 16
+
+def put(store: DiskEmbeddingStore, start: int, stop: int) -> None:
+    keys = keys_between(start, stop)
+    store.put_many(keys, np.stack([vector_for(key, DIM) for key in keys]))
+
+def test_reader_follows_compactions_by_another_store(tmp_path):
+    writer = DiskEmbeddingStore(str(tmp_path), DIM, CAPACITY)
+    reader = DiskEmbeddingStore(str(tmp_path), DIM, CAPACITY)
+    written = 0
+    # Enough keys per turn for the writer to compact its log more than once while
+    # the reader is idle
+    for _ in range(5):
+        put(writer, written, written + 9 * CAPACITY)
+        written += 9 * CAPACITY
+        assert problems_in(reader, written, DIM, CAPACITY) == []
+        put(reader, written, written + 3)
+        written += 3
+        assert problems_in(writer, written, DIM, CAPACITY) == []
+
+def test_compaction_is_noticed_when_the_log_keeps_its_inode(tmp_path, monkeypatch):
+    # Filesystems reuse inodes, so a compacted log can look like the old one
+    # grown past where a reader stopped; simulate that by rewriting it in place
+    replace = os.replace
+    def replace_in_place(source, target):
+        if target.endswith("slots.log"):
+            shutil.copyfile(source, target)
+            os.remove(source)
+        else:
+            replace(source, target)
+    monkeypatch.setattr(linker.os, "replace", replace_in_place)
+
+    writer = DiskEmbeddingStore(str(tmp_path), DIM, CAPACITY)
+    reader = DiskEmbeddingStore(str(tmp_path), DIM, CAPACITY)
+    put(writer, 0, 3 * CAPACITY)
+    assert problems_in(reader, 3 * CAPACITY, DIM, CAPACITY) == []
+    # The log is compacted down to CAPACITY lines, then grows past the reader's
+    # offset again without another compaction
+    put(writer, 3 * CAPACITY, 4 * CAPACITY + 1)
+    put(writer, 4 * CAPACITY + 1, 6 * CAPACITY + 9)
+    assert problems_in(reader, 6 * CAPACITY + 9, DIM, CAPACITY) == []
+
+def test_reopened_store_sees_compacted_log(tmp_path):
+    put(DiskEmbeddingStore(str(tmp_path), DIM, CAPACITY), 0, 10 * CAPACITY)
+    assert problems_in(DiskEmbeddingStore(str(tmp_path), DIM, CAPACITY), 10 * CAPACITY, DIM, CAPACITY) == []
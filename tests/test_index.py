@@ -0,0 +1,39 @@
+import json
+
+import numpy as np
+import pytest
+
+from backend.index import ArgumentIndex, IndexEncoderError
+
+def vectors(n: int, dim: int = 8, seed: int = 0) -> np.ndarray:
+    rows = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+def metadata(brief_id: str, n: int):
+    return [{"brief_id": brief_id, "heading": f"Argument {i}"} for i in range(n)]
+
+def test_index_refuses_another_encoder(tmp_path):
+    index = ArgumentIndex(str(tmp_path))
+    assert index.add_brief("a", vectors(3), metadata("a", 3), "model-a")
+
+    # The encoder is kept with the index, so a restarted process still knows it
+    reopened = ArgumentIndex(str(tmp_path))
+    assert len(reopened.search(vectors(1)[0], encoder="model-a")) == 3
+    with pytest.raises(IndexEncoderError):
+        reopened.add_brief("b", vectors(3, seed=1), metadata("b", 3), "model-b")
+    with pytest.raises(IndexEncoderError):
+        reopened.search(vectors(1)[0], encoder="model-b")
+    assert len(reopened) == 3
+
+    reopened.clear()
+    assert reopened.add_brief("b", vectors(3, seed=1), metadata("b", 3), "model-b")
+    assert len(ArgumentIndex(str(tmp_path)).search(vectors(1)[0], encoder="model-b")) == 3
+
+def test_index_without_recorded_encoder_must_be_rebuilt(tmp_path):
+    index = ArgumentIndex(str(tmp_path))
+    index.add(vectors(3), metadata("a", 3), "model-a")
+    # An index written before encoders were recorded
+    with open(tmp_path / "index.json", "w") as f:
+        json.dump({"dim": 8, "trained_size": 0}, f)
+    with pytest.raises(IndexEncoderError):
+        ArgumentIndex(str(tmp_path)).add(vectors(1), metadata("b", 1), "model-a")
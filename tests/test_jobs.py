@@ -0,0 +1,69 @@
+import asyncio
+import hashlib
+
+from backend import index, jobs
+from backend.executor import link_pool
+from backend.linker import ArgumentLinker
+from backend.parser import SavedUpload
+from benchmarks.local_supabase import LocalSupabase
+from benchmarks.synthetic import generate_pair, to_markdown
+
+def saved_upload(directory, name: str, brief) -> SavedUpload:
+    content = to_markdown(brief).encode("utf-8")
+    path = directory / name
+    path.write_bytes(content)
+    return SavedUpload(str(path), hashlib.sha256(content).hexdigest(), len(content))
+
+def run_job(job: jobs.Job) -> None:
+    async def run() -> None:
+        link_pool.start()
+        try:
+            await jobs.JobManager()._run(job)
+        finally:
+            link_pool.shutdown()
+    asyncio.run(run())
+
+def test_links_are_published_before_the_job_completes(tmp_path, monkeypatch):
+    pair = generate_pair(8)
+    job = jobs.Job(saved_upload(tmp_path, "moving.md", pair["moving_brief"]), "moving.md",
+                   saved_upload(tmp_path, "response.md", pair["response_brief"]), "response.md")
+
+    # Sentences are embedded while building each link; record what a client
+    # polling the job would have seen at that moment
+    seen = []
+    sentence_embeddings = ArgumentLinker.sentence_embeddings
+    def spy(self, texts):
+        if texts:
+            seen.append((job.status, len(job.links)))
+        return sentence_embeddings(self, texts)
+    monkeypatch.setattr(ArgumentLinker, "sentence_embeddings", spy)
+
+    run_job(job)
+
+    assert job.status == "succeeded", job.error
+    assert len(job.result["links"]) > 1
+    progress = job.to_dict()["progress"]
+    assert progress["pages_parsed"] == progress["pages_total"] == 2
+    assert any(status == "running" and links > 0 for status, links in seen)
+
+def test_links_are_stored_with_the_moving_brief(tmp_path, monkeypatch):
+    from database.db import Database
+
+    client = LocalSupabase()
+    database = Database(client=client, write_behind=True)
+    monkeypatch.setenv("SUPABASE_URL", "http://localhost")
+    monkeypatch.setenv("SUPABASE_KEY", "test")
+    monkeypatch.setattr(index, "SAVE_UPLOADED_BRIEFS", True)
+    monkeypatch.setattr(index, "_database", database)
+
+    pair = generate_pair(6)
+    job = jobs.Job(saved_upload(tmp_path, "moving.md", pair["moving_brief"]), "moving.md",
+                   saved_upload(tmp_path, "response.md", pair["response_brief"]), "response.md")
+    run_job(job)
+    assert job.status == "succeeded", job.error
+    assert database.write_queue.flush(timeout=5)
+
+    moving_row = next(row["brief_id"] for row in client.tables["briefs"] if row["document_type"] == "moving")
+    links = client.tables["links"]
+    assert len(links) == len(job.result["links"])
+    assert {row["brief_pair_id"] for row in links} == {moving_row}
@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+from backend.parser import EmptyParseError, MockParseBackend, MOCK_PAGE_BREAK, parse_markdown, with_parse_retry
+
+def test_empty_parse_result_is_retried():
+    attempts = []
+    async def parse() -> str:
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise EmptyParseError("no documents")
+        return "# Argument I"
+    assert asyncio.run(with_parse_retry(parse, retries=2, backoff=0)) == "# Argument I"
+    assert len(attempts) == 2
+
+def test_empty_parse_result_fails_once_retries_run_out():
+    async def parse() -> str:
+        raise EmptyParseError("no documents")
+    with pytest.raises(EmptyParseError):
+        asyncio.run(with_parse_retry(parse, retries=1, backoff=0))
+
+def test_parse_markdown_reports_pages_as_ranges_finish(tmp_path):
+    path = tmp_path / "brief.md"
+    path.write_text(MOCK_PAGE_BREAK.join(f"Page {page}" for page in range(60)), encoding="utf-8")
+    calls = []
+    text = asyncio.run(parse_markdown(str(path), MockParseBackend(latency=0),
+                                      lambda done, total: calls.append((done, total))))
+    assert text.startswith("Page 0") and text.endswith("Page 59")
+    # 25 pages per range: nothing parsed yet, then one call per range
+    assert calls[0] == (0, 60)
+    assert calls[-1] == (60, 60)
+    assert len(calls) == 4
+    assert [done for done, _ in calls] == sorted(done for done, _ in calls)